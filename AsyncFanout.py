@@ -0,0 +1,284 @@
+import asyncio
+import socket
+import threading
+import time
+
+from FanoutConfig import FanoutConfig, ServerMode, StreamRoute
+from SendQueue import FanoutRegistry
+import LatencyMetrics
+import NtripCaster
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Ngưỡng buffer của transport; vượt ngưỡng thì asyncio gọi pause_writing()
+SOCKET_HIGH_WATERMARK = 8 * 1024
+
+
+class FanoutProtocol(asyncio.Protocol):
+    """Một kết nối rover trên backend asyncio"""
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.peer = None
+        self.handshake = None  # bytearray khi đang chờ request NTRIP
+        self.deadline = None
+        self.paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info("peername")
+        transport.set_write_buffer_limits(high=SOCKET_HIGH_WATERMARK)
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.on_connect(self)
+
+    def data_received(self, data):
+        if self.handshake is not None:
+            self.server.on_handshake_data(self, data)
+
+    def connection_lost(self, exc):
+        self.server.on_disconnect(self)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.server.flush_client(self)
+
+
+class AsyncFanoutServer:
+    """
+    Backend phát RTCM dựa trên asyncio (dùng uvloop nếu có), chạy event loop
+    riêng trong một thread, không phụ thuộc event loop của Qt.
+
+    send_RTCM3() an toàn khi gọi từ thread khác (ví dụ thread đọc serial qua
+    rtcm3_signal với DirectConnection): khung được gom vào inbox và event loop
+    chỉ bị đánh thức một lần cho cả loạt khung.
+    """
+
+    def __init__(self, reuse_port=False):
+        self.config = FanoutConfig()
+        self.reuse_port = reuse_port
+        self.TCP_HOST = self.config.host
+        self.TCP_PORT = self.config.port
+        self.registry = FanoutRegistry()
+        self.clients = self.registry.clients  # FanoutProtocol -> ClientSendQueue
+        self.metrics = LatencyMetrics.active()
+        self.pending = set()
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self._inbox = []
+        self._scheduled = False
+        self._ready = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="AsyncFanout", daemon=True)
+        self.thread.start()
+        self._ready.wait(5)
+
+    def _run(self):
+        if uvloop is not None:
+            self.loop = uvloop.new_event_loop()
+        else:
+            self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        if not self.loop.run_until_complete(self._listen()):
+            self._ready.set()
+            return
+        # Luôn chạy: chế độ có thể đổi sang ntrip khi nạp lại cấu hình
+        self.loop.call_later(1.0, self.expire_handshakes)
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _listen(self):
+        try:
+            self.server = await self.loop.create_server(
+                lambda: FanoutProtocol(self),
+                self.TCP_HOST,
+                self.TCP_PORT,
+                reuse_address=True,
+                reuse_port=self.reuse_port or None,
+                backlog=4096,
+            )
+        except OSError as e:
+            print(f"Server failed to start: {e}")
+            return False
+        print(
+            f"[SERVER STARTED] Listening on {self.TCP_HOST}:{self.TCP_PORT} "
+            f"({self.config.mode}, asyncio{'+uvloop' if uvloop is not None else ''})"
+        )
+        return True
+
+    def apply_settings(self, keys):
+        """Nạp lại tcp.* / ntrip.* (gọi được từ mọi thread)"""
+        if self.loop is None or not any(key.startswith(("tcp.", "ntrip.")) for key in keys):
+            return
+        self.loop.call_soon_threadsafe(self._apply_settings)
+
+    def _apply_settings(self):
+        address = (self.TCP_HOST, self.TCP_PORT)
+        self.config.load()
+        self.TCP_HOST = self.config.host
+        self.TCP_PORT = self.config.port
+        if (self.TCP_HOST, self.TCP_PORT) != address:
+            if self.server is not None:
+                self.server.close()
+            self.loop.create_task(self._listen())
+
+    def stop(self):
+        """Dừng server"""
+        if self.loop is None or not self.loop.is_running():
+            return
+        print("[SERVER STOPPING]")
+        self.loop.call_soon_threadsafe(self._stop)
+        self.thread.join(2)
+
+    def _stop(self):
+        if self.server is not None:
+            self.server.close()
+        for client in list(self.clients) + list(self.pending):
+            client.transport.close()
+        self.registry.clear()
+        self.pending.clear()
+        self.loop.stop()
+
+    # ------------------------------------------------------------------
+    # Kết nối
+    # ------------------------------------------------------------------
+    def on_connect(self, client):
+        if self.config.mode == ServerMode.NTRIP:
+            client.handshake = bytearray()
+            client.deadline = time.monotonic() + self.config.handshake_timeout_ms / 1000.0
+            self.pending.add(client)
+        else:
+            self.registry.add(
+                client, self.config.new_queue(), self.config.raw_subscription, self.config.default_stream
+            )
+
+    def on_handshake_data(self, client, data):
+        client.handshake.extend(data)
+        try:
+            request, _ = NtripCaster.parse_request(client.handshake)
+        except NtripCaster.NtripError as e:
+            print(f"[NTRIP] bad request: {e}")
+            self.pending.discard(client)
+            client.transport.write(NtripCaster.response_bad_request())
+            client.transport.close()
+            return
+        if request is None:
+            return
+
+        self.pending.discard(client)
+        client.handshake = None
+        response, mount, subscription, chunked = self.config.accept_ntrip(request)
+        client.transport.write(response)
+        if mount is None:
+            client.transport.close()
+            return
+        queue = self.registry.add(client, self.config.new_queue(), subscription, mount.stream)
+        queue.mountpoint = mount.name
+        queue.chunked = chunked
+
+    def on_disconnect(self, client):
+        self.pending.discard(client)
+        self.registry.drop(client)
+
+    def expire_handshakes(self):
+        now = time.monotonic()
+        for client in [c for c in self.pending if now > c.deadline]:
+            self.pending.discard(client)
+            client.transport.abort()
+        self.loop.call_later(1.0, self.expire_handshakes)
+
+    # ------------------------------------------------------------------
+    # Phát dữ liệu
+    # ------------------------------------------------------------------
+    def stream(self, name):
+        """Đầu vào cho receiver name, dùng làm đích của rtcm3_signal"""
+        return StreamRoute(self, name)
+
+    def send_RTCM3(self, data: bytes, stream=None):
+        """Gửi RTCM3 tới các client của luồng stream (gọi được từ mọi thread)"""
+        if self.loop is None:
+            return
+        self._inbox.append((stream, data))
+        if not self._scheduled:
+            self._scheduled = True
+            try:
+                self.loop.call_soon_threadsafe(self._drain_inbox)
+            except RuntimeError:
+                # Loop đã đóng
+                pass
+
+    def _drain_inbox(self):
+        self._scheduled = False
+        inbox = self._inbox
+        metrics = self.metrics
+        while inbox:
+            frames = inbox[:]
+            del inbox[: len(frames)]
+            # Đưa cả loạt khung vào hàng đợi trước, sau đó mỗi client ghi một lần
+            ready = {}  # client -> None, giữ thứ tự
+            for stream, frame in frames:
+                stream = stream or self.config.default_stream
+                if metrics is not None:
+                    metrics.frame_dispatched(stream)
+                self._broadcast(frame, stream, ready)
+            for client in ready:
+                if not client.paused:
+                    self.flush_client(client)
+
+    def _broadcast(self, data, stream, ready):
+        if not self.clients:
+            return
+        now = time.monotonic()
+        remove_clients = []
+        evict_clients = []
+        for client, queue in self.registry.publish(data, now, stream):
+            if client.transport.is_closing():
+                remove_clients.append(client)
+                continue
+            if queue.should_evict(now):
+                evict_clients.append(client)
+                continue
+            ready[client] = None
+
+        for client in remove_clients:
+            self.registry.drop(client)
+        for client in evict_clients:
+            self.evict_client(client)
+
+    def flush_client(self, client):
+        """Ghi mọi khung đang chờ của client bằng một lần writelines (một send)"""
+        queue = self.clients.get(client)
+        if not queue:
+            return
+        if queue.chunked:
+            data = [NtripCaster.chunk(queue.pop()) for _ in range(len(queue))]
+        else:
+            data = [queue.pop() for _ in range(len(queue))]
+        client.transport.writelines(data)
+
+    def evict_client(self, client):
+        """Ngắt client quá chậm để giữ bộ nhớ ổn định"""
+        queue = self.registry.drop(client)
+        print(f"[EVICTED] {client.peer} slow client {queue.stats() if queue else ''}")
+        client.transport.abort()
+
+    def client_stats(self):
+        stats = []
+        for client, queue in list(self.clients.items()):
+            item = queue.stats()
+            item["address"] = f"{client.peer[0]}:{client.peer[1]}" if client.peer else ""
+            stats.append(item)
+        return stats
+
+    def subscription_stats(self):
+        return self.registry.subscription_stats()
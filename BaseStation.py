@@ -1,7 +1,17 @@
-import serial
-from PySide6.QtCore import QThread, Signal as pyqtSignal, QObject
+from PySide6.QtCore import QThread, Signal as pyqtSignal, QObject, QTimer
 from PySide6.QtSerialPort import QSerialPort
 from ConstVariable import BASE_STATION
+from RTCM3Framer import RTCM3Framer
+from RTCM3Stats import RTCM3StreamStats
+import LatencyMetrics
+from TelemetryLog import TelemetryLog
+from UBXCommandChannel import UBX_CLASS_ACK, UBXCommandChannel
+from SurveyInEngine import NAV_HPPOSECEF_CLASS, NAV_HPPOSECEF_ID, SurveyInEngine
+import UBXConfig
+from UBXConfig import ConfigTransaction
+import UBXProtocol
+from UBXProtocol import UBX_CLASS_CFG, UBXStreamDecoder
+import math
 import struct
 import time
 import VariableManager
@@ -13,14 +23,24 @@ class BaseState:
     FIXED = 2
 
 
+# Các cột NAV-SVIN ghi vào telemetry log (bỏ reserved)
+SVIN_LOG_FIELDS = (
+    "iTOW", "dur", "meanX", "meanY", "meanZ", "meanXHP", "meanYHP", "meanZHP",
+    "meanAcc", "obs", "valid", "active",
+)
+
+
 class BaseController(QObject):
     rtcm3_signal = pyqtSignal(bytes)
     survey_in_data = pyqtSignal(dict)
     base_data = pyqtSignal(dict)
 
-    def __init__(self, port):
+    def __init__(self, port, name="BASE", settings=None):
         super().__init__()
         self.port = port
+        # Receiver chính dùng [General]; receiver thêm dùng section [name] riêng
+        self.name = name
+        self.settings = VariableManager.instance if settings is None else settings
         self.baudrate = BASE_STATION.baudrate
         self.gps_serial = None
         self.is_connected = False
@@ -28,78 +48,101 @@ class BaseController(QObject):
         self.ecef_y = None
         self.ecef_z = None
         self.accuracy = None
+        self.rtcm3_framer = RTCM3Framer()
+        self.rtcm3_stats = RTCM3StreamStats()  # thống kê header RTCM3 (type, vệ tinh, mất epoch)
+        self.ubx_decoder = UBXStreamDecoder()
+        self.recorder = None  # StreamRecorder, ghi lại luồng nếu archive.enabled
+        self.metrics = LatencyMetrics.active()  # None khi metrics.enabled=false
+        self.svin_log = self._telemetry_log("svin", SVIN_LOG_FIELDS)
+        self.svin_complete_log = self._telemetry_log("svin_complete", SVIN_LOG_FIELDS)
+        self.survey_engine = None  # SurveyInEngine khi survey.host_engine bật
+        self.commands = UBXCommandChannel(
+            self._write_serial,
+            window=self.settings.getInt("gps.command_window", 4),
+            timeout=self.settings.getInt("gps.ack_timeout_ms", 1000) / 1000.0,
+            retries=self.settings.getInt("gps.command_retries", 2),
+            parent=self,
+        )
+
+        # Watchdog: phát hiện mất dữ liệu và tự kết nối lại
+        self.port_resolver = None  # hàm trả về device path hiện tại của receiver
+        self.watchdog_timer = None
+        self.last_data = 0.0  # lần cuối nhận được byte
+        self.last_frame = 0.0  # lần cuối nhận được khung hợp lệ (fixed mode)
+        self.watchdog_started = 0.0  # lần start_watchdog() gần nhất (mở / mở lại cổng)
+        self.frame_stall_reported = 0.0  # last_frame lúc đã báo "có byte nhưng không có khung"
+        self.reconnecting = False
+        self.reconnect_delay = 0.0
+        self.outage_started = 0.0
+        self.outages = 0
+        self.reconnect_attempts = 0
+        self.last_outage = 0.0
+        self.total_outage = 0.0
 
         self.NAV_SVIN_CLASS = 0x01
         self.NAV_SVIN_ID = 0x3B
-        self.MSG_OUT_NAV2_SVIN_KEY_ID = [0x23, 0x05, 0x91, 0x20]
-        self.SET = [0x00]
-        self.RESET = [0x00]
-
-        self.MSG_OUT_RTCM3_1005_USB_KEY_ID = [0xC0, 0x02, 0x91, 0x20]  # 0x209102c0
-        self.MSG_OUT_RTCM3_1074_USB_KEY_ID = [0x61, 0x03, 0x91, 0x20]  # 0x20910361
-        self.MSG_OUT_RTCM3_1084_USB_KEY_ID = [0x66, 0x03, 0x91, 0x20]  # 0x20910366
-        self.MSG_OUT_RTCM3_1124_USB_KEY_ID = [0x70, 0x03, 0x91, 0x20]  # 0x20910370
-        self.MSG_OUT_RTCM3_1230_USB_KEY_ID = [0x06, 0x03, 0x91, 0x20]  # 0x20910306
-
-        self.MSG_OUT_NMEA_GBS_USB_KEY_ID = [0xE0, 0x00, 0x91, 0x20]  # 0x209100e0
-        self.MSG_OUT_NMEA_GLL_USB_KEY_ID = [0xCC, 0x00, 0x91, 0x20]  # 0x209100cc
-        self.MSG_OUT_NMEA_GNS_USB_KEY_ID = [0xB8, 0x00, 0x91, 0x20]  # 0x209100b8
-        self.MSG_OUT_NMEA_GSA_USB_KEY_ID = [0xC2, 0x00, 0x91, 0x20]  # 0x209100c2
-        self.MSG_OUT_NMEA_GSV_USB_KEY_ID = [0xC7, 0x00, 0x91, 0x20]  # 0x209100c7
-        self.MSG_OUT_NMEA_GST_USB_KEY_ID = [0xD6, 0x00, 0x91, 0x20]  # 0x209100d6
-        self.MSG_OUT_NMEA_RMC_USB_KEY_ID = [0xAE, 0x00, 0x91, 0x20]  # 0x209100ae
-        self.MSG_OUT_NMEA_VTG_USB_KEY_ID = [0xB3, 0x00, 0x91, 0x20]  # 0x209100b3
-        self.MSG_OUT_NMEA_GGA_USB_KEY_ID = [0xBD, 0x00, 0x91, 0x20]  # 0x209100bd
-
-        self.DISABLE = [0x00]
-        self.MODE_DISABLED = [0x00]
-        self.MODE_SURVEY_IN = [0x01]
-        self.MODE_FIXED = [0x02]
-
-        self.UBX_VAL_SET_HEADER = [0xB5, 0x62]
-        self.UBX_VAL_SET_CLASS = 0x06
-        self.UBX_ID = 0x8A
-
-        self.KEY_ID_TMODE3 = [0x01, 0x00, 0x03, 0x20]
-        self.KEY_ID_SVIN_MIN_DUR = [0x10, 0x00, 0x03, 0x40]
-        self.KEY_ID_SVIN_ACC_LIMIT = [0x11, 0x00, 0x03, 0x40]
-
-        self.LLH = [0x01]
-        self.ECEF = [0x00]
-        self.KEY_ID_POS_TYPE = [0x02, 0x00, 0x03, 0x20]
-        self.KEY_ID_ECEF_X = [0x03, 0x00, 0x03, 0x40]
-        self.KEY_ID_ECEF_Y = [0x04, 0x00, 0x03, 0x40]
-        self.KEY_ID_ECEF_Z = [0x05, 0x00, 0x03, 0x40]
-
-        self.KEY_ID_ECEF_X_HP = [0x06, 0x00, 0x03, 0x20]
-        self.KEY_ID_ECEF_Y_HP = [0x07, 0x00, 0x03, 0x20]
-        self.KEY_ID_ECEF_Z_HP = [0x08, 0x00, 0x03, 0x20]
-        self.KEY_ID_FIXED_ACCURACY = [0x0F, 0x00, 0x03, 0x40]
-
-        self.KEY_ID_RATE = [0x01, 0x00, 0x21, 0x30]  # 0x30210001
-
-        self.RAM = 0x01
-        self.FLASH = 0x04
+        self.RAM = UBXProtocol.LAYER_RAM
+        self.FLASH = UBXProtocol.LAYER_FLASH
         self.mode = BaseState.FIXED
         self.rate = None
         self.load_variable()
 
+    def _telemetry_log(self, name, fields):
+        if self.settings is not VariableManager.instance:
+            name = f"{self.name}_{name}"
+        return TelemetryLog(
+            name,
+            fields,
+            directory=self.settings.get("telemetry.dir", "telemetry"),
+            max_bytes=self.settings.getInt("telemetry.max_mb", 16) * 1024 * 1024,
+            keep_files=self.settings.getInt("telemetry.keep_files", 30),
+            flush_interval=self.settings.getInt("telemetry.flush_ms", 1000) / 1000.0,
+        )
+
+    def stop_logs(self):
+        self.svin_log.stop()
+        self.svin_complete_log.stop()
+
+    def stop(self):
+        """
+        Dừng timer và đóng cổng trong thread của BaseController; nối với
+        QThread.finished (DirectConnection) để chạy trước khi thread kết thúc.
+        """
+        if self.watchdog_timer is not None:
+            self.watchdog_timer.stop()
+        self.commands.timer.stop()
+        self.reconnecting = True  # singleShot _try_reconnect còn chờ không mở lại cổng
+        self._close()
+
     def load_variable(self):
-        self.ecef_x = int(VariableManager.instance.get("gps.ecef_x"))
-        self.ecef_y = int(VariableManager.instance.get("gps.ecef_y"))
-        self.ecef_z = int(VariableManager.instance.get("gps.ecef_z"))
-        self.accuracy = int(VariableManager.instance.get("gps.accuracy"))
-        self.rate = int(VariableManager.instance.get("gps.rate"))
+        self.ecef_x = int(self.settings.get("gps.ecef_x"))
+        self.ecef_y = int(self.settings.get("gps.ecef_y"))
+        self.ecef_z = int(self.settings.get("gps.ecef_z"))
+        self.accuracy = int(self.settings.get("gps.accuracy"))
+        self.rate = int(self.settings.get("gps.rate"))
+
+    def apply_settings(self, keys):
+        """Áp dụng các key gps.* bị sửa trực tiếp trong file cấu hình"""
+        keys = self.settings.local_keys(keys)
+        if "gps.rate" in keys:
+            rate = self.settings.getInt("gps.rate", self.rate)
+            if rate != self.rate:
+                self.set_rate(rate)
+        if any(key in keys for key in ("gps.ecef_x", "gps.ecef_y", "gps.ecef_z", "gps.accuracy")):
+            self.load_variable()
+            if self.mode == BaseState.FIXED and self.is_connected:
+                self.run_fixed_mode()
+                self.get_data()
 
     def start_fixed_mode(self, ecef_x, ecef_y, ecef_z, acc):
         # print(f"x >> {ecef_x}")
         # print(f"y >> {ecef_y}")
         # print(f"z >> {ecef_z}")
-        VariableManager.instance.set("gps.ecef_x", ecef_x)
-        VariableManager.instance.set("gps.ecef_y", ecef_y)
-        VariableManager.instance.set("gps.ecef_z", ecef_z)
-        VariableManager.instance.set("gps.accuracy", acc)
-        VariableManager.instance.save()
+        self.settings.set("gps.ecef_x", ecef_x)
+        self.settings.set("gps.ecef_y", ecef_y)
+        self.settings.set("gps.ecef_z", ecef_z)
+        self.settings.set("gps.accuracy", acc)
+        self.settings.save()
         self.load_variable()
         self.run_fixed_mode()
         self.get_data() # emit data to nest server
@@ -113,26 +156,157 @@ class BaseController(QObject):
             except:
                 pass
 
+        # Không cần chờ: receiver xử lý lệnh theo thứ tự, ACK được theo dõi
         self._disable()
-        time.sleep(0.2)
         self.set_survey_in_mode(
             duration=duration, accuracy_=accuracy_, layer_=self.RAM + self.FLASH
         )
         self.mode = BaseState.SURVEY_IN
+        self.ubx_decoder.reset()
+        self.start_survey_engine(duration, accuracy_)
         self.gps_serial.readyRead.connect(self.process_survey_in_data)
+        self.start_watchdog()
         self.get_data() # emit data to nest server
 
+    def start_survey_engine(self, duration, accuracy_):
+        """
+        Survey-in song song trên host từ NAV-HPPOSECEF: chuyển sang fixed ngay
+        khi đạt accuracy_ (mm) thay vì chờ receiver hết duration (s). Nếu
+        receiver xác nhận (valid) trước thì dùng vị trí trung bình của
+        receiver; engine quá duration mà chưa hội tụ thì chỉ dừng engine,
+        survey-in của receiver chạy tiếp như khi không có engine.
+        """
+        if not self.settings.getBool("survey.host_engine", False):
+            self.survey_engine = None
+            return
+        self.survey_engine = SurveyInEngine(
+            target_mm=accuracy_,
+            min_duration=self.settings.getInt("survey.min_duration_s", 30),
+            max_duration=duration,
+            decorrelation=self.settings.getInt("survey.decorrelation_s", 30),
+            drift_window=self.settings.getInt("survey.drift_window_s", 30),
+            max_pacc_mm=self.settings.getInt("survey.max_pacc_mm", 0),
+        )
+        self.hpposecef_message(1)
+
+    def finish_survey_in(self, svin_data=None):
+        """
+        Kết thúc survey-in của host engine và chuyển sang fixed: vị trí của
+        engine, hoặc vị trí trung bình NAV-SVIN của receiver (svin_data) khi
+        receiver đã xác nhận (valid = 1) trước khi engine hội tụ.
+        """
+        engine = self.survey_engine
+        self.survey_engine = None
+        self.hpposecef_message(0)
+        if svin_data is None:
+            ecef_x, ecef_y, ecef_z = engine.position_cm()
+            acc = engine.accuracy_mm()
+            print(f"Survey-In (host) hoan tat: {engine.summary()}")
+        else:
+            # meanX/Y/Z (cm) + meanX/Y/ZHP (0.1 mm); meanAcc 0.1 mm -> mm
+            ecef_x = round(svin_data["meanX"] + svin_data["meanXHP"] / 100)
+            ecef_y = round(svin_data["meanY"] + svin_data["meanYHP"] / 100)
+            ecef_z = round(svin_data["meanZ"] + svin_data["meanZHP"] / 100)
+            acc = max(1, math.ceil(svin_data["meanAcc"] / 10))
+            print(f"Survey-In (host) chua hoi tu, dung vi tri receiver: {engine.summary()}")
+        self.start_fixed_mode(ecef_x, ecef_y, ecef_z, acc)
+
+    def stop_survey_engine(self):
+        """Dừng host engine (tắt NAV-HPPOSECEF), survey-in của receiver vẫn chạy"""
+        engine = self.survey_engine
+        self.survey_engine = None
+        self.hpposecef_message(0)
+        print(f"Survey-In (host) qua duration, cho receiver: {engine.summary()}")
+
+    def hpposecef_message(self, value):
+        tx = ConfigTransaction().set("CFG-MSGOUT-UBX_NAV_HPPOSECEF_USB", value, self.RAM)
+        self.send_config(tx, "NAV-HPPOSECEF output")
+
+    def start(self):
+        """
+        Khi thread khởi động. Mặc định (gps.warm_start) đọc cấu hình hiện tại
+        của receiver và chỉ ghi phần khác, không cấu hình lại từ đầu.
+        """
+        if self.is_connected == False:
+            self._connect()
+        if self.is_connected and self.settings.getBool("gps.warm_start", True):
+            self.warm_start()
+            return
+        if self.is_connected and self.settings.getBool("gps.configure_outputs", True):
+            self.configure_outputs()
+        self.run_fixed_mode()
+
+    def desired_config(self):
+        """Cấu hình RAM mà receiver cần có ở fixed mode theo VariableManager"""
+        tx = self.fixed_mode_config(self.ecef_x, self.ecef_y, self.ecef_z, self.accuracy, self.RAM)
+        if self.settings.getBool("gps.configure_outputs", True):
+            self.output_config(tx, self.RAM)
+        return tx
+
+    def warm_start(self):
+        """
+        Khởi động không gián đoạn correction: nhận RTCM ngay (receiver vẫn
+        đang phát theo cấu hình cũ), đọc cấu hình bằng CFG-VALGET rồi chỉ
+        ghi các key khác. TMODE chỉ bị disable/đặt lại khi vị trí thay đổi.
+        """
+        desired = self.desired_config()
+        self.mode = BaseState.FIXED
+        self.rtcm3_framer.reset()
+        self.ubx_decoder.reset()
+        self.gps_serial.readyRead.connect(self.handle_fixed)
+        self.start_watchdog()
+
+        futures = self.read_config(desired.keys())
+        replies = [None] * len(futures)
+        remaining = [len(futures)]
+
+        def done(index, future):
+            replies[index] = future.result()
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                self._finish_warm_start(desired, replies)
+
+        for index, future in enumerate(futures):
+            future.add_done_callback(lambda future, index=index: done(index, future))
+
+    def _finish_warm_start(self, desired, replies):
+        if not self.is_connected:
+            return  # mất kết nối giữa chừng, restore_mode sẽ cấu hình lại
+        current = {}
+        for reply in replies:
+            values = UBXConfig.decode_valget(reply)
+            if values is None:
+                print("[UBX] CFG-VALGET failed, full reconfiguration")
+                if self.settings.getBool("gps.configure_outputs", True):
+                    self.configure_outputs()
+                self.run_fixed_mode()
+                return
+            current.update(values)
+
+        changed = desired.changed(current, self.RAM)
+        is_tmode = lambda key: key.name.startswith("CFG-TMODE-")
+        print(f"[UBX] warm start: {len(changed)}/{len(desired)} keys differ")
+        if any(is_tmode(key) for key in changed.keys()):
+            # Vị trí base khác: cấu hình fixed mode đầy đủ như khởi động lạnh
+            outputs = changed.select(lambda key: not is_tmode(key))
+            if len(outputs):
+                self.send_config(outputs, "warm start")
+            self.run_fixed_mode()
+        elif len(changed):
+            self.send_config(changed, "warm start")
+
     def run_fixed_mode(self):
         if self.is_connected == False:
             self._connect()
 
         self._disable()
         # print(f"x >> {self.ecef_x} y >> {self.ecef_y} z >> {self.ecef_z} acc >> {self.accuracy}")
-        if self.mode == BaseState.SURVEY_IN:
-            try:
-                self.gps_serial.readyRead.disconnect(self.process_survey_in_data)
-            except Exception:
-                pass
+        # Ngắt handler cũ (kể cả handle_fixed) để không bị nối hai lần
+        handler = self.process_survey_in_data if self.mode == BaseState.SURVEY_IN else self.handle_fixed
+        try:
+            self.gps_serial.readyRead.disconnect(handler)
+        except Exception:
+            pass
         self.set_fixed_mode(
             ecef_x_=self.ecef_x,
             ecef_y_=self.ecef_y,
@@ -140,17 +314,39 @@ class BaseController(QObject):
             accuracy_=self.accuracy,
         )
         self.mode = BaseState.FIXED
+        self.rtcm3_framer.reset()
         self.gps_serial.readyRead.connect(self.handle_fixed)
+        self.start_watchdog()
 
     def handle_fixed(self):
+        read_at = time.monotonic()
         gps_data = self.read_data()
-        self.rtcm3_signal.emit(gps_data)
-        # print(f"gps data >> {gps_data}")
+        if not gps_data:
+            return
+        self.last_data = read_at
+        if self.commands.pending:
+            # Chỉ tìm ACK trong luồng RTCM khi đang có lệnh chờ
+            for msg_class, msg_id, payload in self.ubx_decoder.feed(gps_data):
+                self.commands.on_ubx(msg_class, msg_id, payload)
+        # Chỉ phát các khung RTCM3 hoàn chỉnh, đã kiểm tra CRC
+        frames = self.rtcm3_framer.feed(gps_data)
+        if not frames:
+            return
+        self.last_frame = read_at
+        self.rtcm3_stats.feed(frames, read_at)
+        if self.metrics is not None:
+            self.metrics.frames_completed(frames, read_at, self.name)
+        recorder = self.recorder
+        for frame in frames:
+            self.rtcm3_signal.emit(frame)
+            if recorder is not None:
+                recorder.record_rtcm(frame)
 
     def _connect(self):
         try:
             self.gps_serial = QSerialPort(self.port)
             self.gps_serial.setBaudRate(QSerialPort.BaudRate.Baud115200)
+            self.gps_serial.errorOccurred.connect(self.on_serial_error)
             if not self.gps_serial.open(QSerialPort.OpenModeFlag.ReadWrite):
                 print("Failed to open base station port")
                 return
@@ -164,210 +360,264 @@ class BaseController(QObject):
 
     def reconnect(self):
         print(f"Reconnect ZED-F9P {self.port}")
+        self.begin_reconnect("manual")
+
+    # ------------------------------------------------------------------
+    # Watchdog / kết nối lại
+    # ------------------------------------------------------------------
+    def start_watchdog(self):
+        """Gọi trong thread của BaseController (timer thuộc thread đó)"""
+        if self.watchdog_timer is None:
+            self.watchdog_timer = QTimer(self)
+            self.watchdog_timer.timeout.connect(self.check_stream)
+        self.watchdog_started = self.last_data = self.last_frame = time.monotonic()
+        self.watchdog_timer.start(max(50, int(self.stall_timeout() * 250)))
+
+    def stall_timeout(self):
+        """Thời gian (s) không có dữ liệu thì coi là mất kết nối, tối thiểu 3 epoch"""
+        timeout = self.settings.getInt("gps.stall_timeout_ms", 1500) / 1000.0
+        if self.rate:
+            timeout = max(timeout, 3.0 / self.rate)
+        return timeout
+
+    def check_stream(self):
+        if self.reconnecting:
+            return
+        now = time.monotonic()
+        timeout = self.stall_timeout()
+        if now - self.last_data > timeout:
+            self.begin_reconnect(f"no data for {now - self.last_data:.1f}s")
+        elif (
+            self.mode == BaseState.FIXED
+            and now - self.last_frame > timeout
+            and self.frame_stall_reported != self.last_frame
+        ):
+            # Cổng vẫn nhận byte (receiver chưa phát MSM, sai cấu hình output, ...):
+            # mở lại cổng không giúp được gì, chỉ báo một lần
+            self.frame_stall_reported = self.last_frame
+            print(f"[BASE] {self.port}: data but no valid RTCM3 frame for {now - self.last_frame:.1f}s")
+
+    def on_serial_error(self, error):
+        # ResourceError: cổng biến mất (rút USB, receiver reset)
+        if error in (
+            QSerialPort.SerialPortError.ResourceError,
+            QSerialPort.SerialPortError.DeviceNotFoundError,
+            QSerialPort.SerialPortError.PermissionError,
+        ):
+            self.begin_reconnect(f"serial error {error}")
+
+    def begin_reconnect(self, reason):
+        if self.reconnecting:
+            return
+        print(f"[BASE] link lost ({reason}), reconnecting {self.port}")
+        self.reconnecting = True
+        self.outage_started = time.monotonic()
+        self.outages += 1
+        min_delay = self.settings.getInt("gps.reconnect_min_ms", 50) / 1000.0
+        if self.watchdog_started and self.last_data <= self.watchdog_started:
+            # Lần mở lại trước không nhận được byte nào: giữ backoff thay vì mở lại ngay
+            max_delay = self.settings.getInt("gps.reconnect_max_ms", 5000) / 1000.0
+            self.reconnect_delay = min(max(self.reconnect_delay, min_delay) * 2, max_delay)
+            self._close()
+            QTimer.singleShot(int(self.reconnect_delay * 1000), self._try_reconnect)
+            return
+        self.reconnect_delay = min_delay
+        self._close()
+        self._try_reconnect()
+
+    def _close(self):
+        if self.gps_serial is not None:
+            try:
+                self.gps_serial.errorOccurred.disconnect(self.on_serial_error)
+            except Exception:
+                pass
+            self.gps_serial.close()
+            self.gps_serial.deleteLater()
+        self.gps_serial = None
+        self.is_connected = False
+        self.commands.reset()
+
+    def _try_reconnect(self):
+        self.reconnect_attempts += 1
+        if self.port_resolver is not None:
+            # Tên tty có thể đổi sau khi USB enumerate lại (ttyACM0 -> ttyACM1)
+            port = self.port_resolver()
+            if port is not None:
+                self.port = port
+        self._close()
         self._connect()
+        if not self.is_connected:
+            delay = self.reconnect_delay
+            # Giây đầu thử dày (USB reset thường enumerate lại trong vài trăm ms),
+            # sau đó giãn theo cấp số nhân
+            if time.monotonic() - self.outage_started >= 1.0:
+                max_delay = self.settings.getInt("gps.reconnect_max_ms", 5000) / 1000.0
+                self.reconnect_delay = min(delay * 2, max_delay)
+            QTimer.singleShot(int(delay * 1000), self._try_reconnect)
+            return
 
-    def send_cmd(self, cmd):
-        self.gps_serial.write(cmd)
-        # print(
-        #     " ".join(cmd.hex()[i : i + 2].upper() for i in range(0, len(cmd.hex()), 2))
-        # )
+        self.last_outage = time.monotonic() - self.outage_started
+        self.total_outage += self.last_outage
+        self.reconnecting = False
+        print(f"[BASE] reconnected {self.port} after {self.last_outage * 1000:.0f} ms")
+        self.restore_mode()
 
-    def calculate_checksum(self, payload):
-        ck_a = 0
-        ck_b = 0
-        for byte in payload:
-            ck_a = (ck_a + byte) % 256
-            ck_b = (ck_b + ck_a) % 256
-        return [ck_a, ck_b]
-
-    def build_ubx_cfg_valset(self, keys_values, layer_):
-        length = sum(len(key) + len(value) for key, value in keys_values) + 4
-        length_bytes = [length & 0xFF, (length >> 8) & 0xFF]
-        version = [0x01]  # Version 1
-        layer = [layer_]
-        reserved = [0x00, 0x00]
-
-        # Payload UBX-CFG-VALSET
-        payload = version + layer + reserved
-        for key, value in keys_values:
-            payload += key + value
-
-        checksum = self.calculate_checksum(
-            [self.UBX_VAL_SET_CLASS, self.UBX_ID] + length_bytes + payload
-        )
+    def restore_mode(self):
+        """
+        Áp dụng lại chế độ hiện tại sau khi mở lại cổng, parser bắt đầu từ đầu.
+        Fixed mode dùng warm_start(): receiver thường vẫn giữ cấu hình RAM sau
+        khi mất USB nên không disable TMODE và không ghi flash.
+        """
+        if self.mode == BaseState.SURVEY_IN:
+            # Receiver vẫn giữ tiến trình survey-in nếu chỉ mất kết nối USB
+            self.ubx_decoder.reset()
+            self.gps_serial.readyRead.connect(self.process_survey_in_data)
+            self.start_watchdog()
+        else:
+            self.warm_start()
+
+    def link_stats(self):
+        return {
+            "connected": self.is_connected,
+            "port": self.port,
+            "outages": self.outages,
+            "reconnect_attempts": self.reconnect_attempts,
+            "last_outage_ms": round(self.last_outage * 1000),
+            "total_outage_s": round(self.total_outage, 3),
+        }
 
-        return bytes(
-            self.UBX_VAL_SET_HEADER
-            + [self.UBX_VAL_SET_CLASS, self.UBX_ID]
-            + length_bytes
-            + payload
-            + checksum
-        )
+    def _write_serial(self, data):
+        if self.gps_serial is not None:
+            self.gps_serial.write(data)
+
+    def send_cmd(self, cmd, label=None):
+        """Gửi lệnh UBX; trả về Future (True khi receiver ACK)"""
+        return self.commands.send(cmd, label)
+
+    def send_config(self, transaction, label=None):
+        """
+        Gửi ConfigTransaction (ít khung CFG-VALSET nhất có thể);
+        trả về list Future, mỗi khung một Future.
+        """
+        frames = transaction.frames()
+        if len(frames) == 1:
+            return [self.send_cmd(frames[0], label)]
+        return [
+            self.send_cmd(frame, f"{label} {index}/{len(frames)}")
+            for index, frame in enumerate(frames, 1)
+        ]
+
+    def read_config(self, keys, layer=UBXProtocol.VALGET_LAYER_RAM):
+        """CFG-VALGET cho keys; trả về list Future (payload trả lời hoặc None), mỗi khung một Future"""
+        return [
+            self.commands.send(frame, "read config", poll=True)
+            for frame in UBXConfig.valget_frames(keys, layer)
+        ]
+
+    def calculate_checksum(self, payload):
+        return list(UBXProtocol.ubx_checksum(bytes(payload)))
 
     def set_survey_in_mode(self, duration=300, accuracy_=100, layer_=0x01):
         """
         duration (s)
         accuracy (mm)
         """
-        accuracy = int(accuracy_ * 10)
-        keys_values = [
-            (self.KEY_ID_TMODE3, self.MODE_SURVEY_IN),  # Enable Survey-In
-            (
-                self.KEY_ID_SVIN_MIN_DUR,
-                list(duration.to_bytes(4, "little", signed=False)),
-            ),
-            (
-                self.KEY_ID_SVIN_ACC_LIMIT,
-                list(accuracy.to_bytes(4, "little", signed=False)),
-            ),
-        ]
-        ubx_message = self.build_ubx_cfg_valset(keys_values, layer_)
-        self.send_cmd(ubx_message)
+        tx = ConfigTransaction().update(
+            {
+                "CFG-TMODE-MODE": UBXConfig.TMODE_SURVEY_IN,
+                "CFG-TMODE-SVIN_MIN_DUR": duration,
+                "CFG-TMODE-SVIN_ACC_LIMIT": accuracy_,
+            },
+            layer_,
+        )
+        self.send_config(tx, "survey-in mode")
         print(f"Survey-In Mode: Duration={duration}s, Accuracy={accuracy_}mm")
 
+    def fixed_mode_config(self, ecef_x, ecef_y, ecef_z, accuracy, layers):
+        """
+        x,y,z (cm)
+        accuracy (mm)
+        """
+        return ConfigTransaction().update(
+            {
+                "CFG-TMODE-MODE": UBXConfig.TMODE_FIXED,
+                "CFG-TMODE-FIXED_POS_ACC": accuracy,
+                "CFG-TMODE-POS_TYPE": UBXConfig.TMODE_POS_ECEF,
+                "CFG-TMODE-ECEF_X": ecef_x,
+                "CFG-TMODE-ECEF_X_HP": 0,
+                "CFG-TMODE-ECEF_Y": ecef_y,
+                "CFG-TMODE-ECEF_Y_HP": 0,
+                "CFG-TMODE-ECEF_Z": ecef_z,
+                "CFG-TMODE-ECEF_Z_HP": 0,
+            },
+            layers,
+        )
+
     def set_fixed_mode(self, ecef_x_, ecef_y_, ecef_z_, accuracy_, layer_=0x01):
         """
         x,y,z (cm)
         accuracy (mm)
         """
-        ecef_x = ecef_x_
-        ecef_y = ecef_y_
-        ecef_z = ecef_z_
-
-        accuracy = int(accuracy_ * 10)
-        keys_values = [
-            (self.KEY_ID_TMODE3, self.MODE_FIXED),
-            (
-                self.KEY_ID_FIXED_ACCURACY,
-                list(accuracy.to_bytes(4, "little", signed=False)),
-            ),
-            (self.KEY_ID_POS_TYPE, self.ECEF),
-            (self.KEY_ID_ECEF_X, list(ecef_x.to_bytes(4, "little", signed=True))),
-            (self.KEY_ID_ECEF_X_HP, self.DISABLE),
-            (self.KEY_ID_ECEF_Y, list(ecef_y.to_bytes(4, "little", signed=True))),
-            (self.KEY_ID_ECEF_Y_HP, self.DISABLE),
-            (self.KEY_ID_ECEF_Z, list(ecef_z.to_bytes(4, "little", signed=True))),
-            (self.KEY_ID_ECEF_Z_HP, self.DISABLE),
-        ]
-        ubx_message = self.build_ubx_cfg_valset(keys_values, layer_)
-        self.send_cmd(ubx_message)
+        tx = self.fixed_mode_config(ecef_x_, ecef_y_, ecef_z_, accuracy_, layer_)
+        self.send_config(tx, "fixed mode")
         print(
             f"Fixed Mode: X={ecef_x_}cm, Y={ecef_y_}cm, Z={ecef_z_}cm, Accuracy={accuracy_}mm"
         )
 
     def _disable(self):
-        cmd = [
-            0xB5,
-            0x62,
-            0x06,
-            0x8A,
-            0x09,
-            0x00,
-            0x01,
-            0x05,
-            0x00,
-            0x00,
-            0x01,
-            0x00,
-            0x03,
-            0x20,
-            0x00,
-            0xC3,
-            0xA8,
-        ]
-        _cmd = bytes(cmd)
-        self.send_cmd(_cmd)
-
-    def disable_NMEA(self):
-        NMEA_ID_GGA_USB = [0xBD, 0x00, 0x91, 0x20]  # 0x209100bd
+        self.send_cmd(UBXProtocol.CFG_VALSET_TMODE3_DISABLE, "disable TMODE3")
 
-        # keys_values = [
-        #     self.
-        # ]
+    def output_config(self, tx=None, layers=None):
+        """
+        Bộ message xuất trên USB mà server cần: RTCM3 bật, NMEA tắt (chỉ làm
+        nhiễu luồng RTCM), cùng tần số đo hiện tại.
+        """
+        tx = ConfigTransaction() if tx is None else tx
+        layers = self.RAM if layers is None else layers
+        for name in UBXConfig.RTCM_OUTPUT_KEYS:
+            tx.set(name, 1, layers)
+        for name in UBXConfig.NMEA_OUTPUT_KEYS:
+            tx.set(name, 0, layers)
+        if self.rate:
+            tx.set("CFG-RATE-MEAS", int(1000 / self.rate), layers)
+        return tx
+
+    def configure_outputs(self, layers=None):
+        """Cấu hình lại toàn bộ message xuất trong một transaction"""
+        return self.send_config(self.output_config(layers=layers), "output config")
+
+    def disable_NMEA(self, layer_=0x01):
+        tx = ConfigTransaction()
+        for name in UBXConfig.NMEA_OUTPUT_KEYS:
+            tx.set(name, 0, layer_)
+        self.send_config(tx, "disable NMEA")
 
     def svin_message(self, value, layer_):
-        if value == 1:
-            keys_values = [
-                (self.MSG_OUT_NAV2_SVIN_KEY_ID, self.SET),  # Enable Survey-in MSG
-            ]
-        else:
-            keys_values = [
-                (self.MSG_OUT_NAV2_SVIN_KEY_ID, self.RESET),  # disable Survey-in MSG
-            ]
-        ubx_message = self.build_ubx_cfg_valset(keys_values, layer_)
-        self.send_cmd(ubx_message)
+        tx = ConfigTransaction().set("CFG-MSGOUT-UBX_NAV2_SVIN_USB", 1 if value == 1 else 0, layer_)
+        self.send_config(tx, "NAV-SVIN output")
 
     def enable_RTCM_message(self, layer_):
-        keys_values = [
-            (self.MSG_OUT_RTCM3_1005_USB_KEY_ID, self.SET),
-            (self.MSG_OUT_RTCM3_1074_USB_KEY_ID, self.SET),
-            (self.MSG_OUT_RTCM3_1084_USB_KEY_ID, self.SET),
-            (self.MSG_OUT_RTCM3_1124_USB_KEY_ID, self.SET),
-            (self.MSG_OUT_RTCM3_1230_USB_KEY_ID, self.SET),  # Enable Survey-in MSG
-        ]
-        ubx_message = self.build_ubx_cfg_valset(keys_values, layer_)
-        self.send_cmd(ubx_message)
+        tx = ConfigTransaction()
+        for name in UBXConfig.RTCM_OUTPUT_KEYS:
+            tx.set(name, 1, layer_)
+        self.send_config(tx, "RTCM output")
 
     def set_rate(self, rate):
         if rate <= 0:
             return
-        VariableManager.instance.set("gps.rate", rate)
-        VariableManager.instance.save()
+        self.settings.set("gps.rate", rate)
+        self.settings.save()
         self.rate = rate
-        period_ms = int(1000 / rate)
-        keys_values = [
-            (self.KEY_ID_RATE, list(period_ms.to_bytes(2, "little", signed=False)))
-        ]
-        ubx_message_RAM = self.build_ubx_cfg_valset(
-            keys_values=keys_values, layer_=self.RAM
-        )
-        self.send_cmd(ubx_message_RAM)
-        ubx_message_Flash = self.build_ubx_cfg_valset(
-            keys_values=keys_values, layer_=self.FLASH
-        )
-        self.send_cmd(ubx_message_Flash)
+        # RAM và FLASH trong cùng một khung (layer là bitmask)
+        tx = ConfigTransaction().set("CFG-RATE-MEAS", int(1000 / rate), self.RAM | self.FLASH)
+        self.send_config(tx, "rate")
 
     def read_data(self):
-        gps_data = self.gps_serial.read(1024)
+        # Đọc hết dữ liệu đang chờ, readyRead sẽ không báo lại phần còn sót
+        gps_data = self.gps_serial.readAll()
         if gps_data is None:
             return None
-        return gps_data
-
-    def parse_ubx_message(self, buffer):
-        """
-        Tìm kiếm và tách một khung tin UBX từ buffer.
-        Trả về tuple (msg_class, msg_id, payload) nếu tìm thấy message hợp lệ,
-        và buffer đã được cắt bỏ phần message đã xử lý.
-
-        buffer là một bytearray.
-        """
-        header_index = buffer.find(b"\xB5\x62")
-        if header_index == -1:
-            return None, bytearray()
-        if header_index > 0:
-            buffer = buffer[header_index:]
-
-        if len(buffer) < 6:
-            return None, buffer
-
-        msg_class = buffer[2]
-        msg_id = buffer[3]
-        # Đọc độ dài payload (little-endian)
-        length = buffer[4] | (buffer[5] << 8)
-
-        total_length = 6 + length + 2
-        if len(buffer) < total_length:
-            return None, buffer
-
-        message = buffer[:total_length]
-        ck_a, ck_b = self.calculate_checksum(message[2 : 6 + length])
-        if ck_a != message[-2] or ck_b != message[-1]:
-            print("Checksum không hợp lệ!")
-            return None, buffer[1:]
-
-        payload = message[6 : 6 + length]
-        buffer = buffer[total_length:]
-        return (msg_class, msg_id, payload), buffer
+        return gps_data.data()
 
     def decode_ubx_svin(self, payload):
         """
@@ -448,52 +698,63 @@ class BaseController(QObject):
         if valid == 1:
             self.is_survey_in = False
             print("Survey-In hoan tat")
-            with open("survey_in_complete.txt", "a") as f:
-                f.write(f"Version: {version}\n")
-                f.write(f"iTOW: {iTOW}\n")
-                f.write(f"Duration: {dur}\n")
-                f.write(f"Mean X: {meanX}\n")
-                f.write(f"Mean Y: {meanY}\n")
-                f.write(f"Mean Z: {meanZ}\n")
-                f.write(f"Mean X HP: {meanXHP}\n")
-                f.write(f"Mean Y HP: {meanYHP}\n")
-                f.write(f"Mean Z HP: {meanZHP}\n")
-                f.write(f"Mean Accuracy: {meanAcc}\n")
-                f.write(f"Observations: {obs}\n")
-                f.write(f"Valid: {valid}\n")
-                f.write(f"Active: {active}\n")
-                f.write("\n")
-                return data_decoded
+            self.svin_complete_log.record(*(data_decoded[field] for field in SVIN_LOG_FIELDS))
         return data_decoded
 
     def process_survey_in_data(self):
-        survey_buffer = bytearray()
         base_station_data = self.read_data()
-        if base_station_data is None:
-            return
-
-        survey_buffer.extend(base_station_data)
-        result, survey_buffer = self.parse_ubx_message(buffer=survey_buffer)
-        if result is None:
+        if not base_station_data:
             return
+        self.last_data = time.monotonic()
+
+        # Xử lý tất cả message UBX hoàn chỉnh trong lần đọc này
+        for msg_class, msg_id, payload in self.ubx_decoder.feed(base_station_data):
+            if msg_class in (UBX_CLASS_ACK, UBX_CLASS_CFG):
+                self.commands.on_ubx(msg_class, msg_id, payload)
+                continue
+            if self.recorder is not None:
+                self.recorder.record_ubx(msg_class, msg_id, payload)
+            if msg_class == self.NAV_SVIN_CLASS and msg_id == self.NAV_SVIN_ID:
+                svin_data = self.decode_ubx_svin(payload=payload)
+                # Ghi nền theo lô, không chặn thread đọc serial
+                self.svin_log.record(*(svin_data[field] for field in SVIN_LOG_FIELDS))
+                engine = self.survey_engine
+                if engine is not None:
+                    svin_data["host"] = engine.summary()
+                self.survey_in_data.emit(svin_data)
+                if engine is not None and svin_data["valid"] == 1:
+                    # Receiver đã xác nhận vị trí trước engine
+                    self.finish_survey_in(svin_data)
+                    break
+                if engine is not None and engine.timed_out():
+                    # Không chuyển fixed khi vị trí chưa đạt accuracy: chờ receiver
+                    self.stop_survey_engine()
+            elif (
+                msg_class == NAV_HPPOSECEF_CLASS
+                and msg_id == NAV_HPPOSECEF_ID
+                and self.survey_engine is not None
+            ):
+                if self.survey_engine.update(payload):
+                    # Đã chuyển sang fixed, phần còn lại của lần đọc bỏ qua
+                    self.finish_survey_in()
+                    break
 
-        msg_class, msg_id, payload = result
-        if msg_class == self.NAV_SVIN_CLASS and msg_id == self.NAV_SVIN_ID:
-            svin_data = self.decode_ubx_svin(payload=payload)
-            with open("svin_data.txt", "a") as file:
-                for key, value in svin_data.items():
-                    file.write(f"{key}: {value}\n")
-                file.write("\n")
-            self.survey_in_data.emit(svin_data)
     def get_data(self):
         base_data = {
+            "name": self.name,
             "ecef_x":self.ecef_x,
             "ecef_y":self.ecef_y,
             "ecef_z":self.ecef_z,
             "acc": self.accuracy,
             "mode": self.mode,
             "rate": self.rate,
+            "rtcm3": self.rtcm3_framer.stats(),
+            "stream": self.rtcm3_stats.summary(),
+            "link": self.link_stats(),
+            "commands": self.commands.stats(),
         }
+        if self.metrics is not None:
+            base_data["latency"] = self.metrics.summary()
         self.base_data.emit(base_data)
     
 if __name__ == "__main__":
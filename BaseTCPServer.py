@@ -1,14 +1,33 @@
-from PySide6.QtCore import QThread, Signal as pyqtSignal, QObject, QTimer
-from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QCoreApplication, Signal as pyqtSignal, QObject, QTimer
 from PySide6.QtNetwork import QTcpServer, QTcpSocket, QHostAddress
-from ConstVariable import BASE_STATION
+from SendQueue import FanoutRegistry
+from FanoutConfig import FanoutConfig, ServerMode
+import LatencyMetrics
+import NtripCaster
 import sys
-import serial
-import socket
-import threading
 import time
 import signal
-import VariableManager
+
+
+# Giới hạn dữ liệu nằm trong buffer nội bộ của QTcpSocket, phần còn lại
+# chờ trong ClientSendQueue nơi áp dụng chính sách bỏ epoch cũ
+SOCKET_HIGH_WATERMARK = 8 * 1024
+
+
+class StreamInput(QObject):
+    """
+    Đầu vào RTCM của một receiver. Là QObject sống cùng thread với server nên
+    rtcm3_signal của BaseController chạy trên thread khác nối vào được bằng
+    QueuedConnection.
+    """
+
+    def __init__(self, server, stream):
+        super().__init__(server)
+        self.server = server
+        self.stream = stream
+
+    def send_RTCM3(self, data: bytes):
+        self.server.send_RTCM3(data, self.stream)
 
 
 class BaseTCPServer(QObject):
@@ -18,29 +37,64 @@ class BaseTCPServer(QObject):
         super().__init__()
         self.TCP_HOST = None
         self.TCP_PORT = None
+        self.config = None
         self.server = QTcpServer(self)
-        self.clients = set()
+        self.registry = FanoutRegistry()
+        self.clients = self.registry.clients  # QTcpSocket -> ClientSendQueue
+        self.pending = {}  # QTcpSocket -> [buffer, deadline] chờ request NTRIP
+        self.inputs = {}  # stream -> StreamInput
         self.running = True
+        self.metrics = LatencyMetrics.active()
         self.load_setting()
-        
+
         self.server.newConnection.connect(self.handle_new_connection)
-    
+        self.handshake_timer = QTimer(self)
+        self.handshake_timer.timeout.connect(self.expire_handshakes)
+
     def start(self):
         if not self.server.listen(QHostAddress(self.TCP_HOST), self.TCP_PORT):
             self.error_signal.emit(f"Server failed to start: {self.server.errorString()}")
         else:
-            print(f"[SERVER STARTED] Listening on {self.TCP_HOST}:{self.TCP_PORT}")
+            print(f"[SERVER STARTED] Listening on {self.TCP_HOST}:{self.TCP_PORT} ({self.config.mode})")
+            if self.config.mode == ServerMode.NTRIP:
+                self.handshake_timer.start(1000)
 
     def load_setting(self):
-        self.TCP_HOST = VariableManager.instance.get("tcp.host", "0.0.0.0")
-        self.TCP_PORT = int(VariableManager.instance.get("tcp.port", 8765))
-    
+        self.config = FanoutConfig()
+        self.TCP_HOST = self.config.host
+        self.TCP_PORT = self.config.port
+
+    def apply_settings(self, keys):
+        """Nạp lại tcp.* / ntrip.*; client đang kết nối giữ nguyên hàng đợi"""
+        if not any(key.startswith(("tcp.", "ntrip.")) for key in keys):
+            return
+        address = (self.TCP_HOST, self.TCP_PORT)
+        self.load_setting()
+        if (self.TCP_HOST, self.TCP_PORT) != address:
+            self.server.close()
+            self.start()
+        elif self.config.mode == ServerMode.NTRIP and not self.handshake_timer.isActive():
+            self.handshake_timer.start(1000)
+
     def handle_new_connection(self):
         while self.server.hasPendingConnections():
             client_socket = self.server.nextPendingConnection()
             client_socket.disconnected.connect(lambda sock=client_socket: self.remove_client(sock))
             client_socket.readyRead.connect(lambda sock=client_socket: self.read_data(sock))
-            self.clients.add(client_socket)
+            client_socket.bytesWritten.connect(lambda _, sock=client_socket: self.flush_client(sock))
+            if self.config.mode == ServerMode.NTRIP:
+                # Chỉ nhận RTCM sau khi request NTRIP hợp lệ
+                self.pending[client_socket] = [
+                    bytearray(),
+                    time.monotonic() + self.config.handshake_timeout_ms / 1000.0,
+                ]
+            else:
+                self.registry.add(
+                    client_socket,
+                    self.config.new_queue(),
+                    self.config.raw_subscription,
+                    self.config.default_stream,
+                )
 
             address = client_socket.peerAddress().toString()
             port = client_socket.peerPort()
@@ -48,50 +102,154 @@ class BaseTCPServer(QObject):
 
     def read_data(self, client_socket: QTcpSocket):
         data = client_socket.readAll()
+        if client_socket in self.pending:
+            self.handle_ntrip_request(client_socket, data.data())
+            return
         print(f"[DATA RECEIVED] {data.data()}")
 
+    def handle_ntrip_request(self, client_socket: QTcpSocket, data: bytes):
+        buffer = self.pending[client_socket][0]
+        buffer.extend(data)
+        try:
+            request, _ = NtripCaster.parse_request(buffer)
+        except NtripCaster.NtripError as e:
+            print(f"[NTRIP] bad request: {e}")
+            del self.pending[client_socket]
+            client_socket.write(NtripCaster.response_bad_request())
+            client_socket.disconnectFromHost()
+            return
+        if request is None:
+            return
+
+        del self.pending[client_socket]
+        response, mount, subscription, chunked = self.config.accept_ntrip(request)
+        client_socket.write(response)
+        if mount is None:
+            client_socket.disconnectFromHost()
+            return
+
+        queue = self.registry.add(client_socket, self.config.new_queue(), subscription, mount.stream)
+        queue.mountpoint = mount.name
+        queue.chunked = chunked
+        print(
+            f"[NTRIP] {client_socket.peerAddress().toString()} -> /{mount.name} "
+            f"v{request.ntrip_version} {request.user_agent}"
+        )
+
+    def expire_handshakes(self):
+        now = time.monotonic()
+        expired = [sock for sock, (_, deadline) in self.pending.items() if now > deadline]
+        for client_socket in expired:
+            del self.pending[client_socket]
+            client_socket.abort()
+
     def remove_client(self, client_socket: QTcpSocket):
-        address = client_socket.peerAddress().toString()
-        port = client_socket.peerPort()
-        print(f"[DISCONNECTED] {address}:{port}")
+        self.pending.pop(client_socket, None)
+        try:
+            address = client_socket.peerAddress().toString()
+            port = client_socket.peerPort()
+        except RuntimeError:
+            # Socket đã bị xóa (server đóng khi thoát): chỉ bỏ khỏi registry
+            self.registry.drop(client_socket)
+            return
+        queue = self.registry.drop(client_socket)
+        if queue is not None:
+            print(f"[DISCONNECTED] {address}:{port} {queue.stats()}")
+        else:
+            print(f"[DISCONNECTED] {address}:{port}")
 
         client_socket.deleteLater()
-        self.clients.discard(client_socket)
 
-    def send_RTCM3(self, data: bytes):
-        """Gửi RTCM3 tới tất cả client đang kết nối"""
+    def stream(self, name):
+        """Đầu vào cho receiver name, dùng làm đích của rtcm3_signal"""
+        if name not in self.inputs:
+            self.inputs[name] = StreamInput(self, name)
+        return self.inputs[name]
+
+    def send_RTCM3(self, data: bytes, stream=None):
+        """Gửi RTCM3 tới các client của luồng stream (None = receiver đầu tiên)"""
+        if stream is None:
+            stream = self.config.default_stream
+        if self.metrics is not None:
+            self.metrics.frame_dispatched(stream)
         if not self.clients:
             return
-        
+
+        now = time.monotonic()
         remove_clients = []
-        for client in self.clients:
+        evict_clients = []
+        # Đưa vào hàng đợi hết trước khi ghi: write() có thể phát disconnected
+        # ngay (remove_client sửa registry) khi socket lỗi
+        for client, queue in list(self.registry.publish(data, now, stream)):
             if client.state() != QTcpSocket.ConnectedState:
                 remove_clients.append(client)
                 continue
+            if queue.should_evict(now):
+                evict_clients.append(client)
+                continue
 
             try:
-                client.write(data)
+                self.flush_client(client)
             except Exception as e:
                 print(f"[ERROR] Failed to send data to client: {e}")
                 remove_clients.append(client)
 
         for client in remove_clients:
-            self.clients.discard(client)
+            self.registry.drop(client)
+        for client in evict_clients:
+            self.evict_client(client)
+
+    def flush_client(self, client: QTcpSocket):
+        """Chuyển khung từ hàng đợi sang socket tới khi chạm high watermark"""
+        queue = self.clients.get(client)
+        if queue is None:
+            return
+        if queue.chunked:
+            while queue and client.bytesToWrite() < SOCKET_HIGH_WATERMARK:
+                client.write(NtripCaster.chunk(queue.pop()))
+        else:
+            while queue and client.bytesToWrite() < SOCKET_HIGH_WATERMARK:
+                client.write(queue.pop())
+
+    def evict_client(self, client: QTcpSocket):
+        """Ngắt client quá chậm để giữ bộ nhớ ổn định"""
+        queue = self.clients.get(client)
+        address = client.peerAddress().toString()
+        port = client.peerPort()
+        print(f"[EVICTED] {address}:{port} slow client {queue.stats() if queue else ''}")
+        if queue is not None:
+            queue.clear()
+        client.abort()
+
+    def subscription_stats(self):
+        return self.registry.subscription_stats()
+
+    def client_stats(self):
+        stats = []
+        for client, queue in self.clients.items():
+            item = queue.stats()
+            item["address"] = f"{client.peerAddress().toString()}:{client.peerPort()}"
+            stats.append(item)
+        return stats
 
     def stop(self):
         """Dừng server"""
         print("[SERVER STOPPING]")
         self.server.close()
+        self.handshake_timer.stop()
         self._close_all_clients()
 
     def _close_all_clients(self):
+        while self.pending:
+            client, _ = self.pending.popitem()
+            client.close()
         while self.clients:
-            client = self.clients.pop()
+            client, _ = self.clients.popitem()
             client.close()
-        self.clients.clear()
+        self.registry.clear()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    app = QCoreApplication(sys.argv)
 
     tcp_server = BaseTCPServer()
     tcp_server.start()  # Dùng .start() thay vì moveToThread()
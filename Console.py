@@ -1,9 +1,13 @@
-from PySide6.QtCore import QObject, Signal as pyqtSignal, QMutex, QTimer
-from PySide6.QtWidgets import QApplication
-import socketio
+from PySide6.QtCore import QObject, Signal as pyqtSignal
 import time
 import VariableManager
-sio = socketio.Client()
+from TelemetryPublisher import TelemetryPublisher
+# socketio.Client, tạo trong socketio_thread (import socketio chậm, không
+# để nó nằm trên đường khởi động)
+sio = None
+# Gộp svin_status / base_data thành packet "telemetry" theo socketio.publish_hz
+publisher = TelemetryPublisher(None)
+SERVERS = []  # mọi ExternalCmdServer, socketio_thread đăng ký và kết nối tất cả namespace
 
 
 class ExternalCmdServer(QObject):
@@ -12,22 +16,29 @@ class ExternalCmdServer(QObject):
     disable = pyqtSignal()
     rate = pyqtSignal(int)
     request_signal = pyqtSignal()
-    def __init__(self):
+    def __init__(self, namespace="/base"):
         super().__init__()
-        self.sio = sio
+        self.sio = None
+        self.namespace = namespace
         self.is_connected = False
-
         self.hasRegisteredEvents = False
+        SERVERS.append(self)
+
+    def register(self, client):
+        """Đăng ký handler trên client Socket.IO (gọi từ socketio_thread)"""
+        self.sio = client
         if not self.hasRegisteredEvents:
-            self.sio.on("connect", self.on_connect, namespace="/base")
-            self.sio.on("fixed", self.handle_fixed, namespace="/base")
-            self.sio.on("survey_in", self.handle_survey_in, namespace="/base")
-            self.sio.on("rate", self.handle_rate, namespace="/base")
-            self.sio.on("request_data",self.handle_request_data, namespace="/base")
+            namespace = self.namespace
+            self.sio.on("connect", self.on_connect, namespace=namespace)
+            self.sio.on("fixed", self.handle_fixed, namespace=namespace)
+            self.sio.on("survey_in", self.handle_survey_in, namespace=namespace)
+            self.sio.on("rate", self.handle_rate, namespace=namespace)
+            self.sio.on("request_data",self.handle_request_data, namespace=namespace)
+            self.hasRegisteredEvents = True
 
     def on_connect(self):
         self.is_connected = True
-        print("Connected to socketio")
+        print(f"Connected to socketio {self.namespace}")
 
     def handle_fixed(self, data):
         ecef_x = int(data["ecef_x"])
@@ -60,21 +71,33 @@ class ExternalCmdServer(QObject):
         self.emitToServer("base_data",base_data)
     
     def emitToServer(self, event, data):
-        if self.sio.sid is None:
+        if publisher.enabled:
+            # Gọi được từ thread của BaseController, không chờ socket
+            publisher.publish(self.namespace, event, data)
+            return
+        if self.sio is None or self.sio.sid is None:
             return
         if self.is_connected == False:
             return
-        self.sio.emit(event, data, namespace="/base")
+        self.sio.emit(event, data, namespace=self.namespace)
 
     def send_svin_status(self, data):
         self.emitToServer("svin_status", data=data)
 
 
 def socketio_thread():
+    global sio
+    import socketio
+
+    sio = socketio.Client()
+    publisher.sio = sio
+    for server in SERVERS:
+        server.register(sio)
+    namespaces = [server.namespace for server in SERVERS] or ["/base"]
     while True:
         # Connect to the Socket.IO server
         try:
-            sio.connect("http://localhost:8901", namespaces=["/base"])
+            sio.connect("http://localhost:8901", namespaces=namespaces)
             print(f"Connection established to server at {sio.eio}")
             sio.wait()
         except socketio.exceptions.ConnectionError as e:
@@ -1,5 +1,16 @@
 import math
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Hằng số WGS84 dùng chung cho mọi hàm
+WGS84_A = 6378137.0  # Bán trục lớn (m)
+WGS84_F = 1 / 298.257223563  # Độ dẹt
+WGS84_E2 = WGS84_F * (2 - WGS84_F)  # Độ lệch tâm bình phương (6.69437999014e-3)
+WGS84_E4 = WGS84_E2 * WGS84_E2
+
 
 def WGS_to_ECEF(lat, lon, alt):
     """
@@ -10,9 +21,8 @@ def WGS_to_ECEF(lat, lon, alt):
     :param alt: Độ cao so với ellipsoid WGS84 (m)
     :return: (X, Y, Z) tọa độ ECEF
     """
-    # Hằng số WGS84
-    a = 6378137.0  # Bán trục lớn (m)
-    e_sq = 6.69437999014 * 10**-3  # Độ lệch tâm bình phương
+    a = WGS84_A
+    e_sq = WGS84_E2
 
     # Chuyển đổi sang radian
     lat_rad = math.radians(lat)
@@ -30,35 +40,144 @@ def WGS_to_ECEF(lat, lon, alt):
 
 
 def ECEF_to_WGS84(x=None, y=None, z=None, tolerance=1e-12):
-    a = 6378137.0
-    e2 = 0.00669438
-
-    # kinh độ
-    _lon = math.atan2(y, x)
-    # khoảng cách p trên mặt phẳng x y
-    p = math.sqrt(x**2 + y**2)
-    # ước tính ban đầu cho vĩ độ
-    fi0 = math.atan2(z, p*(1-e2))
-
-    while True:
-        sin_fi = math.sin(fi0)
-        N = a / math.sqrt(1-e2*sin_fi**2)
-        new_fi = math.atan2(z+e2*N*sin_fi, p)
-        if abs(new_fi - fi0) < tolerance:
-            fi = new_fi
-            break
-        fi0 = new_fi
-
-    N = a/math.sqrt(1 - e2*math.sin(fi)**2)
-    # độ cao
-    alt = p/math.cos(fi)-N
-
-    lat = math.degrees(fi)
-    lon = math.degrees(_lon)
+    """
+    Chuyển đổi ECEF (m) sang WGS84 (lat, lon độ; alt m).
+
+    Dùng công thức đóng của Vermeille (2011), không lặp; tolerance giữ lại
+    cho tương thích với phiên bản lặp cũ.
+    """
+    a2 = WGS84_A * WGS84_A
+    e2 = WGS84_E2
+    e4 = WGS84_E4
+
+    rho2 = x * x + y * y
+    p = rho2 / a2
+    q = (1 - e2) * z * z / a2
+    r = (p + q - e4) / 6
+    s = e4 * p * q / (4 * r**3)
+    t = (1 + s + math.sqrt(s * (2 + s))) ** (1 / 3)
+    u = r * (1 + t + 1 / t)
+    v = math.sqrt(u * u + e4 * q)
+    w = e2 * (u + v - q) / (2 * v)
+    k = math.sqrt(u + v + w * w) - w
+    D = k * math.sqrt(rho2) / (k + e2)
+    dz = math.sqrt(D * D + z * z)
+
+    lat = math.degrees(2 * math.atan2(z, D + dz))
+    lon = math.degrees(math.atan2(y, x))
+    alt = (k + e2 - 1) / k * dz
+
+    return lat, lon, alt
+
+
+# ----------------------------------------------------------------------
+# Phiên bản numpy cho mảng điểm (track rover, dữ liệu survey đã lưu)
+# ----------------------------------------------------------------------
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for batch coordinate conversion")
+
+
+def WGS_to_ECEF_batch(lat, lon, alt):
+    """WGS_to_ECEF cho mảng: lat, lon (độ), alt (m) -> (X, Y, Z) mảng float64"""
+    _require_numpy()
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+    alt = np.asarray(alt, dtype=np.float64)
+
+    sin_lat = np.sin(lat_rad)
+    cos_lat = np.cos(lat_rad)
+    N = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    horizontal = (N + alt) * cos_lat
+
+    X = horizontal * np.cos(lon_rad)
+    Y = horizontal * np.sin(lon_rad)
+    Z = ((1 - WGS84_E2) * N + alt) * sin_lat
+    return X, Y, Z
 
+
+def ECEF_to_WGS84_batch(x, y, z):
+    """
+    ECEF_to_WGS84 cho mảng (công thức Vermeille, không lặp).
+    Đúng cho mọi điểm cách tâm Trái Đất hơn ~43 km, tức mọi điểm đo thực tế.
+    """
+    _require_numpy()
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    z = np.asarray(z, dtype=np.float64)
+    e2 = WGS84_E2
+    e4 = WGS84_E4
+
+    rho = np.hypot(x, y)
+    p = rho * rho / (WGS84_A * WGS84_A)
+    q = (1 - e2) / (WGS84_A * WGS84_A) * z * z
+    r = (p + q - e4) / 6
+    s = e4 * p * q / (4 * r**3)
+    t = np.cbrt(1 + s + np.sqrt(s * (2 + s)))
+    u = r * (1 + t + 1 / t)
+    v = np.sqrt(u * u + e4 * q)
+    w = e2 * (u + v - q) / (2 * v)
+    k = np.sqrt(u + v + w * w) - w
+    D = k * rho / (k + e2)
+    dz = np.hypot(D, z)
+
+    lat = np.degrees(2 * np.arctan2(z, D + dz))
+    lon = np.degrees(np.arctan2(y, x))
+    alt = (k + e2 - 1) / k * dz
     return lat, lon, alt
 
 
+def _enu_rotation(base_x, base_y, base_z):
+    lat, lon, _ = ECEF_to_WGS84(base_x, base_y, base_z)
+    lat = math.radians(lat)
+    lon = math.radians(lon)
+    return math.sin(lat), math.cos(lat), math.sin(lon), math.cos(lon)
+
+
+def ECEF_to_ENU_batch(x, y, z, base):
+    """
+    ECEF (m) -> East/North/Up (m) trong hệ tọa độ tiếp tuyến tại base.
+    base: (X, Y, Z) ECEF của trạm base (m), xem configured_base_ecef().
+    """
+    _require_numpy()
+    base_x, base_y, base_z = base
+    sin_lat, cos_lat, sin_lon, cos_lon = _enu_rotation(base_x, base_y, base_z)
+    dx = np.asarray(x, dtype=np.float64) - base_x
+    dy = np.asarray(y, dtype=np.float64) - base_y
+    dz = np.asarray(z, dtype=np.float64) - base_z
+
+    east = -sin_lon * dx + cos_lon * dy
+    t = cos_lon * dx + sin_lon * dy
+    north = -sin_lat * t + cos_lat * dz
+    up = cos_lat * t + sin_lat * dz
+    return east, north, up
+
+
+def ENU_to_ECEF_batch(east, north, up, base):
+    """Phép ngược của ECEF_to_ENU_batch"""
+    _require_numpy()
+    base_x, base_y, base_z = base
+    sin_lat, cos_lat, sin_lon, cos_lon = _enu_rotation(base_x, base_y, base_z)
+    east = np.asarray(east, dtype=np.float64)
+    north = np.asarray(north, dtype=np.float64)
+    up = np.asarray(up, dtype=np.float64)
+
+    t = -sin_lat * north + cos_lat * up
+    X = base_x - sin_lon * east + cos_lon * t
+    Y = base_y + cos_lon * east + sin_lon * t
+    Z = base_z + cos_lat * north + sin_lat * up
+    return X, Y, Z
+
+
+def configured_base_ecef():
+    """Vị trí base đang cấu hình (gps.ecef_*, lưu theo cm) đổi ra mét"""
+    import VariableManager
+
+    return tuple(
+        int(VariableManager.instance.get(f"gps.ecef_{axis}")) / 100.0 for axis in ("x", "y", "z")
+    )
+
+
 if __name__ == "__main__":
     # x_cm = -191916128
     # y_cm = 582136888
@@ -81,3 +200,23 @@ if __name__ == "__main__":
     print(f"X: {X:.2f} m")
     print(f"Y: {Y:.2f} m")
     print(f"Z: {Z:.2f} m")
+
+    if np is not None:
+        import time
+
+        count = 1_000_000
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(-89.9, 89.9, count)
+        lons = rng.uniform(-180, 180, count)
+        alts = rng.uniform(-100, 9000, count)
+        start = time.perf_counter()
+        xs, ys, zs = WGS_to_ECEF_batch(lats, lons, alts)
+        lat2, lon2, alt2 = ECEF_to_WGS84_batch(xs, ys, zs)
+        elapsed = time.perf_counter() - start
+        print(f"batch round trip {count} points: {elapsed:.3f} s")
+        print(f"max error: lat {np.abs(lat2 - lats).max():.2e} deg, alt {np.abs(alt2 - alts).max():.2e} m")
+
+        start = time.perf_counter()
+        for i in range(10000):
+            ECEF_to_WGS84(float(xs[i]), float(ys[i]), float(zs[i]))
+        print(f"scalar: {(time.perf_counter() - start) / 10000 * 1e6:.2f} us/point")
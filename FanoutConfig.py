@@ -0,0 +1,130 @@
+from ECEF_WGS84_transform import ECEF_to_WGS84
+from RTCMFilter import ALL, MessageSubscription, SubscriptionRegistry
+from SendQueue import ClientSendQueue
+import LatencyMetrics
+import NtripCaster
+import VariableManager
+
+
+class ServerMode:
+    RAW = "raw"
+    NTRIP = "ntrip"
+
+
+class StreamRoute:
+    """Đầu vào RTCM của một receiver cho các backend nhận khung từ mọi thread"""
+
+    def __init__(self, server, stream):
+        self.server = server
+        self.stream = stream
+
+    def send_RTCM3(self, data: bytes):
+        self.server.send_RTCM3(data, self.stream)
+
+
+class FanoutConfig:
+    """Cấu hình chung cho các backend phát RTCM (Qt, asyncio, ...)"""
+
+    def __init__(self):
+        self.streams = []  # tên receiver, mỗi receiver một luồng RTCM
+        self.default_stream = None  # luồng cho client raw TCP
+        self.host = None
+        self.port = None
+        self.mode = ServerMode.RAW
+        self.queue_max_bytes = None
+        self.queue_max_age_ms = None
+        self.evict_after_ms = None
+        self.handshake_timeout_ms = None
+        self.mountpoints = {}
+        self.subscriptions = SubscriptionRegistry()
+        self.raw_subscription = None
+        self.load()
+
+    def load(self):
+        self.host = VariableManager.instance.get("tcp.host", "0.0.0.0")
+        self.port = int(VariableManager.instance.get("tcp.port", 8765))
+        self.queue_max_bytes = int(VariableManager.instance.get("tcp.queue_max_bytes", 65536))
+        self.queue_max_age_ms = int(VariableManager.instance.get("tcp.queue_max_age_ms", 5000))
+        self.evict_after_ms = int(VariableManager.instance.get("tcp.evict_after_ms", 10000))
+        self.mode = VariableManager.instance.get("tcp.mode", ServerMode.RAW)
+        self.streams = VariableManager.receivers()
+        self.default_stream = self.streams[0]
+        self.raw_subscription = self.subscriptions.get(
+            VariableManager.instance.getList("tcp.messages"), self.default_stream
+        )
+        if self.mode == ServerMode.NTRIP:
+            self.load_mountpoints()
+
+    def load_mountpoints(self):
+        self.handshake_timeout_ms = int(
+            VariableManager.instance.get("ntrip.handshake_timeout_ms", 10000)
+        )
+        self.mountpoints = {}
+        # Mặc định mỗi receiver một mountpoint cùng tên
+        for name in VariableManager.instance.getList("ntrip.mountpoints") or self.streams:
+            stream = VariableManager.instance.get(
+                f"ntrip.{name}.stream", name if name in self.streams else self.default_stream
+            )
+            if stream not in self.streams:
+                print(f"[NTRIP] mountpoint {name}: unknown stream {stream}")
+                continue
+            lat, lon = self.stream_position(stream)
+            mount = NtripCaster.Mountpoint(
+                name,
+                user=VariableManager.instance.get(f"ntrip.{name}.user"),
+                password=VariableManager.instance.get(f"ntrip.{name}.password"),
+                identifier=VariableManager.instance.get(f"ntrip.{name}.identifier", ""),
+                latitude=lat,
+                longitude=lon,
+            )
+            mount.stream = stream
+            mount.subscription = self.subscriptions.get(
+                VariableManager.instance.getList(f"ntrip.{name}.messages"), stream
+            )
+            self.mountpoints[name] = mount
+
+    def stream_position(self, stream):
+        """Vĩ độ, kinh độ của receiver (gps.ecef_* lưu theo cm) cho sourcetable"""
+        settings = VariableManager.receiver_settings(stream)
+        try:
+            lat, lon, _ = ECEF_to_WGS84(
+                int(settings.get("gps.ecef_x")) / 100.0,
+                int(settings.get("gps.ecef_y")) / 100.0,
+                int(settings.get("gps.ecef_z")) / 100.0,
+            )
+        except (TypeError, ValueError):
+            lat, lon = 0.0, 0.0
+        return lat, lon
+
+    def new_queue(self):
+        queue = ClientSendQueue(
+            max_bytes=self.queue_max_bytes,
+            max_age_ms=self.queue_max_age_ms,
+            evict_after_ms=self.evict_after_ms,
+        )
+        metrics = LatencyMetrics.active()
+        if metrics is not None:
+            queue.wait_histogram = metrics.socket_write
+        return queue
+
+    def accept_ntrip(self, request):
+        """
+        Xử lý request NTRIP đã parse.
+        Trả về (response, mountpoint, subscription, chunked); mountpoint None
+        nghĩa là đóng kết nối sau khi gửi response.
+        """
+        response, mount = NtripCaster.dispatch(request, self.mountpoints)
+        if mount is None:
+            return response, None, None, False
+        # Client có thể tự chọn message qua query: GET /MOUNT?messages=1005:10,1074:1
+        subscription = mount.subscription
+        if request.messages:
+            try:
+                subscription = MessageSubscription(request.messages)
+            except ValueError as e:
+                print(f"[NTRIP] {request.mountpoint}: {e}")
+                return NtripCaster.response_bad_request(), None, None, False
+            if subscription.spec == ALL:
+                subscription = None
+        chunked = request.ntrip_version == NtripCaster.NTRIP_V2
+        return response, mount, subscription, chunked
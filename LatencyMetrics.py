@@ -0,0 +1,328 @@
+from array import array
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+from RTCM3Framer import (
+    BDS_GPS_OFFSET_MS,
+    DAY_MS,
+    GLONASS_UTC_OFFSET_MS,
+    WEEK_MS,
+    is_epoch_end,
+    is_glonass_msm,
+    message_type,
+    msm_epoch_ms,
+)
+import VariableManager
+
+# Ngưỡng bucket (giây), chia gần đều theo log từ 50 µs tới 5 s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+AGE_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+GPS_EPOCH_UNIX = 315964800  # 1980-01-06 00:00:00 UTC
+
+# Số khung tối đa nằm giữa thread đọc serial và backend phát
+STAMP_RING_SIZE = 4096
+
+
+class Histogram:
+    """
+    Histogram kiểu Prometheus với bucket cố định; observe() chỉ tăng phần tử
+    list có sẵn nên không cấp phát theo từng khung.
+    """
+
+    def __init__(self, name, help_text, bounds=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()  # nhiều receiver / backend cùng ghi
+
+    def observe(self, value):
+        # Bucket "le": value <= bound
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+    def quantile(self, q):
+        """Ước lượng quantile bằng nội suy tuyến tính trong bucket"""
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                if i >= len(self.bounds):
+                    return lower
+                return lower + (self.bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def summary(self):
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.50)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+        }
+
+    def exposition(self, prefix):
+        name = f"{prefix}_{self.name}"
+        lines = [f"# HELP {name} {self.help}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        counts = list(self.counts)
+        for bound, count in zip(self.bounds, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum {self.sum:.9f}")
+        lines.append(f"{name}_count {cumulative}")
+        return lines
+
+
+def correction_age(frame, now_unix, leap_seconds):
+    """
+    Tuổi (s) của khung MSM so với đồng hồ hệ thống: thời gian hiện tại quy
+    về hệ thời gian của chòm sao trừ epoch time trong header MSM.
+    """
+    msg_type = message_type(frame)
+    epoch = msm_epoch_ms(frame)
+    if is_glonass_msm(msg_type):
+        now_ms = int(now_unix * 1000) + GLONASS_UTC_OFFSET_MS
+        period = DAY_MS
+    else:
+        now_ms = int((now_unix - GPS_EPOCH_UNIX + leap_seconds) * 1000)
+        if 1121 <= msg_type <= 1127:
+            now_ms -= BDS_GPS_OFFSET_MS
+        period = WEEK_MS
+    age = (now_ms - epoch) % period
+    if age > period // 2:
+        # Đồng hồ hệ thống chậm hơn receiver
+        age -= period
+    return age / 1000.0
+
+
+class StampRing:
+    """
+    Ring cố định thời điểm (read_at, done_at) của các khung một receiver:
+    một writer là thread đọc serial, một reader là backend phát. Thứ tự khung
+    không đổi qua rtcm3_signal nên reader chỉ cần đọc tuần tự.
+    """
+
+    def __init__(self, size=STAMP_RING_SIZE):
+        self.size = size
+        self.read_at = array("d", bytes(8 * size))
+        self.done_at = array("d", bytes(8 * size))
+        self.head = 0  # số khung đã ghi vào ring
+        self.tail = 0  # số khung backend đã nhận
+
+    def push(self, count, read_at, done_at):
+        head = self.head
+        for _ in range(count):
+            slot = head % self.size
+            self.read_at[slot] = read_at
+            self.done_at[slot] = done_at
+            head += 1
+        self.head = head
+
+    def pop(self):
+        """(read_at, done_at) của khung kế tiếp, None nếu ring rỗng"""
+        head = self.head
+        tail = self.tail
+        if tail >= head:
+            return None
+        if head - tail > self.size:
+            # Reader tụt quá một vòng ring, bỏ qua các khung đã bị ghi đè
+            tail = head - self.size
+        slot = tail % self.size
+        self.tail = tail + 1
+        return self.read_at[slot], self.done_at[slot]
+
+
+class LatencyMetrics:
+    """
+    Đo độ trễ trên đường serial -> socket của rover.
+
+    • frame_assembly: từ lần đọc serial tới khi khung RTCM3 hoàn chỉnh
+    • dispatch: từ khi khung hoàn chỉnh tới khi backend phát nhận được
+      (bước nhảy qua thread của rtcm3_signal hoặc inbox asyncio)
+    • serial_to_dispatch: tổng hai bước trên
+    • socket_write: thời gian khung nằm trong ClientSendQueue trước khi ghi
+    • correction_age: tuổi epoch MSM (so với đồng hồ hệ thống) lúc khung hoàn chỉnh
+
+    Khi metrics.enabled=false, active() trả về None và các hàm nóng chỉ kiểm
+    tra một thuộc tính None, không gọi vào đây.
+
+    Thời điểm của từng khung được chuyển sang backend phát qua StampRing,
+    mỗi receiver (stream) một ring vì mỗi receiver có thread đọc serial riêng.
+    Histogram dùng chung cho mọi receiver nên observe() có khóa.
+    """
+
+    PREFIX = "rtk"
+
+    def __init__(self):
+        self.enabled = False
+        self.leap_seconds = 18
+        self.frame_assembly = Histogram(
+            "frame_assembly_seconds", "Serial read to complete RTCM3 frame"
+        )
+        self.dispatch = Histogram(
+            "dispatch_seconds", "Complete frame to fan-out backend (cross-thread hop)"
+        )
+        self.serial_to_dispatch = Histogram(
+            "serial_to_dispatch_seconds", "Serial read to fan-out backend"
+        )
+        self.socket_write = Histogram(
+            "socket_write_seconds", "Time a frame waits in a client queue before socket write"
+        )
+        self.correction_age = Histogram(
+            "correction_age_seconds", "Age of MSM epoch when the frame is complete", AGE_BUCKETS
+        )
+        self.histograms = (
+            self.frame_assembly,
+            self.dispatch,
+            self.serial_to_dispatch,
+            self.socket_write,
+            self.correction_age,
+        )
+        self.collectors = {}  # tên -> hàm trả về dict số liệu (xuất dạng gauge)
+
+        self.default_stream = None
+        self.rings = {}  # tên receiver -> StampRing
+        self.http_server = None
+
+    def load(self):
+        self.enabled = VariableManager.instance.getBool("metrics.enabled", False)
+        self.leap_seconds = int(VariableManager.instance.get("metrics.leap_seconds", 18))
+        self.default_stream = VariableManager.receivers()[0]
+        if self.enabled:
+            self.start_http(
+                VariableManager.instance.get("metrics.host", "0.0.0.0"),
+                int(VariableManager.instance.get("metrics.port", 9108)),
+            )
+
+    def register(self, name, collector):
+        self.collectors[name] = collector
+
+    # ------------------------------------------------------------------
+    # Điểm đo trên đường nóng
+    # ------------------------------------------------------------------
+    def ring(self, stream):
+        """Ring thời điểm của luồng stream (None = receiver đầu tiên)"""
+        if stream is None:
+            stream = self.default_stream
+        ring = self.rings.get(stream)
+        if ring is None:
+            ring = self.rings.setdefault(stream, StampRing())
+        return ring
+
+    def frames_completed(self, frames, read_at, stream=None):
+        """Gọi từ thread đọc serial của stream với các khung vừa ghép xong từ lần đọc read_at"""
+        done_at = time.monotonic()
+        self.frame_assembly.observe(done_at - read_at)
+        self.ring(stream).push(len(frames), read_at, done_at)
+        for frame in frames:
+            if is_epoch_end(frame):
+                self.correction_age.observe(correction_age(frame, time.time(), self.leap_seconds))
+
+    def frame_dispatched(self, stream=None):
+        """Gọi từ backend phát mỗi khi nhận một khung của stream qua rtcm3_signal"""
+        stamp = self.ring(stream).pop()
+        if stamp is None:
+            return
+        read_at, done_at = stamp
+        now = time.monotonic()
+        self.dispatch.observe(now - done_at)
+        self.serial_to_dispatch.observe(now - read_at)
+
+    # ------------------------------------------------------------------
+    # Xuất số liệu
+    # ------------------------------------------------------------------
+    def summary(self):
+        return {h.name.replace("_seconds", ""): h.summary() for h in self.histograms}
+
+    def reset(self):
+        for histogram in self.histograms:
+            histogram.reset()
+
+    def exposition(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.exposition(self.PREFIX))
+        for name, collector in list(self.collectors.items()):
+            try:
+                values = collector()
+            except Exception as e:
+                print(f"[METRICS] collector {name} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"{self.PREFIX}_{name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_http(self, host, port):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.exposition().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.http_server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"[METRICS] failed to listen on {host}:{port}: {e}")
+            return
+        self.http_server.daemon_threads = True
+        thread = threading.Thread(target=self.http_server.serve_forever, name="Metrics", daemon=True)
+        thread.start()
+        print(f"[METRICS] Prometheus endpoint on http://{host}:{port}/metrics")
+
+    def stop(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+
+instance = LatencyMetrics()
+
+
+def active():
+    """LatencyMetrics dùng chung nếu metrics.enabled, ngược lại None"""
+    return instance if instance.enabled else None
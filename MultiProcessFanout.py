@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import signal
+import time
+
+from FanoutConfig import StreamRoute
+from SharedRing import DEFAULT_SLOT_DATA, READ_BATCH, SharedFrameRing
+import LatencyMetrics
+import VariableManager
+
+
+def _worker_main(index, ring_name, ini_path, wakeup):
+    """Tiến trình con: phục vụ một phần client (chia bởi SO_REUSEPORT) từ ring"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from AsyncFanout import AsyncFanoutServer
+
+    VariableManager.instance.load(ini_path)
+    ring = SharedFrameRing(name=ring_name)
+    server = AsyncFanoutServer(reuse_port=True)
+    server.start()
+    streams = VariableManager.receivers()
+    fd = wakeup.fileno()
+    seq = ring.head + 1
+    lost_total = 0
+    print(f"[WORKER {index}] pid={os.getpid()} serving from seq {seq}")
+    try:
+        while True:
+            try:
+                if not os.read(fd, 4096):
+                    break  # tiến trình cha đã đóng pipe
+            except InterruptedError:
+                continue
+            # Byte đánh thức có thể đã được gộp: đọc hết ring trước khi chờ tiếp
+            while True:
+                frames, seq, lost = ring.read_available(seq, READ_BATCH)
+                if lost:
+                    lost_total += lost
+                    print(f"[WORKER {index}] ring overrun: lost {lost} frames (total {lost_total})")
+                for frame in frames:
+                    # Byte đầu là chỉ số receiver trong gps.receivers
+                    server.send_RTCM3(frame[1:], streams[frame[0]])
+                if len(frames) < READ_BATCH:
+                    break
+    finally:
+        server.stop()
+        ring.close()
+
+
+class MultiProcessFanout:
+    """
+    Phát RTCM bằng nhiều tiến trình.
+
+    Thread đọc serial ghi khung đã kiểm tra vào SharedFrameRing rồi đánh thức
+    các worker qua pipe (một byte, không chặn). Mỗi worker chạy một
+    AsyncFanoutServer cùng cổng với SO_REUSEPORT nên kernel tự chia client
+    giữa các worker; worker đọc ring theo seq và báo khi bị overrun.
+    Mỗi khung trong ring mang thêm một byte chỉ số receiver.
+    """
+
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = int(VariableManager.instance.get("tcp.workers", os.cpu_count() or 1))
+        self.workers = max(1, workers)
+        self.ring = None
+        self.processes = []
+        self.wakeups = []
+        self.published = 0
+        self.streams = {}  # tên receiver -> byte chỉ số trong ring
+        # Chỉ đo tới lúc ghi vào ring; worker không bật metrics
+        self.metrics = LatencyMetrics.active()
+
+    def start(self):
+        self.streams = {name: bytes((i,)) for i, name in enumerate(VariableManager.receivers())}
+        self.ring = SharedFrameRing(create=True, slot_data=DEFAULT_SLOT_DATA + 1)
+        # spawn: không fork tiến trình đang chạy Qt
+        context = multiprocessing.get_context("spawn")
+        ini_path = os.path.abspath(VariableManager.instance.file_path)
+        for index in range(self.workers):
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_worker_main,
+                args=(index, self.ring.name, ini_path, reader),
+                name=f"fanout-{index}",
+                daemon=True,
+            )
+            process.start()
+            reader.close()
+            os.set_blocking(writer.fileno(), False)
+            self.processes.append(process)
+            self.wakeups.append(writer)
+        print(f"[SERVER STARTED] {self.workers} fan-out workers, ring {self.ring.name}")
+
+    def stream(self, name):
+        """Đầu vào cho receiver name, dùng làm đích của rtcm3_signal"""
+        return StreamRoute(self, name)
+
+    def send_RTCM3(self, data: bytes, stream=None):
+        """Ghi khung vào ring và đánh thức worker (gọi từ thread đọc serial)"""
+        if self.ring is None:
+            return
+        if self.metrics is not None:
+            self.metrics.frame_dispatched(stream)
+        self.ring.publish(self.streams.get(stream, b"\x00") + data)
+        self.published += 1
+        for writer in self.wakeups:
+            try:
+                os.write(writer.fileno(), b"\x01")
+            except BlockingIOError:
+                # Pipe đầy: worker còn chưa đọc lần đánh thức trước, vẫn sẽ đọc hết ring
+                pass
+            except OSError:
+                pass
+
+    def apply_settings(self, keys):
+        # Mỗi worker đọc cấu hình một lần lúc khởi động
+        changed = [key for key in keys if key.startswith(("tcp.", "ntrip."))]
+        if changed:
+            print(f"[SERVER] restart required to apply {', '.join(changed)} to fan-out workers")
+
+    def stop(self):
+        """Dừng server"""
+        print("[SERVER STOPPING]")
+        for writer in self.wakeups:
+            writer.close()
+        deadline = time.monotonic() + 2
+        for process in self.processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self.processes.clear()
+        self.wakeups.clear()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
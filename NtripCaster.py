@@ -0,0 +1,240 @@
+import base64
+from urllib.parse import unquote
+
+MAX_REQUEST_SIZE = 4096
+SERVER_NAME = "rtk_gps NTRIP caster"
+
+NTRIP_V1 = 1
+NTRIP_V2 = 2
+
+
+class NtripRequest:
+    __slots__ = ("method", "path", "version", "ntrip_version", "authorization", "user_agent")
+
+    def __init__(self, method, path, version, ntrip_version, authorization, user_agent):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.ntrip_version = ntrip_version
+        self.authorization = authorization
+        self.user_agent = user_agent
+
+    @property
+    def mountpoint(self):
+        return self.path.lstrip("/").split("?", 1)[0]
+
+    @property
+    def messages(self):
+        """Giá trị tham số messages=... trong query string, nếu có"""
+        _, _, query = self.path.partition("?")
+        for item in query.split("&"):
+            name, _, value = item.partition("=")
+            if name == "messages":
+                return unquote(value)
+        return None
+
+
+class NtripError(Exception):
+    pass
+
+
+def parse_request(buffer):
+    """
+    Tách request NTRIP từ dữ liệu client gửi lên.
+
+    Trả về (NtripRequest, số byte đã dùng) hoặc (None, 0) nếu chưa nhận đủ
+    header. Raise NtripError nếu request sai hoặc quá dài.
+    Chỉ quét buffer một lần và chỉ giữ lại các header caster cần dùng.
+    """
+    end = buffer.find(b"\r\n\r\n")
+    if end == -1:
+        if len(buffer) > MAX_REQUEST_SIZE:
+            raise NtripError("request too large")
+        return None, 0
+
+    lines = bytes(buffer[:end]).split(b"\r\n")
+    parts = lines[0].split()
+    if len(parts) != 3:
+        raise NtripError("bad request line")
+    method, path, version = (p.decode("latin-1") for p in parts)
+    if method != "GET":
+        raise NtripError(f"unsupported method {method}")
+
+    ntrip_version = NTRIP_V1
+    authorization = None
+    user_agent = ""
+    for line in lines[1:]:
+        name, sep, value = line.partition(b":")
+        if not sep:
+            continue
+        name = name.strip().lower()
+        if name == b"ntrip-version":
+            if value.strip().lower() == b"ntrip/2.0":
+                ntrip_version = NTRIP_V2
+        elif name == b"authorization":
+            authorization = value.strip().decode("latin-1")
+        elif name == b"user-agent":
+            user_agent = value.strip().decode("latin-1")
+
+    request = NtripRequest(method, path, version, ntrip_version, authorization, user_agent)
+    return request, end + 4
+
+
+class Mountpoint:
+    def __init__(
+        self,
+        name,
+        user=None,
+        password=None,
+        identifier="",
+        format_="RTCM 3.3",
+        format_details="",
+        nav_system="GPS+GLO+GAL+BDS",
+        country="VNM",
+        latitude=0.0,
+        longitude=0.0,
+    ):
+        self.name = name
+        self.user = user
+        self.password = password
+        self.identifier = identifier or name
+        self.format = format_
+        self.format_details = format_details
+        self.nav_system = nav_system
+        self.country = country
+        self.latitude = latitude
+        self.longitude = longitude
+        self.subscription = None
+        self.stream = None  # receiver cung cấp dữ liệu cho mountpoint
+        self._expected_auth = None
+        if user:
+            token = base64.b64encode(f"{user}:{password or ''}".encode()).decode()
+            self._expected_auth = f"Basic {token}"
+
+    @property
+    def requires_auth(self):
+        return self._expected_auth is not None
+
+    def check_auth(self, authorization):
+        if self._expected_auth is None:
+            return True
+        return authorization == self._expected_auth
+
+    def str_line(self):
+        # STR;mountpoint;identifier;format;format-details;carrier;nav-system;network;
+        # country;lat;lon;nmea;solution;generator;compr-encryp;auth;fee;bitrate;misc
+        return ";".join(
+            (
+                "STR",
+                self.name,
+                self.identifier,
+                self.format,
+                self.format_details,
+                "2",
+                self.nav_system,
+                "",
+                self.country,
+                f"{self.latitude:.2f}",
+                f"{self.longitude:.2f}",
+                "0",
+                "0",
+                "rtk_gps",
+                "none",
+                "B" if self.requires_auth else "N",
+                "N",
+                "0",
+                "",
+            )
+        )
+
+
+def sourcetable(mountpoints):
+    body = "".join(f"{m.str_line()}\r\n" for m in mountpoints) + "ENDSOURCETABLE\r\n"
+    return body.encode()
+
+
+def response_sourcetable(mountpoints, ntrip_version):
+    body = sourcetable(mountpoints)
+    if ntrip_version == NTRIP_V2:
+        header = (
+            "HTTP/1.1 200 OK\r\n"
+            "Ntrip-Version: Ntrip/2.0\r\n"
+            f"Server: {SERVER_NAME}\r\n"
+            "Content-Type: gnss/sourcetable\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+    else:
+        header = (
+            "SOURCETABLE 200 OK\r\n"
+            f"Server: {SERVER_NAME}\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+    return header.encode() + body
+
+
+def response_stream(ntrip_version):
+    if ntrip_version == NTRIP_V2:
+        return (
+            "HTTP/1.1 200 OK\r\n"
+            "Ntrip-Version: Ntrip/2.0\r\n"
+            f"Server: {SERVER_NAME}\r\n"
+            "Cache-Control: no-store, no-cache, max-age=0\r\n"
+            "Pragma: no-cache\r\n"
+            "Connection: close\r\n"
+            "Content-Type: gnss/data\r\n"
+            "Transfer-Encoding: chunked\r\n\r\n"
+        ).encode()
+    return b"ICY 200 OK\r\n\r\n"
+
+
+def response_unauthorized(mountpoint, ntrip_version):
+    header = "HTTP/1.1" if ntrip_version == NTRIP_V2 else "HTTP/1.0"
+    return (
+        f"{header} 401 Unauthorized\r\n"
+        + ("Ntrip-Version: Ntrip/2.0\r\n" if ntrip_version == NTRIP_V2 else "")
+        + f"Server: {SERVER_NAME}\r\n"
+        f'WWW-Authenticate: Basic realm="/{mountpoint}"\r\n'
+        "Content-Length: 0\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode()
+
+
+def response_bad_request():
+    return b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+def chunk(data):
+    """Đóng gói data thành một chunk HTTP (Transfer-Encoding: chunked)"""
+    return b"%X\r\n%b\r\n" % (len(data), data)
+
+
+def response_not_found():
+    return (
+        "HTTP/1.1 404 Not Found\r\n"
+        "Ntrip-Version: Ntrip/2.0\r\n"
+        f"Server: {SERVER_NAME}\r\n"
+        "Content-Length: 0\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode()
+
+
+def dispatch(request, mountpoints):
+    """
+    Quyết định phản hồi cho một request đã parse.
+
+    mountpoints: dict tên -> Mountpoint
+    Trả về (response, mountpoint): mountpoint là None nếu client phải bị đóng
+    sau khi gửi response (sourcetable, 401, 404).
+    """
+    name = request.mountpoint
+    mount = mountpoints.get(name)
+    if mount is None:
+        if name and request.ntrip_version == NTRIP_V2:
+            return response_not_found(), None
+        # NTRIP v1 trả sourcetable cho mountpoint rỗng hoặc không tồn tại
+        return response_sourcetable(mountpoints.values(), request.ntrip_version), None
+    if not mount.check_auth(request.authorization):
+        return response_unauthorized(name, request.ntrip_version), None
+    return response_stream(request.ntrip_version), mount
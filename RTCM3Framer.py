@@ -0,0 +1,176 @@
+RTCM3_PREAMBLE = 0xD3
+RTCM3_HEADER_LEN = 3
+RTCM3_CRC_LEN = 3
+RTCM3_MAX_PAYLOAD = 1023
+
+
+def _make_crc24q_table():
+    table = []
+    for i in range(256):
+        crc = i << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= 0x1864CFB
+        table.append(crc & 0xFFFFFF)
+    return tuple(table)
+
+
+CRC24Q_TABLE = _make_crc24q_table()
+
+MSM_FIRST_TYPE = 1071
+MSM_LAST_TYPE = 1137
+
+WEEK_MS = 7 * 86400 * 1000
+DAY_MS = 86400 * 1000
+BDS_GPS_OFFSET_MS = 14000  # BDT = GPST - 14 s
+GLONASS_UTC_OFFSET_MS = 3 * 3600 * 1000  # giờ Moscow
+GPS_UTC_LEAP_SECONDS = 18
+
+
+def crc24q(data):
+    """Tính CRC-24Q (Qualcomm) cho bytes/bytearray/memoryview"""
+    crc = 0
+    table = CRC24Q_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ byte]
+    return crc
+
+
+def message_type(frame):
+    """Số hiệu message (12 bit đầu payload) của một khung RTCM3 hoàn chỉnh"""
+    return (frame[3] << 4) | (frame[4] >> 4)
+
+
+def is_msm(msg_type):
+    return MSM_FIRST_TYPE <= msg_type <= MSM_LAST_TYPE
+
+
+def is_glonass_msm(msg_type):
+    return 1081 <= msg_type <= 1087
+
+
+def msm_epoch_ms(frame):
+    """
+    Thời điểm epoch (ms) trong header MSM: time of week cho GPS/GAL/BDS/QZSS,
+    time of day cho GLONASS (bỏ 3 bit day of week).
+    """
+    value = (int.from_bytes(frame[6:10], "big") >> 2) & 0x3FFFFFFF
+    if is_glonass_msm(message_type(frame)):
+        return value & 0x7FFFFFF
+    return value
+
+
+def msm_gps_time_ms(frame, leap_seconds=GPS_UTC_LEAP_SECONDS):
+    """
+    Epoch time MSM quy về GPS time: time of week cho GPS/GAL/QZSS/BDS,
+    GPS time of day cho GLONASS (chỉ có time of day theo giờ Moscow).
+    Dùng khi cần so epoch giữa các hệ, ví dụ chia hết cho cùng một chu kỳ.
+    """
+    msg_type = message_type(frame)
+    epoch = msm_epoch_ms(frame)
+    if is_glonass_msm(msg_type):
+        return (epoch - GLONASS_UTC_OFFSET_MS + leap_seconds * 1000) % DAY_MS
+    if 1121 <= msg_type <= 1127:
+        return (epoch + BDS_GPS_OFFSET_MS) % WEEK_MS
+    return epoch
+
+
+def is_epoch_end(frame):
+    """
+    True nếu khung là MSM cuối cùng của epoch (multiple message bit = 0).
+    Bit này nằm sau type(12) + station id(12) + epoch time(30) của header MSM.
+    """
+    if len(frame) < 10 or not is_msm(message_type(frame)):
+        return False
+    return not (frame[9] >> 1) & 1
+
+
+class RTCM3Framer:
+    """
+    Ghép khung RTCM3 từ luồng byte serial.
+
+    Giữ phần khung chưa đủ giữa các lần readyRead, chỉ trả về các khung
+    hoàn chỉnh đã kiểm tra CRC-24Q. Byte rác (NMEA/UBX lẫn vào) bị bỏ qua.
+
+    Khung RTCM3:
+    • 0xD3                       preamble
+    • 6 bit reserved + 10 bit    độ dài payload
+    • payload                    (0..1023 byte)
+    • 3 byte                     CRC-24Q trên preamble + header + payload
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames = 0
+        self.resyncs = 0
+        self.crc_errors = 0
+        self.discarded_bytes = 0
+
+    def reset(self):
+        self.buffer.clear()
+
+    def feed(self, data):
+        """Nạp dữ liệu mới, trả về list các khung RTCM3 hoàn chỉnh (bytes)"""
+        frames = []
+        buffer = self.buffer
+        if data:
+            buffer.extend(data)
+        size = len(buffer)
+        pos = 0
+
+        while pos < size:
+            start = buffer.find(RTCM3_PREAMBLE, pos)
+            if start == -1:
+                # Không còn preamble: bỏ toàn bộ phần còn lại
+                self._discard(size - pos)
+                pos = size
+                break
+            if start > pos:
+                self._discard(start - pos)
+                pos = start
+
+            if size - pos < RTCM3_HEADER_LEN:
+                break
+            if buffer[pos + 1] & 0xFC:
+                # 6 bit reserved phải bằng 0 -> không phải preamble thật
+                self._discard(1)
+                pos += 1
+                continue
+
+            length = ((buffer[pos + 1] & 0x03) << 8) | buffer[pos + 2]
+            end = pos + RTCM3_HEADER_LEN + length + RTCM3_CRC_LEN
+            if end > size:
+                break
+
+            crc_pos = end - RTCM3_CRC_LEN
+            with memoryview(buffer) as view:
+                crc = crc24q(view[pos:crc_pos])
+            if crc != (
+                (buffer[crc_pos] << 16) | (buffer[crc_pos + 1] << 8) | buffer[crc_pos + 2]
+            ):
+                self.crc_errors += 1
+                self._discard(1)
+                pos += 1
+                continue
+
+            frames.append(bytes(buffer[pos:end]))
+            self.frames += 1
+            pos = end
+
+        if pos:
+            del buffer[:pos]
+        return frames
+
+    def _discard(self, count):
+        self.resyncs += 1
+        self.discarded_bytes += count
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "resyncs": self.resyncs,
+            "crc_errors": self.crc_errors,
+            "discarded_bytes": self.discarded_bytes,
+            "buffered": len(self.buffer),
+        }
@@ -0,0 +1,237 @@
+import time
+
+from RTCM3Framer import DAY_MS, MSM_FIRST_TYPE, MSM_LAST_TYPE, WEEK_MS, is_glonass_msm
+
+# Hệ vệ tinh theo dải số hiệu MSM (107x GPS, 108x GLONASS, ...)
+CONSTELLATIONS = {
+    107: "GPS",
+    108: "GLONASS",
+    109: "Galileo",
+    110: "SBAS",
+    111: "QZSS",
+    112: "BeiDou",
+    113: "NavIC",
+}
+
+# Message có reference station ID ở bit 12..23 (ephemeris thì là số hiệu vệ tinh)
+STATION_TYPES = frozenset((1001, 1002, 1003, 1004, 1005, 1006, 1007, 1008, 1009, 1010, 1011, 1012, 1033, 1230))
+
+# Header MSM: type(12) station(12) epoch(30) mmb(1) IODS(3) reserved(7)
+# clock steering(2) external clock(2) smoothing(1) interval(3) -> 73 bit,
+# tiếp theo satellite mask(64) và signal mask(32)
+MSM_MIN_PAYLOAD = 22
+SAT_MASK = (1 << 64) - 1
+SIG_MASK = (1 << 32) - 1
+
+# Khoảng epoch lớn hơn GAP_FACTOR lần chu kỳ bình thường thì tính là mất epoch
+GAP_FACTOR = 1.5
+# Số lần liên tiếp gặp chu kỳ mới trước khi coi là đổi tốc độ đo
+INTERVAL_CONFIRM = 3
+RATE_SMOOTHING = 0.1
+
+
+class _TypeStats:
+    __slots__ = ("count", "bytes", "last", "interval")
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.last = None
+        self.interval = None  # trung bình trượt khoảng cách giữa hai khung (s)
+
+
+class _ConstellationStats:
+    __slots__ = (
+        "epoch_ms", "sat_mask", "sig_mask", "epochs",
+        "interval_ms", "candidate_ms", "candidate_count", "gaps", "missed", "max_gap_ms",
+    )
+
+    def __init__(self):
+        self.epoch_ms = None
+        self.sat_mask = 0
+        self.sig_mask = 0
+        self.epochs = 0
+        self.interval_ms = None  # chu kỳ epoch bình thường
+        self.candidate_ms = None
+        self.candidate_count = 0
+        self.gaps = 0
+        self.missed = 0  # số epoch ước tính bị mất
+        self.max_gap_ms = 0
+
+    @property
+    def satellites(self):
+        return bin(self.sat_mask).count("1")
+
+    @property
+    def signals(self):
+        return bin(self.sig_mask).count("1")
+
+    def new_epoch(self, epoch_ms, wrap):
+        if self.epoch_ms is not None:
+            self.check_gap((epoch_ms - self.epoch_ms) % wrap)
+        self.epoch_ms = epoch_ms
+        self.epochs += 1
+
+    def check_gap(self, delta):
+        interval = self.interval_ms
+        if interval is None or delta < interval:
+            self.interval_ms = delta
+            return
+        if delta == interval:
+            self.candidate_count = 0
+            return
+        if delta > interval * GAP_FACTOR:
+            self.gaps += 1
+            self.missed += round(delta / interval) - 1
+            if delta > self.max_gap_ms:
+                self.max_gap_ms = delta
+        # Chu kỳ dài hơn lặp lại liên tục: receiver đã giảm tốc độ đo
+        if delta == self.candidate_ms:
+            self.candidate_count += 1
+            if self.candidate_count >= INTERVAL_CONFIRM:
+                self.interval_ms = delta
+                self.candidate_count = 0
+        else:
+            self.candidate_ms = delta
+            self.candidate_count = 1
+
+
+class RTCM3StreamStats:
+    """
+    Thống kê luồng RTCM3 chỉ từ header của khung đã được RTCM3Framer tách.
+
+    Không giải mã observation: mỗi khung chỉ đọc message type, reference
+    station ID và với MSM thì epoch time cùng satellite/signal mask (đếm bit).
+    Từ đó giữ tần số từng message type, số vệ tinh/tín hiệu mỗi hệ ở epoch
+    gần nhất và các lỗ hổng epoch time (mất epoch). Đủ rẻ để chạy luôn trong
+    BaseController.handle_fixed().
+    """
+
+    def __init__(self):
+        self.types = {}  # message type -> _TypeStats
+        self.constellations = {}  # tên hệ -> _ConstellationStats
+        self.station_id = None
+        self.station_changes = 0
+        self.frames = 0
+
+    def reset(self):
+        self.__init__()
+
+    def feed(self, frames, now=None):
+        """Cập nhật thống kê cho một loạt khung RTCM3 hoàn chỉnh"""
+        if now is None:
+            now = time.monotonic()
+        types = self.types
+        for frame in frames:
+            msg_type = (frame[3] << 4) | (frame[4] >> 4)
+            stats = types.get(msg_type)
+            if stats is None:
+                stats = types[msg_type] = _TypeStats()
+            stats.count += 1
+            stats.bytes += len(frame)
+            if stats.last is not None:
+                elapsed = now - stats.last
+                if stats.interval is None:
+                    stats.interval = elapsed
+                else:
+                    stats.interval += RATE_SMOOTHING * (elapsed - stats.interval)
+            stats.last = now
+
+            if MSM_FIRST_TYPE <= msg_type <= MSM_LAST_TYPE:
+                self._msm(frame, msg_type)
+            elif msg_type in STATION_TYPES:
+                self._station(((frame[4] & 0x0F) << 8) | frame[5])
+        self.frames += len(frames)
+
+    def _station(self, station_id):
+        if station_id != self.station_id:
+            if self.station_id is not None:
+                self.station_changes += 1
+            self.station_id = station_id
+
+    def _msm(self, frame, msg_type):
+        if len(frame) < MSM_MIN_PAYLOAD + 6:
+            return
+        self._station(((frame[4] & 0x0F) << 8) | frame[5])
+        name = CONSTELLATIONS.get(msg_type // 10)
+        if name is None:
+            return
+        constellation = self.constellations.get(name)
+        if constellation is None:
+            constellation = self.constellations[name] = _ConstellationStats()
+
+        epoch_ms = (int.from_bytes(frame[6:10], "big") >> 2) & 0x3FFFFFFF
+        if is_glonass_msm(msg_type):
+            # GLONASS: bỏ 3 bit day of week, time of day quay vòng theo ngày
+            epoch_ms &= 0x7FFFFFF
+            wrap = DAY_MS
+        else:
+            wrap = WEEK_MS
+        # Payload bit 72..143 và 136..175 (payload bắt đầu ở byte 3 của khung)
+        sat_mask = (int.from_bytes(frame[12:21], "big") >> 7) & SAT_MASK
+        sig_mask = (int.from_bytes(frame[20:25], "big") >> 7) & SIG_MASK
+        if epoch_ms != constellation.epoch_ms:
+            constellation.new_epoch(epoch_ms, wrap)
+            constellation.sat_mask = sat_mask
+            constellation.sig_mask = sig_mask
+        else:
+            # Cùng epoch chia thành nhiều message MSM
+            constellation.sat_mask |= sat_mask
+            constellation.sig_mask |= sig_mask
+
+    def summary(self, now=None):
+        """Dict tóm tắt cho get_data()/base_data"""
+        if now is None:
+            now = time.monotonic()
+        types = {}
+        for msg_type, stats in sorted(self.types.items()):
+            rate = None
+            if stats.interval:
+                rate = round(1.0 / stats.interval, 3)
+            types[str(msg_type)] = {
+                "count": stats.count,
+                "bytes": stats.bytes,
+                "rate_hz": rate,
+                "age_s": round(now - stats.last, 3),
+            }
+        constellations = {}
+        for name, stats in self.constellations.items():
+            constellations[name] = {
+                "satellites": stats.satellites,
+                "signals": stats.signals,
+                "epoch_ms": stats.epoch_ms,
+                "epochs": stats.epochs,
+                "interval_ms": stats.interval_ms,
+                "gaps": stats.gaps,
+                "missed_epochs": stats.missed,
+                "max_gap_ms": stats.max_gap_ms,
+            }
+        return {
+            "station_id": self.station_id,
+            "station_changes": self.station_changes,
+            "frames": self.frames,
+            "satellites": sum(c.satellites for c in self.constellations.values()),
+            "types": types,
+            "constellations": constellations,
+        }
+
+
+if __name__ == "__main__":
+    from ReceiverEmulator import synthetic_epoch
+
+    stats = RTCM3StreamStats()
+    epochs = [synthetic_epoch(100 * i, stamp=False) for i in range(1000)]
+    # Mất 3 epoch để kiểm tra phát hiện gap
+    del epochs[500:503]
+    frames = sum((len(epoch) for epoch in epochs))
+    start = time.perf_counter()
+    for i, epoch in enumerate(epochs):
+        stats.feed(epoch, now=i * 0.1)
+    elapsed = time.perf_counter() - start
+    print(f"{frames} frames: {elapsed / frames * 1e6:.2f} us/frame")
+    summary = stats.summary(now=len(epochs) * 0.1)
+    print(f"station {summary['station_id']}, satellites {summary['satellites']}")
+    for name, item in summary["constellations"].items():
+        print(f"  {name}: {item}")
+    for msg_type, item in summary["types"].items():
+        print(f"  {msg_type}: {item}")
@@ -0,0 +1,151 @@
+import math
+import time
+
+from RTCM3Framer import DAY_MS, WEEK_MS, is_glonass_msm, is_msm, message_type, msm_gps_time_ms
+
+ALL = "*"
+# Dải số hiệu message RTCM3 hợp lệ (12 bit, 1001 trở lên)
+MIN_MESSAGE_TYPE = 1001
+MAX_MESSAGE_TYPE = 4095
+
+
+def _parse_type(text):
+    try:
+        msg_type = int(text)
+    except ValueError:
+        raise ValueError(f"bad message type {text!r}") from None
+    if not MIN_MESSAGE_TYPE <= msg_type <= MAX_MESSAGE_TYPE:
+        raise ValueError(f"message type {msg_type} out of range")
+    return msg_type
+
+
+def _parse_period(text):
+    """Chu kỳ (s) -> ms; chỉ nhận số hữu hạn không âm"""
+    try:
+        period = float(text or 0)
+    except ValueError:
+        raise ValueError(f"bad period {text!r}") from None
+    if not math.isfinite(period) or period < 0:
+        raise ValueError(f"bad period {text!r}")
+    return int(period * 1000)
+
+
+class MessageSubscription:
+    """
+    Danh sách message RTCM một nhóm client muốn nhận và chu kỳ của từng loại.
+
+    spec là list (hoặc chuỗi phân cách bằng dấu phẩy) các mục:
+    • "1005:10"  message 1005, tối đa mỗi 10 s
+    • "1074:1"   message 1074 mỗi 1 s (giảm tần số nếu base chạy nhanh hơn)
+    • "1230"     message 1230 với tần số gốc
+    • "-1124"    bỏ message 1124
+    • "*"        nhận mọi message khác với tần số gốc
+    Không có "*" thì chỉ các message được liệt kê mới được gửi.
+
+    Với MSM, việc giảm tần số bám theo epoch time của receiver đã quy về GPS
+    time (giữ các epoch chia hết cho chu kỳ) nên các client cùng nhận đúng
+    một epoch cho mọi hệ; mọi message của epoch được giữ đều được gửi, kể
+    cả khi receiver chia epoch thành nhiều message. Trạng thái dùng chung cho cả nhóm nên accept() chỉ
+    gọi một lần mỗi khung.
+
+    spec sai (type không phải số 1001..4095, chu kỳ âm/nan/inf) raise ValueError.
+    """
+
+    def __init__(self, spec):
+        if isinstance(spec, str):
+            spec = spec.split(",")
+        self.spec = ",".join(item.strip() for item in spec if item.strip())
+        self.pass_others = False
+        self.periods = {}  # msg_type -> chu kỳ (ms), 0 = mọi message
+        self.blocked = set()
+        self.last_sent = {}  # msg_type -> time.monotonic() lần gửi gần nhất (không phải MSM)
+        self.last_epoch = {}  # msg_type -> epoch MSM (GPS time, ms) được gửi gần nhất
+        self.accepted = 0
+        self.rejected = 0
+
+        for item in self.spec.split(","):
+            if not item:
+                continue
+            if item == ALL:
+                self.pass_others = True
+            elif item.startswith("-"):
+                self.blocked.add(_parse_type(item[1:]))
+            else:
+                msg_type, _, period = item.partition(":")
+                self.periods[_parse_type(msg_type)] = _parse_period(period)
+
+    def accept(self, frame, now=None):
+        msg_type = message_type(frame)
+        if msg_type in self.blocked:
+            self.rejected += 1
+            return False
+        period = self.periods.get(msg_type)
+        if period is None:
+            if self.pass_others:
+                self.accepted += 1
+                return True
+            self.rejected += 1
+            return False
+        if period == 0:
+            self.accepted += 1
+            return True
+
+        if is_msm(msg_type):
+            ok = self._accept_msm(frame, msg_type, period)
+        else:
+            if now is None:
+                now = time.monotonic()
+            last = self.last_sent.get(msg_type)
+            # Cho phép sai lệch 10% do jitter của luồng serial
+            ok = last is None or (now - last) * 1000 >= period * 0.9
+            if ok:
+                self.last_sent[msg_type] = now
+
+        if ok:
+            self.accepted += 1
+        else:
+            self.rejected += 1
+        return ok
+
+    def _accept_msm(self, frame, msg_type, period):
+        epoch = msm_gps_time_ms(frame)
+        last = self.last_epoch.get(msg_type)
+        if epoch == last:
+            # Epoch bị chia thành nhiều message (multiple message bit = 1): gửi đủ
+            return True
+        if last is not None:
+            # GLONASS chỉ có time of day, các hệ khác time of week
+            elapsed = (epoch - last) % (DAY_MS if is_glonass_msm(msg_type) else WEEK_MS)
+            # Epoch thẳng hàng với chu kỳ; dự phòng nếu rate base không bao giờ
+            # rơi đúng bội số chu kỳ
+            aligned = epoch % period == 0 and elapsed >= period * 0.5
+            if not aligned and elapsed < period * 1.5:
+                return False
+        self.last_epoch[msg_type] = epoch
+        return True
+
+    def stats(self):
+        return {"spec": self.spec, "accepted": self.accepted, "rejected": self.rejected}
+
+
+class SubscriptionRegistry:
+    """
+    Gom các client có cùng spec trong cấu hình (tcp.messages,
+    ntrip.NAME.messages) vào một MessageSubscription dùng chung.
+    Mỗi luồng (receiver) có subscription riêng vì trạng thái giảm tần số
+    bám theo epoch của từng receiver.
+
+    Spec client tự gửi qua ?messages= không đi qua đây: mỗi kết nối có
+    MessageSubscription riêng, bị bỏ cùng client nên registry không lớn dần.
+    """
+
+    def __init__(self):
+        self.subscriptions = {}
+
+    def get(self, spec, stream=None):
+        if not spec:
+            return None
+        subscription = MessageSubscription(spec)
+        if subscription.spec == ALL:
+            return None
+        return self.subscriptions.setdefault((stream, subscription.spec), subscription)
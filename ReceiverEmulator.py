@@ -0,0 +1,393 @@
+"""
+Giả lập ZED-F9P trên pseudo-terminal để chạy BaseController không cần receiver.
+
+• Trả lời UBX-CFG-VALSET bằng ACK-ACK (hoặc ACK-NAK nếu payload sai / key bị
+  cấu hình để NAK) và áp dụng TMODE3, SVIN_MIN_DUR, SVIN_ACC_LIMIT, RATE-MEAS.
+  VALSET có cờ transaction được giữ lại và chỉ áp dụng ở khung apply.
+• Trả lời UBX-CFG-VALGET cho mọi key trong UBXConfig (NAK nếu key lạ).
+• Ghi bất kỳ key TMODE nào làm receiver khởi động lại time mode: mất
+  TMODE_RESTART_EPOCHS epoch RTCM, giống khoảng gián đoạn correction thật.
+• Chế độ fixed: phát epoch RTCM3 tổng hợp hoặc phát lại từ file RTCM3.
+• Chế độ survey-in: phát UBX-NAV-SVIN mỗi epoch.
+
+    python ReceiverEmulator.py --rate 10
+    python ReceiverEmulator.py --replay archive_extract.rtcm
+"""
+import argparse
+import os
+import pty
+import random
+import struct
+import threading
+import time
+import tty
+
+from RTCM3Framer import RTCM3Framer, crc24q, is_epoch_end
+import UBXConfig
+from UBXConfig import decode_valset
+from UBXProtocol import (
+    TRANSACTION_APPLY,
+    TRANSACTION_BEGIN,
+    TRANSACTION_CONTINUE,
+    UBXStreamDecoder,
+    build_ubx,
+)
+
+# Message 4095 (proprietary) chứa time.monotonic_ns() lúc khung được ghi ra
+# serial, dùng để đo độ trễ serial -> socket của rover
+STAMP_TYPE = 4095
+
+GPS_EPOCH_UNIX = 315964800
+WEEK_MS = 7 * 86400 * 1000
+DAY_MS = 86400 * 1000
+
+# Kích thước payload gần đúng của một epoch ZED-F9P 4 hệ
+EPOCH_LAYOUT = ((1005, 19), (1074, 180), (1084, 150), (1094, 170), (1124, 160))
+# Satellite / signal mask của MSM tổng hợp: số vệ tinh mỗi hệ, hai tín hiệu
+MSM_MASKS = {
+    1074: (((1 << 10) - 1) << 50, 0b11 << 29),
+    1084: (((1 << 7) - 1) << 54, 0b11 << 29),
+    1094: (((1 << 8) - 1) << 52, 0b11 << 29),
+    1124: (((1 << 12) - 1) << 46, 0b11 << 29),
+}
+
+KEY_TMODE3_MODE = 0x20030001
+KEY_SVIN_MIN_DUR = 0x40030010
+KEY_SVIN_ACC_LIMIT = 0x40030011
+KEY_RATE_MEAS = 0x30210001
+KEY_MSGOUT_NAV_HPPOSECEF_USB = 0x20910031
+KEY_GROUP_TMODE = 0x03
+TMODE_RESTART_EPOCHS = 2
+
+# Vị trí thật của anten (m) và nhiễu vị trí đơn điểm cho NAV-HPPOSECEF
+TRUE_POSITION = (-1919161.28, 5821368.88, 1757388.97)
+POSITION_NOISE = 0.8  # độ lệch chuẩn mỗi trục (m)
+NOISE_CORRELATION = 0.9  # nhiễu AR(1) giữa hai epoch liên tiếp
+
+
+def rtcm_frame(payload):
+    header = bytes((0xD3, (len(payload) >> 8) & 0x03, len(payload) & 0xFF)) + payload
+    return header + crc24q(header).to_bytes(3, "big")
+
+
+def msm_payload(msg_type, epoch_ms, multiple_message, size, station_id=0, sat_mask=0, sig_mask=0):
+    # type(12) station(12) epoch(30) mmb(1) 18 bit 0, satellite mask(64)
+    # signal mask(32): 169 bit, đệm thành 22 byte; phần còn lại là 0
+    head = (msg_type << 157) | (station_id << 145) | ((epoch_ms & 0x3FFFFFFF) << 115)
+    head |= (1 if multiple_message else 0) << 114
+    head |= (sat_mask << 32) | sig_mask
+    return (head << 7).to_bytes(22, "big") + bytes(max(0, size - 22))
+
+
+def stamp_frame(ns=None):
+    if ns is None:
+        ns = time.monotonic_ns()
+    return rtcm_frame(struct.pack(">HQ", STAMP_TYPE << 4, ns))
+
+
+def gps_time_of_week_ms(now=None, leap_seconds=18):
+    if now is None:
+        now = time.time()
+    return int((now - GPS_EPOCH_UNIX + leap_seconds) * 1000) % WEEK_MS
+
+
+def constellation_epoch_ms(msg_type, gps_tow_ms, leap_seconds=18):
+    """Đổi GPS time of week sang epoch time trong header MSM của từng hệ"""
+    if 1081 <= msg_type <= 1087:
+        # GLONASS: time of day theo giờ Moscow (UTC+3)
+        return (gps_tow_ms - leap_seconds * 1000 + 3 * 3600 * 1000) % DAY_MS
+    if 1121 <= msg_type <= 1127:
+        return (gps_tow_ms - 14000) % WEEK_MS
+    return gps_tow_ms
+
+
+def synthetic_epoch(epoch_ms, stamp=True):
+    """Một epoch tổng hợp; epoch_ms là GPS time of week"""
+    frames = [stamp_frame()] if stamp else []
+    last = len(EPOCH_LAYOUT) - 1
+    for index, (msg_type, size) in enumerate(EPOCH_LAYOUT):
+        if msg_type == 1005:
+            frames.append(rtcm_frame((1005 << 4).to_bytes(2, "big") + bytes(size - 2)))
+        else:
+            msm_epoch = constellation_epoch_ms(msg_type, epoch_ms)
+            sat_mask, sig_mask = MSM_MASKS.get(msg_type, (0, 0))
+            frames.append(
+                rtcm_frame(
+                    msm_payload(
+                        msg_type, msm_epoch, index != last, size, sat_mask=sat_mask, sig_mask=sig_mask
+                    )
+                )
+            )
+    return frames
+
+
+def load_replay(path):
+    """Đọc file RTCM3 thô, gom khung theo epoch (kết thúc ở MSM có MMB = 0)"""
+    framer = RTCM3Framer()
+    with open(path, "rb") as f:
+        frames = framer.feed(f.read())
+    epochs = []
+    current = []
+    for frame in frames:
+        current.append(frame)
+        if is_epoch_end(frame):
+            epochs.append(current)
+            current = []
+    if current:
+        epochs.append(current)
+    return epochs
+
+
+class ReceiverEmulator:
+    def __init__(self, rate=1.0, replay=None, stamp=True, baudrate=None, nak_keys=()):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.rate = rate
+        self.stamp = stamp
+        self.baudrate = baudrate
+        self.nak_keys = set(nak_keys)
+        self.replay = load_replay(replay) if replay else None
+        self.decoder = UBXStreamDecoder()
+        self.write_lock = threading.Lock()
+        self.running = False
+        self.threads = []
+
+        self.config = dict.fromkeys(UBXConfig.BY_ID, 0)
+        self.config.update({
+            KEY_TMODE3_MODE: 2,
+            KEY_SVIN_MIN_DUR: 300,
+            KEY_SVIN_ACC_LIMIT: 1000,
+            KEY_RATE_MEAS: int(1000 / rate),
+            KEY_MSGOUT_NAV_HPPOSECEF_USB: 0,
+        })
+        self.transaction = None  # các cặp key/value của transaction đang mở
+        self.tmode_hold = 0  # số epoch còn lại không phát RTCM sau khi đổi TMODE
+        self.svin_started = None
+        self.noise = [0.0, 0.0, 0.0]
+        self.epoch_ms = gps_time_of_week_ms()
+
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.acks = 0
+        self.naks = 0
+        self.tmode_restarts = 0
+
+    @property
+    def mode(self):
+        return self.config[KEY_TMODE3_MODE]
+
+    def start(self):
+        self.running = True
+        for target in (self._command_loop, self._stream_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self.port
+
+    def stop(self):
+        self.running = False
+        for fd in (self.slave, self.master):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def write(self, data):
+        with self.write_lock:
+            os.write(self.master, data)
+        if self.baudrate:
+            # Giả lập thời gian truyền trên UART: 10 bit mỗi byte
+            time.sleep(len(data) * 10.0 / self.baudrate)
+
+    # ------------------------------------------------------------------
+    # Lệnh UBX từ host
+    # ------------------------------------------------------------------
+    def _command_loop(self):
+        while self.running:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            for msg_class, msg_id, payload in self.decoder.feed(data):
+                self.handle_command(msg_class, msg_id, payload)
+
+    def handle_command(self, msg_class, msg_id, payload):
+        if msg_class == 0x06 and msg_id == 0x8A:
+            ok = self.apply_valset(payload)
+            self.send_ack(msg_class, msg_id, ok)
+        elif msg_class == 0x06 and msg_id == 0x8B:
+            response = self.valget(payload)
+            if response is not None:
+                self.write(build_ubx(msg_class, msg_id, response))
+            self.send_ack(msg_class, msg_id, response is not None)
+
+    def send_ack(self, msg_class, msg_id, ok):
+        if ok:
+            self.acks += 1
+        else:
+            self.naks += 1
+        self.write(build_ubx(0x05, 0x01 if ok else 0x00, bytes((msg_class, msg_id))))
+
+    def apply_valset(self, payload):
+        decoded = decode_valset(payload)
+        if decoded is None:
+            self.transaction = None
+            return False
+        _, transaction, raw_items = decoded
+        items = [(key, int.from_bytes(value, "little")) for key, value in raw_items]
+        if any(key in self.nak_keys for key, _ in items):
+            self.transaction = None
+            return False
+        if transaction == TRANSACTION_BEGIN:
+            self.transaction = items
+            return True
+        if transaction in (TRANSACTION_CONTINUE, TRANSACTION_APPLY):
+            if self.transaction is None:
+                return False  # không có transaction đang mở
+            self.transaction.extend(items)
+            if transaction == TRANSACTION_CONTINUE:
+                return True
+            items, self.transaction = self.transaction, None
+        if any((key >> 16) & 0xFF == KEY_GROUP_TMODE for key, _ in items):
+            self.tmode_hold = TMODE_RESTART_EPOCHS
+            self.tmode_restarts += 1
+        for key, value in items:
+            self.config[key] = value
+            if key == KEY_TMODE3_MODE and value == 1:
+                self.svin_started = time.monotonic()
+            if key == KEY_RATE_MEAS and value:
+                self.rate = 1000.0 / value
+        return True
+
+    def valget(self, payload):
+        """Payload trả lời CFG-VALGET (layer RAM), None nếu poll sai hoặc có key lạ"""
+        if len(payload) < 8 or payload[0] != 0x00:
+            return None
+        response = bytearray((0x01, payload[1])) + payload[2:4]
+        for pos in range(4, len(payload) - 3, 4):
+            key = struct.unpack_from("<I", payload, pos)[0]
+            size = UBXConfig.KEY_SIZE.get((key >> 28) & 0x07)
+            if key not in self.config or size is None:
+                return None
+            response += payload[pos : pos + 4]
+            response += (self.config[key] & ((1 << (8 * size)) - 1)).to_bytes(size, "little")
+        return bytes(response)
+
+    # ------------------------------------------------------------------
+    # Luồng dữ liệu
+    # ------------------------------------------------------------------
+    def _stream_loop(self):
+        next_time = time.monotonic()
+        replay_index = 0
+        while self.running:
+            period = 1.0 / self.rate
+            if self.mode == 2 and self.tmode_hold > 0:
+                self.tmode_hold -= 1
+            elif self.mode == 2:
+                if self.replay:
+                    frames = self.replay[replay_index % len(self.replay)]
+                    replay_index += 1
+                    if self.stamp:
+                        frames = [stamp_frame()] + frames
+                else:
+                    frames = synthetic_epoch(self.epoch_ms, self.stamp)
+                try:
+                    data = b"".join(frames)
+                    self.write(data)
+                except OSError:
+                    break
+                self.frames_sent += len(frames)
+                self.bytes_sent += len(data)
+            elif self.mode == 1:
+                try:
+                    data = self.nav_svin()
+                    if self.config.get(KEY_MSGOUT_NAV_HPPOSECEF_USB):
+                        data += self.nav_hpposecef()
+                    self.write(data)
+                except OSError:
+                    break
+            self.epoch_ms = (self.epoch_ms + int(period * 1000)) % WEEK_MS
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def nav_svin(self):
+        started = self.svin_started or time.monotonic()
+        dur = int(time.monotonic() - started)
+        # Độ chính xác giảm dần theo thời gian khảo sát (đơn vị 0.1 mm)
+        mean_acc = int(50000 / (1 + dur))
+        valid = int(dur >= self.config[KEY_SVIN_MIN_DUR] and mean_acc <= self.config[KEY_SVIN_ACC_LIMIT])
+        payload = struct.pack(
+            "<B3sIiiiibbbBIIBBH",
+            0,
+            b"\x00\x00\x00",
+            self.epoch_ms,
+            dur,
+            -191916128,
+            582136888,
+            175738897,
+            0,
+            0,
+            0,
+            0,
+            mean_acc,
+            dur,
+            valid,
+            int(not valid),
+            0,
+        )
+        return build_ubx(0x01, 0x3B, payload)
+
+    def nav_hpposecef(self):
+        # Nhiễu tương quan theo thời gian giống vị trí đơn điểm thật
+        scale = POSITION_NOISE * (1 - NOISE_CORRELATION**2) ** 0.5
+        for axis in range(3):
+            self.noise[axis] = NOISE_CORRELATION * self.noise[axis] + random.gauss(0.0, scale)
+        fields = []
+        for true, noise in zip(TRUE_POSITION, self.noise):
+            value = round((true + noise) * 10000)  # 0.1 mm
+            cm = int(value / 100)
+            fields += [cm, value - cm * 100]
+        x, x_hp, y, y_hp, z, z_hp = fields
+        p_acc = int(POSITION_NOISE * 1.7 * 10000)
+        payload = struct.pack(
+            "<B3sIiiibbbBI", 0, b"\x00\x00\x00", self.epoch_ms, x, y, z, x_hp, y_hp, z_hp, 0, p_acc
+        )
+        return build_ubx(0x01, 0x13, payload)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "rate": self.rate,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "acks": self.acks,
+            "naks": self.naks,
+            "tmode_restarts": self.tmode_restarts,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=1.0)
+    parser.add_argument("--replay", help="file RTCM3 thô để phát lại")
+    parser.add_argument("--baudrate", type=int, help="giới hạn tốc độ như UART thật")
+    parser.add_argument("--no-stamp", action="store_true", help="không chèn khung đánh dấu thời gian")
+    args = parser.parse_args()
+
+    emulator = ReceiverEmulator(
+        rate=args.rate, replay=args.replay, stamp=not args.no_stamp, baudrate=args.baudrate
+    )
+    print(f"ZED-F9P emulator on {emulator.start()}")
+    try:
+        while True:
+            time.sleep(5)
+            print(emulator.stats())
+    except KeyboardInterrupt:
+        emulator.stop()
@@ -0,0 +1,213 @@
+from collections import deque
+import time
+
+from RTCM3Framer import is_epoch_end
+
+DEFAULT_MAX_BYTES = 64 * 1024
+DEFAULT_MAX_AGE_MS = 5000
+DEFAULT_EVICT_AFTER_MS = 10000
+
+
+class ClientSendQueue:
+    """
+    Hàng đợi gửi có giới hạn cho một client.
+
+    Mỗi phần tử là một khung RTCM3 nguyên vẹn kèm số epoch. Khi vượt giới hạn
+    bytes hoặc tuổi, bỏ cả epoch cũ nhất (không bao giờ cắt đôi một khung).
+    Client bị coi là quá tải khi hàng đợi phải bỏ dữ liệu liên tục; nếu tình
+    trạng đó kéo dài quá evict_after_ms thì should_evict() trả về True.
+    """
+
+    def __init__(
+        self,
+        max_bytes=DEFAULT_MAX_BYTES,
+        max_age_ms=DEFAULT_MAX_AGE_MS,
+        evict_after_ms=DEFAULT_EVICT_AFTER_MS,
+    ):
+        self.max_bytes = max_bytes
+        self.max_age = max_age_ms / 1000.0
+        self.evict_after = evict_after_ms / 1000.0
+        self.frames = deque()  # (timestamp, epoch, frame)
+        self.queued_bytes = 0
+        self.over_since = None
+
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.dropped_frames = 0
+        self.dropped_bytes = 0
+        self.max_queued_bytes = 0
+        self.connected_at = time.monotonic()
+        self.mountpoint = None
+        self.stream = None  # tên luồng RTCM (receiver) client đang nhận
+        self.chunked = False
+        self.subscription = None
+        self.wait_histogram = None  # LatencyMetrics.Histogram nếu bật metrics
+
+    def __len__(self):
+        return len(self.frames)
+
+    def push(self, frame, epoch, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.frames.append((now, epoch, frame))
+        self.queued_bytes += len(frame)
+        if self.queued_bytes > self.max_queued_bytes:
+            self.max_queued_bytes = self.queued_bytes
+
+        dropped = self._expire(now)
+        while self.queued_bytes > self.max_bytes and len(self.frames) > 1:
+            dropped += self._drop_oldest_epoch()
+
+        if dropped:
+            if self.over_since is None:
+                self.over_since = now
+        elif self.queued_bytes <= self.max_bytes // 2:
+            self.over_since = None
+        return dropped
+
+    def pop(self):
+        """Lấy khung kế tiếp để ghi ra socket"""
+        queued_at, _, frame = self.frames.popleft()
+        if self.wait_histogram is not None:
+            self.wait_histogram.observe(time.monotonic() - queued_at)
+        self.queued_bytes -= len(frame)
+        self.sent_frames += 1
+        self.sent_bytes += len(frame)
+        if self.over_since is not None and self.queued_bytes <= self.max_bytes // 2:
+            self.over_since = None
+        return frame
+
+    def peek_size(self):
+        return len(self.frames[0][2]) if self.frames else 0
+
+    def should_evict(self, now=None):
+        if self.over_since is None:
+            return False
+        if now is None:
+            now = time.monotonic()
+        return now - self.over_since >= self.evict_after
+
+    def clear(self):
+        self.frames.clear()
+        self.queued_bytes = 0
+
+    def _expire(self, now):
+        dropped = 0
+        while self.frames and now - self.frames[0][0] > self.max_age:
+            dropped += self._drop_oldest_epoch()
+        return dropped
+
+    def _drop_oldest_epoch(self):
+        frames = self.frames
+        epoch = frames[0][1]
+        dropped = 0
+        # Luôn giữ khung mới nhất vừa được đưa vào
+        while len(frames) > 1 and frames[0][1] == epoch:
+            _, _, frame = frames.popleft()
+            self.queued_bytes -= len(frame)
+            self.dropped_bytes += len(frame)
+            dropped += 1
+        if not dropped and frames:
+            # Chỉ còn đúng một khung nhưng đã quá hạn
+            _, _, frame = frames.popleft()
+            self.queued_bytes -= len(frame)
+            self.dropped_bytes += len(frame)
+            dropped = 1
+        self.dropped_frames += dropped
+        return dropped
+
+    def stats(self):
+        return {
+            "queued_frames": len(self.frames),
+            "queued_bytes": self.queued_bytes,
+            "max_queued_bytes": self.max_queued_bytes,
+            "sent_frames": self.sent_frames,
+            "sent_bytes": self.sent_bytes,
+            "dropped_frames": self.dropped_frames,
+            "dropped_bytes": self.dropped_bytes,
+            "overloaded": self.over_since is not None,
+            "uptime": round(time.monotonic() - self.connected_at, 1),
+            "mountpoint": self.mountpoint,
+        }
+
+
+class FanoutRegistry:
+    """
+    Danh sách client của các luồng RTCM, dùng chung cho mọi backend mạng.
+
+    Mỗi receiver là một luồng (stream); client chỉ nhận khung của luồng nó
+    đăng ký. Trong một luồng, client được gom theo MessageSubscription
+    (None = nhận mọi message) để bộ lọc chỉ chạy một lần cho mỗi nhóm trên
+    mỗi khung.
+    """
+
+    def __init__(self):
+        self.clients = {}  # client -> ClientSendQueue
+        self.streams = {}  # stream -> {MessageSubscription | None -> set(client)}
+        self.epochs = {}  # stream -> số epoch hiện tại
+
+    def __len__(self):
+        return len(self.clients)
+
+    def __contains__(self, client):
+        return client in self.clients
+
+    def get(self, client):
+        return self.clients.get(client)
+
+    def add(self, client, queue, subscription=None, stream=None):
+        queue.subscription = subscription
+        queue.stream = stream
+        self.clients[client] = queue
+        self.streams.setdefault(stream, {}).setdefault(subscription, set()).add(client)
+        return queue
+
+    def drop(self, client):
+        queue = self.clients.pop(client, None)
+        if queue is None:
+            return None
+        groups = self.streams.get(queue.stream, {})
+        members = groups.get(queue.subscription)
+        if members is not None:
+            members.discard(client)
+            if not members:
+                del groups[queue.subscription]
+                if not groups:
+                    del self.streams[queue.stream]
+        return queue
+
+    def clear(self):
+        self.clients.clear()
+        self.streams.clear()
+
+    def publish(self, frame, now=None, stream=None):
+        """
+        Đưa khung của luồng stream vào hàng đợi của mọi client chấp nhận nó.
+        Trả về iterator (client, queue) để backend ghi ra socket.
+        """
+        if now is None:
+            now = time.monotonic()
+        epoch = self.epochs.get(stream, 0)
+        if is_epoch_end(frame):
+            self.epochs[stream] = epoch + 1
+        groups = self.streams.get(stream)
+        if not groups:
+            return ()
+        return self._publish(groups, frame, epoch, now)
+
+    def _publish(self, groups, frame, epoch, now):
+        for subscription, members in groups.items():
+            if subscription is not None and not subscription.accept(frame, now):
+                continue
+            for client in members:
+                queue = self.clients[client]
+                queue.push(frame, epoch, now)
+                yield client, queue
+
+    def stream_clients(self, stream):
+        return sum(len(members) for members in self.streams.get(stream, {}).values())
+
+    def subscription_stats(self):
+        return [
+            sub.stats() for groups in self.streams.values() for sub in groups if sub is not None
+        ]
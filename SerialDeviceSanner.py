@@ -1,18 +1,57 @@
-import sys
-import glob
-import serial
 import time
-import serial.tools
-import serial.tools.list_ports
 from ConstVariable import *
 import os
-import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from PySide6.QtCore import Signal as pyqtSignal, QObject
 
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+# Thiết bị chỉ nhận ra được bằng cách gửi lệnh hỏi: tên -> (lệnh, câu trả lời)
+PROBES = {
+    "delta_x": (b"IsDelta\n", "YesDelta"),
+    "encoder_x": (b"IsXConveyor\n", "YesXConveyor"),
+}
+PROBE_DEADLINE = 1.0  # giây cho mỗi cổng (tất cả lệnh hỏi trên cổng đó)
+PROBE_WORKERS = 16
+CACHE_FILE = "serial_port_cache.json"
+# Cổng đã hỏi mà không phải thiết bị nào chỉ được nhớ trong thời gian này
+# (thiết bị có thể đang bận / chưa khởi động xong lúc hỏi)
+NEGATIVE_CACHE_TTL = 3600.0
+HOTPLUG_POLL_INTERVAL = 2.0
+PROBE_FAILED = object()  # probe_port(): không mở / đọc được cổng
+
+
+def port_key(port):
+    """Định danh ổn định của cổng: serial number USB, nếu không có thì vị trí USB"""
+    ident = port.serial_number or port.location or port.device
+    return f"{port.vid or 0:04x}:{port.pid or 0:04x}:{ident}"
+
 
 class DevicePortScanner(QObject):
+    """
+    Tìm cổng serial của từng thiết bị.
 
-    def __init__(self):
+    Thiết bị có serial number / description cố định được nhận ngay từ
+    thông tin USB. Thiết bị phải hỏi bằng lệnh (PROBES) được hỏi song song
+    trên mọi cổng, mỗi cổng có deadline riêng; kết quả lưu vào CACHE_FILE
+    theo port_key nên lần khởi động sau không cần hỏi lại. Cổng nhận ra
+    thiết bị được nhớ mãi, cổng không trả lời chỉ được nhớ
+    NEGATIVE_CACHE_TTL giây, cổng không mở được thì không nhớ. Các hàm
+    find_*() chỉ tra dict đã dựng sẵn.
+
+    Thread hotplug và thread chính cùng gọi update_devices(): bảng thiết bị
+    và cache chỉ được đọc/sửa dưới self.lock, còn việc hỏi cổng chạy ngoài
+    lock để tra cứu không bị chặn trong lúc chờ thiết bị trả lời.
+    """
+
+    ports_changed = pyqtSignal(dict)
+
+    def __init__(self, cache_file=CACHE_FILE):
         super().__init__()
         self.hand_camera_order = None
         self.calib_camera_order = None
@@ -23,109 +62,305 @@ class DevicePortScanner(QObject):
         self.ultrasonic_serial_number = ULTRASONIC.serial_number
         self.base_serial_number = BASE_STATION.serial_number
         self.base_description = BASE_STATION.description
-        self.ports = self.list_serial_ports()
+        self.receiver_serial_numbers = {}  # serial number -> tên receiver phụ (gps.receivers)
 
-    def refresh(self):
+        self.cache_file = cache_file
+        # port_key -> {"device": tên thiết bị hoặc None, "checked": time.time() lúc hỏi}
+        self.cache = self.load_cache()
+        self.lock = threading.RLock()
+        self.devices = {}  # tên thiết bị -> device path
+        self.probed = False  # đã hỏi các cổng lạ ít nhất một lần
+        self.probing = set()  # port_key các cổng đang được hỏi
+        self.watcher = None
+        self._tty_entries = None
         self.ports = self.list_serial_ports()
+        self.update_devices()
 
-        # kiểm tra xem có cổng nào là của DeltaX không
-        delta_x_port = self.find_delta_x_port()
-        if delta_x_port is not None:
-            pass
-
-        # kiểm tra xem có cổng nào là của Encoder X không
-        encoder_x_port = self.find_encoder_x_port()
+    def refresh(self, force_probe=False):
+        self.update_devices(self.list_serial_ports(), probe=True, force_probe=force_probe)
 
     def list_serial_ports(self):
+        # Import khi cần: list_ports kéo theo nhiều module, chỉ dùng khi quét cổng
+        import serial.tools.list_ports
 
-        ports = serial.tools.list_ports.comports()
-        # result = []
-        # for port in ports:
-        #     print(f"Device: {port.device}")
-        #     print(f"Name: {port.name}")
-        #     print(f"Description: {port.description}")
-        #     print(f"Manufacturer: {port.manufacturer}")
-        #     print(f"Serial Number: {port.serial_number}")
-        #     print(f"Location: {port.location}")
-        #     print(f"Vendor ID: {port.vid if port.vid else 'Unknown'}")
-        #     print(f"Product ID: {port.pid if port.pid else 'Unknown'}")
-        #     print("-" * 40)
-        # try:
-        #     s = serial.Serial(port)
-        #     s.close()
-        #     result.append(port)
-        # except (OSError, serial.SerialException):
-        #     pass
-        return ports
+        return serial.tools.list_ports.comports()
 
-    def find_delta_x_port(self):
-        for port in self.ports:
-            try:
-                ser = serial.Serial(port, baudrate=115200, timeout=1)
-                ser.write(b"IsDelta\n")
-                response = ser.readline().decode("utf-8").strip()
-                ser.close()
-                if response == "YesDelta":
-                    return port
-            except (OSError, serial.SerialException):
-                pass
+    # ------------------------------------------------------------------
+    # Nhận dạng thiết bị
+    # ------------------------------------------------------------------
+    def identify_static(self, port):
+        """Nhận dạng theo thông tin USB, không mở cổng"""
+        if port.serial_number is not None:
+            if port.serial_number in self.receiver_serial_numbers:
+                return f"receiver:{self.receiver_serial_numbers[port.serial_number]}"
+            if port.serial_number == self.rs485_serial_number:
+                return "rs485"
+            if port.serial_number == self.imu_serial_number:
+                return "imu"
+            if port.serial_number == self.um982_serial_number:
+                return "um982"
+            if port.serial_number == self.ultrasonic_serial_number:
+                return "s21c"
+        if (
+            port.description == self.base_description
+            and port.serial_number == self.base_serial_number
+        ):
+            return "base"
         return None
 
-    def find_encoder_x_port(self):
-        for port in self.ports:
+    def update_devices(self, ports=None, probe=False, force_probe=False):
+        """
+        Dựng lại bảng thiết bị từ thông tin USB và cache. ports (nếu có) thay
+        cho self.ports. Với probe=True, các cổng chưa có trong cache hoặc đã
+        hết hạn (mọi cổng lạ nếu force_probe) được hỏi.
+
+        Danh sách cổng cần hỏi được lấy dưới self.lock, hỏi cổng khi đã nhả
+        lock rồi lấy lại lock để gộp kết quả vào cache. Cổng đang được thread
+        khác hỏi thì không hỏi lại.
+        """
+        probe = probe or force_probe
+        with self.lock:
+            if ports is not None:
+                self.ports = ports
+            if probe:
+                self.probed = True
+            to_probe = self.ports_to_probe(force_probe) if probe else []
+            self.probing.update(port_key(port) for port in to_probe)
+
+        results = []
+        if to_probe:
             try:
-                ser = serial.Serial(port, baudrate=115200, timeout=1)
-                ser.write(b"IsXConveyor\n")
-                response = ser.readline().decode("utf-8").strip()
-                ser.close()
-                if response == "YesXConveyor":
-                    return port
-            except (OSError, serial.SerialException):
-                pass
-        return None
+                results = self.probe_ports(to_probe)
+            finally:
+                with self.lock:
+                    self.probing.difference_update(port_key(port) for port in to_probe)
 
-    def find_rs485_port(self):
+        with self.lock:
+            now = time.time()
+            for port, name in zip(to_probe, results):
+                if name is PROBE_FAILED:
+                    # Không mở được (đang bận, ...): không nhớ, lần sau hỏi lại
+                    self.cache.pop(port_key(port), None)
+                else:
+                    self.cache[port_key(port)] = {"device": name, "checked": now}
+            if results:
+                self.save_cache()
+            # self.ports có thể đã đổi trong lúc hỏi cổng
+            devices = self.match_devices(now)
+            changed = devices != self.devices
+            self.devices = devices
+        if changed:
+            self.ports_changed.emit(dict(devices))
+        return devices
+
+    def ports_to_probe(self, force_probe=False):
+        """Các cổng không nhận ra từ USB mà cache chưa có / đã hết hạn (gọi dưới self.lock)"""
+        now = time.time()
+        return [
+            port
+            for port in self.ports
+            if self.identify_static(port) is None
+            and port_key(port) not in self.probing
+            and (force_probe or self.cached(port_key(port), now) is None)
+        ]
+
+    def match_devices(self, now):
+        """Tên thiết bị -> device path từ thông tin USB và cache (gọi dưới self.lock)"""
+        devices = {}
         for port in self.ports:
-            if port.serial_number == self.rs485_serial_number:
-                return port.device
+            name = self.identify_static(port)
+            if name is None:
+                entry = self.cached(port_key(port), now)
+                if entry is not None:
+                    name = entry["device"]
+            if name is not None:
+                devices[name] = port.device
+        return devices
+
+    def cached(self, key, now):
+        """Mục cache còn dùng được của cổng, None nếu phải hỏi lại"""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry["device"] is None and now - entry["checked"] > NEGATIVE_CACHE_TTL:
+            return None
+        return entry
+
+    def probe_ports(self, ports, deadline=PROBE_DEADLINE):
+        """
+        Hỏi song song các cổng, trả về theo thứ tự ports: tên thiết bị, None
+        nếu không phải thiết bị nào, PROBE_FAILED nếu không mở được cổng
+        """
+        with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(ports))) as pool:
+            return list(pool.map(lambda port: self.probe_port(port.device, deadline), ports))
+
+    def probe_port(self, device, deadline=PROBE_DEADLINE):
+        # Import khi cần: chỉ mở cổng khi có cổng lạ phải hỏi
+        import serial
+
+        end = time.monotonic() + deadline
+        try:
+            ser = serial.Serial(device, baudrate=115200, timeout=deadline)
+        except (OSError, serial.SerialException):
+            return PROBE_FAILED
+        try:
+            for name, (command, expected) in PROBES.items():
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                ser.timeout = remaining
+                ser.reset_input_buffer()
+                ser.write(command)
+                response = ser.readline().decode("utf-8", errors="ignore").strip()
+                if response == expected:
+                    return name
+        except (OSError, serial.SerialException):
+            return PROBE_FAILED
+        finally:
+            ser.close()
         return None
 
+    def load_cache(self):
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict):
+            return {}
+        # Cache cũ lưu thẳng tên thiết bị; mục None (có thể do cổng bận) bị bỏ để hỏi lại
+        return {
+            key: entry if isinstance(entry, dict) else {"device": entry, "checked": 0.0}
+            for key, entry in cache.items()
+            if entry is not None
+        }
+
+    def save_cache(self):
+        temp_path = f"{self.cache_file}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(self.cache, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.cache_file)
+        except OSError as e:
+            print(f"[SERIAL] failed to save port cache: {e}")
+
+    # ------------------------------------------------------------------
+    # Cắm / rút thiết bị
+    # ------------------------------------------------------------------
+    def start_watcher(self):
+        """Theo dõi cắm/rút cổng: udev netlink nếu có pyudev, ngược lại poll sysfs"""
+        if self.watcher is not None:
+            return
+        if pyudev is not None:
+            context = pyudev.Context()
+            monitor = pyudev.Monitor.from_netlink(context)
+            monitor.filter_by(subsystem="tty")
+            self.watcher = pyudev.MonitorObserver(monitor, callback=lambda device: self.on_hotplug())
+            self.watcher.start()
+        else:
+            self.watcher = threading.Thread(target=self._poll_ports, name="SerialHotplug", daemon=True)
+            self.watcher.start()
+
+    def _poll_ports(self):
+        known = {port.device for port in self.ports}
+        while True:
+            time.sleep(HOTPLUG_POLL_INTERVAL)
+            # /sys/class/tty đổi khi có cổng mới; rẻ hơn nhiều so với comports()
+            if not self._tty_changed():
+                continue
+            current = {port.device for port in self.list_serial_ports()}
+            if current != known:
+                known = current
+                self.on_hotplug()
+
+    def _tty_changed(self):
+        try:
+            entries = frozenset(os.listdir("/sys/class/tty"))
+        except OSError:
+            return True
+        changed = entries != self._tty_entries
+        self._tty_entries = entries
+        return changed
+
+    def on_hotplug(self):
+        ports = self.list_serial_ports()
+        with self.lock:
+            old = {port.device for port in self.ports}
+            probe = self.probed
+        added = [port.device for port in ports if port.device not in old]
+        removed = old - {port.device for port in ports}
+        print(f"[SERIAL] hotplug added={added} removed={sorted(removed)}")
+        # Cổng cũ lấy từ cache, chỉ cổng mới (chưa có trong cache) bị hỏi
+        self.update_devices(ports, probe=probe)
+
+    # ------------------------------------------------------------------
+    # Tra cứu
+    # ------------------------------------------------------------------
+    def find_device(self, name):
+        return self.devices.get(name)
+
+    def find_probed_device(self, name):
+        # Chỉ hỏi các cổng (mở cổng, gửi lệnh) khi thực sự cần thiết bị loại này
+        if name not in self.devices and not self.probed:
+            self.update_devices(probe=True)
+        return self.find_device(name)
+
+    def find_delta_x_port(self):
+        return self.find_probed_device("delta_x")
+
+    def find_encoder_x_port(self):
+        return self.find_probed_device("encoder_x")
+
+    def find_rs485_port(self):
+        return self.find_device("rs485")
+
     def find_imu_port(self):
-        for port in self.ports:
-            if port.serial_number == self.imu_serial_number:
-                return port.device
-        return None
+        return self.find_device("imu")
 
     def find_um982_port(self):
-        for port in self.ports:
-            if port.serial_number == self.um982_serial_number:
-                return str(port.device)
-        return None
+        port = self.find_device("um982")
+        return str(port) if port is not None else None
 
     def find_s21c_port(self):
-        for port in self.ports:
-            if port.serial_number == self.ultrasonic_serial_number:
-                return port.device
-        return None
+        return self.find_device("s21c")
+
+    def resolve_base_port(self):
+        """Liệt kê lại cổng (không hỏi cổng lạ) rồi trả về cổng base hiện tại"""
+        self.update_devices(self.list_serial_ports())
+        return self.find_device("base")
+
+    def add_receiver(self, name, serial_number):
+        """Thêm receiver phụ nhận dạng theo serial number USB"""
+        self.receiver_serial_numbers[serial_number] = name
+        self.update_devices()
+
+    def find_receiver_port(self, name):
+        return self.find_device(f"receiver:{name}")
+
+    def resolve_receiver_port(self, name):
+        """Như resolve_base_port() cho receiver phụ"""
+        self.update_devices(self.list_serial_ports())
+        return self.find_receiver_port(name)
 
     def find_base_port(self):
-        for port in self.ports:
-            if (
-                port.description == self.base_description
-                and port.serial_number == self.base_serial_number
-            ):
-                print(f"base port >> {port.device}")
-                return port.device
-        print(f"port not found")
-        return None
+        port = self.find_device("base")
+        if port is not None:
+            print(f"base port >> {port}")
+        else:
+            print(f"port not found")
+        return port
 
 
 if __name__ == "__main__":
+    start = time.perf_counter()
     scanner = DevicePortScanner()
+    print(f"scan: {(time.perf_counter() - start) * 1000:.1f} ms")
     print(f"rs485 >> {scanner.find_rs485_port()}")
     print(f"imu >> {scanner.find_imu_port()}")
     print(f"um982 >> {scanner.find_um982_port()}")
     print(f"s21c >> {scanner.find_s21c_port()}")
+    start = time.perf_counter()
     print(f"base >> {scanner.find_base_port()}")
-    # print("xencoder: ", scanner.find_encoder_x_port())
-    # print("deltax", scanner.find_delta_x_port())
+    print(f"lookup: {(time.perf_counter() - start) * 1e6:.1f} us")
+    print("xencoder: ", scanner.find_encoder_x_port())
+    print("deltax", scanner.find_delta_x_port())
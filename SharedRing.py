@@ -0,0 +1,138 @@
+from multiprocessing import shared_memory
+import struct
+
+# Header: magic, số slot, kích thước slot, seq đã ghi xong gần nhất
+HEADER = struct.Struct("<4sIIQ")
+HEADER_SEQ_OFFSET = struct.calcsize("<4sII")
+RING_MAGIC = b"RTR1"
+# Mỗi slot: seq (ghi trước và sau khi chép dữ liệu), độ dài, dữ liệu
+SLOT_HEADER = struct.Struct("<QH")
+# Khung RTCM3 lớn nhất: 3 byte header + 1023 payload + 3 CRC
+DEFAULT_SLOT_DATA = 1029
+DEFAULT_SLOTS = 4096
+# Số khung tối đa mỗi lần read_available
+READ_BATCH = 1024
+
+
+class RingOverrun(Exception):
+    """Reader chậm hơn writer quá một vòng ring, một số khung đã bị ghi đè"""
+
+    def __init__(self, lost, next_seq):
+        super().__init__(f"ring overrun, lost {lost} frames")
+        self.lost = lost
+        self.next_seq = next_seq
+
+
+class SharedFrameRing:
+    """
+    Ring buffer trên multiprocessing.shared_memory: một writer, nhiều reader.
+
+    Mỗi khung được gán số thứ tự (seq) tăng dần và ghi vào slot seq % slots.
+    Slot được đánh dấu seq ở đầu và cuối (kiểu seqlock) nên reader nhận ra
+    slot đang ghi dở; reader chậm phát hiện overrun khi seq trong slot lớn hơn
+    seq nó đang chờ và nhảy tới khung cũ nhất còn hợp lệ.
+    """
+
+    def __init__(self, name=None, create=False, slots=DEFAULT_SLOTS, slot_data=DEFAULT_SLOT_DATA):
+        if create:
+            slot_size = SLOT_HEADER.size + slot_data + 8
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=HEADER.size + slots * slot_size
+            )
+            HEADER.pack_into(self.shm.buf, 0, RING_MAGIC, slots, slot_size, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            magic, slots, slot_size, _ = HEADER.unpack_from(self.shm.buf, 0)
+            if magic != RING_MAGIC:
+                raise ValueError(f"{name} is not a frame ring")
+            slot_data = slot_size - SLOT_HEADER.size - 8
+        self.name = self.shm.name
+        self.owner = create
+        self.slots = slots
+        self.slot_size = SLOT_HEADER.size + slot_data + 8
+        self.slot_data = slot_data
+        self.buf = self.shm.buf
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    @property
+    def head(self):
+        """seq của khung mới nhất đã ghi xong (0 = chưa có khung nào)"""
+        return HEADER.unpack_from(self.buf, 0)[3]
+
+    def _slot_offset(self, seq):
+        return HEADER.size + (seq % self.slots) * self.slot_size
+
+    # ------------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------------
+    def publish(self, frame):
+        length = len(frame)
+        if length > self.slot_data:
+            raise ValueError(f"frame too large for ring slot ({length} bytes)")
+        buf = self.buf
+        seq = HEADER.unpack_from(buf, 0)[3] + 1
+        offset = self._slot_offset(seq)
+        tail = offset + self.slot_size - 8
+        # Đánh dấu slot đang ghi: seq cuối != seq đầu
+        struct.pack_into("<Q", buf, tail, 0)
+        SLOT_HEADER.pack_into(buf, offset, seq, length)
+        start = offset + SLOT_HEADER.size
+        buf[start : start + length] = frame
+        struct.pack_into("<Q", buf, tail, seq)
+        struct.pack_into("<Q", buf, HEADER_SEQ_OFFSET, seq)
+        return seq
+
+    # ------------------------------------------------------------------
+    # Reader
+    # ------------------------------------------------------------------
+    def read(self, seq):
+        """
+        Đọc khung có số thứ tự seq. Trả về bytes, hoặc None nếu khung chưa
+        được ghi. Raise RingOverrun nếu khung đã bị ghi đè.
+        """
+        buf = self.buf
+        offset = self._slot_offset(seq)
+        tail = offset + self.slot_size - 8
+        slot_seq, length = SLOT_HEADER.unpack_from(buf, offset)
+        if slot_seq < seq:
+            return None
+        start = offset + SLOT_HEADER.size
+        frame = bytes(buf[start : start + length])
+        end_seq = struct.unpack_from("<Q", buf, tail)[0]
+        if slot_seq == seq and end_seq == seq:
+            return frame
+        if slot_seq > seq or end_seq > seq:
+            raise self._overrun(seq)
+        # Slot đang được ghi (hiếm khi xảy ra): coi như chưa có
+        return None
+
+    def _overrun(self, seq):
+        head = self.head
+        oldest = max(seq + 1, head - self.slots + 2)
+        return RingOverrun(oldest - seq, oldest)
+
+    def read_available(self, seq, limit=READ_BATCH):
+        """
+        Đọc tối đa limit khung từ seq tới head. Trả về (list khung, seq kế tiếp,
+        số khung mất); đủ limit khung thì có thể ring vẫn còn khung chưa đọc.
+        """
+        frames = []
+        lost = 0
+        head = self.head
+        while seq <= head and len(frames) < limit:
+            try:
+                frame = self.read(seq)
+            except RingOverrun as e:
+                lost += e.lost
+                seq = e.next_seq
+                continue
+            if frame is None:
+                break
+            frames.append(frame)
+            seq += 1
+        return frames, seq, lost
@@ -0,0 +1,306 @@
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+from RTCM3Framer import is_msm, message_type, msm_epoch_ms
+from UBXProtocol import build_ubx
+
+KIND_RTCM3 = 1
+KIND_UBX = 2
+
+# Bản ghi index: wall time (ns), receiver time (ms, -1 nếu không có),
+# offset trong segment, độ dài, message type, loại khung
+INDEX_RECORD = struct.Struct("<qiIHHB3x")
+SEGMENT_SUFFIX = ".bin"
+INDEX_SUFFIX = ".idx"
+
+
+class StreamRecorder:
+    """
+    Ghi luồng khung nhận từ receiver vào các segment xoay vòng kèm file index.
+
+    record_*() chỉ thêm tuple vào list nên gần như không tốn thời gian trên
+    thread đọc serial; thread nền gom cả loạt, tính message type / receiver
+    time và ghi một lần cho segment và một lần cho index.
+    """
+
+    def __init__(
+        self,
+        directory="archive",
+        segment_bytes=64 * 1024 * 1024,
+        segment_seconds=3600,
+        flush_interval=0.5,
+        keep_segments=0,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.keep_segments = keep_segments
+        self.pending = []
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+
+        self.segment_name = None
+        self.segment_file = None
+        self.index_file = None
+        self.segment_size = 0
+        self.segment_started = 0.0
+
+        self.records = 0
+        self.bytes = 0
+        self.write_batches = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="StreamRecorder", daemon=True)
+        self.thread.start()
+        print(f"[ARCHIVE] recording to {os.path.abspath(self.directory)}")
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.wakeup.set()
+        self.thread.join(5)
+        self._close_segment()
+
+    def record_rtcm(self, frame):
+        self.pending.append((time.time_ns(), KIND_RTCM3, frame))
+
+    def record_ubx(self, msg_class, msg_id, payload):
+        self.pending.append((time.time_ns(), KIND_UBX, (msg_class, msg_id, payload)))
+
+    def _run(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        # list.append/slice đều atomic dưới GIL, không cần khóa thread đọc
+        batch = self.pending[:]
+        del self.pending[: len(batch)]
+
+        data = bytearray()
+        index = bytearray()
+        for wall_ns, kind, item in batch:
+            if self.segment_file is None or self._segment_full(wall_ns):
+                self._write(data, index)
+                data = bytearray()
+                index = bytearray()
+                self._open_segment(wall_ns)
+
+            if kind == KIND_RTCM3:
+                frame = item
+                msg_type = message_type(frame)
+                rx_time = msm_epoch_ms(frame) if is_msm(msg_type) else -1
+            else:
+                msg_class, msg_id, payload = item
+                frame = build_ubx(msg_class, msg_id, payload)
+                msg_type = (msg_class << 8) | msg_id
+                rx_time = -1
+                if msg_class == 0x01 and len(payload) >= 8:
+                    # Hầu hết message NAV có iTOW ở offset 4 sau version/reserved
+                    rx_time = struct.unpack_from("<I", payload, 4)[0]
+
+            index += INDEX_RECORD.pack(wall_ns, rx_time, self.segment_size, len(frame), msg_type, kind)
+            data += frame
+            self.segment_size += len(frame)
+            self.records += 1
+            self.bytes += len(frame)
+        self._write(data, index)
+
+    def _write(self, data, index):
+        if not data:
+            return
+        self.segment_file.write(data)
+        self.segment_file.flush()
+        self.index_file.write(index)
+        self.index_file.flush()
+        self.write_batches += 1
+
+    def _segment_full(self, wall_ns):
+        return (
+            self.segment_size >= self.segment_bytes
+            or wall_ns / 1e9 - self.segment_started >= self.segment_seconds
+        )
+
+    def _open_segment(self, wall_ns):
+        self._close_segment()
+        stamp = datetime.fromtimestamp(wall_ns / 1e9).strftime("%Y%m%dT%H%M%S_%f")
+        self.segment_name = os.path.join(self.directory, stamp)
+        self.segment_file = open(self.segment_name + SEGMENT_SUFFIX, "ab")
+        self.index_file = open(self.segment_name + INDEX_SUFFIX, "ab")
+        self.segment_size = self.segment_file.tell()
+        self.segment_started = wall_ns / 1e9
+        self._apply_retention()
+
+    def _close_segment(self):
+        if self.segment_file is not None:
+            self.segment_file.close()
+            self.index_file.close()
+        self.segment_file = None
+        self.index_file = None
+
+    def _apply_retention(self):
+        if self.keep_segments <= 0:
+            return
+        segments = list_segments(self.directory)
+        for name in segments[: max(0, len(segments) - self.keep_segments)]:
+            for suffix in (SEGMENT_SUFFIX, INDEX_SUFFIX):
+                try:
+                    os.remove(name + suffix)
+                except OSError:
+                    pass
+
+    def stats(self):
+        return {
+            "records": self.records,
+            "bytes": self.bytes,
+            "write_batches": self.write_batches,
+            "pending": len(self.pending),
+            "segment": self.segment_name,
+        }
+
+
+def list_segments(directory):
+    names = [f[: -len(INDEX_SUFFIX)] for f in os.listdir(directory) if f.endswith(INDEX_SUFFIX)]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+class _IndexView:
+    """Truy cập index đã mmap như một dãy bản ghi (dùng cho bisect)"""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.count = len(buf) // INDEX_RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return INDEX_RECORD.unpack_from(self.buf, i * INDEX_RECORD.size)
+
+    def wall_ns(self, i):
+        return struct.unpack_from("<q", self.buf, i * INDEX_RECORD.size)[0]
+
+
+class _WallTimes:
+    def __init__(self, view):
+        self.view = view
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, i):
+        return self.view.wall_ns(i)
+
+
+class ArchiveReader:
+    """Trích khung theo khoảng thời gian / message type bằng mmap, không quét cả file"""
+
+    def __init__(self, directory="archive"):
+        self.directory = directory
+
+    def segments(self):
+        result = []
+        for name in list_segments(self.directory):
+            size = os.path.getsize(name + INDEX_SUFFIX)
+            if size < INDEX_RECORD.size:
+                continue
+            with open(name + INDEX_SUFFIX, "rb") as f:
+                first = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+                f.seek((size // INDEX_RECORD.size - 1) * INDEX_RECORD.size)
+                last = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+            result.append((name, first[0], last[0], size // INDEX_RECORD.size))
+        return result
+
+    def extract(self, start_ns=None, end_ns=None, msg_types=None, kinds=None):
+        """
+        Sinh ra (wall_ns, rx_time_ms, kind, msg_type, frame) trong khoảng
+        [start_ns, end_ns), lọc theo message type và loại khung nếu có.
+        """
+        msg_types = set(msg_types) if msg_types else None
+        for name, first_ns, last_ns, _ in self.segments():
+            if start_ns is not None and last_ns < start_ns:
+                continue
+            if end_ns is not None and first_ns >= end_ns:
+                continue
+            with open(name + INDEX_SUFFIX, "rb") as fi, open(name + SEGMENT_SUFFIX, "rb") as fd:
+                index_map = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+                data_map = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    view = _IndexView(index_map)
+                    lo = 0 if start_ns is None else bisect.bisect_left(_WallTimes(view), start_ns)
+                    hi = len(view) if end_ns is None else bisect.bisect_left(_WallTimes(view), end_ns)
+                    for i in range(lo, hi):
+                        wall_ns, rx_time, offset, length, msg_type, kind = view[i]
+                        if msg_types is not None and msg_type not in msg_types:
+                            continue
+                        if kinds is not None and kind not in kinds:
+                            continue
+                        yield wall_ns, rx_time, kind, msg_type, data_map[offset : offset + length]
+                finally:
+                    index_map.close()
+                    data_map.close()
+
+
+def _parse_time(value):
+    if value is None:
+        return None
+    try:
+        return int(float(value) * 1e9)
+    except ValueError:
+        return int(datetime.fromisoformat(value).timestamp() * 1e9)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trích dữ liệu từ archive luồng receiver")
+    parser.add_argument("--dir", default="archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="liệt kê segment")
+    extract = sub.add_parser("extract", help="trích khung ra file")
+    extract.add_argument("--start", help="ISO time hoặc unix time (s)")
+    extract.add_argument("--end", help="ISO time hoặc unix time (s)")
+    extract.add_argument("--type", type=int, action="append", help="message type, lặp lại được")
+    extract.add_argument("--kind", choices=("rtcm3", "ubx"))
+    extract.add_argument("-o", "--output", help="file đầu ra (mặc định stdout)")
+    args = parser.parse_args(argv)
+
+    reader = ArchiveReader(args.dir)
+    if args.command == "list":
+        for name, first_ns, last_ns, count in reader.segments():
+            start = datetime.fromtimestamp(first_ns / 1e9).isoformat(timespec="milliseconds")
+            end = datetime.fromtimestamp(last_ns / 1e9).isoformat(timespec="milliseconds")
+            print(f"{os.path.basename(name)}  {start} -> {end}  {count} frames")
+        return
+
+    kinds = None
+    if args.kind:
+        kinds = {KIND_RTCM3} if args.kind == "rtcm3" else {KIND_UBX}
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    count = 0
+    try:
+        for *_, frame in reader.extract(_parse_time(args.start), _parse_time(args.end), args.type, kinds):
+            out.write(frame)
+            count += 1
+    finally:
+        if args.output:
+            out.close()
+    print(f"{count} frames", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import math
+import struct
+
+from RTCM3Framer import WEEK_MS
+
+NAV_HPPOSECEF_CLASS = 0x01
+NAV_HPPOSECEF_ID = 0x13
+
+# version, reserved0[3], iTOW, ecefX/Y/Z (cm), ecefX/Y/ZHp (0.1 mm), flags, pAcc (0.1 mm)
+NAV_HPPOSECEF = struct.Struct("<B3sIiiibbbBI")
+
+
+def decode_nav_hpposecef(payload):
+    """
+    Giải mã UBX-NAV-HPPOSECEF (28 byte).
+    Trả về (iTOW ms, x m, y m, z m, pAcc m) hoặc None nếu vị trí không hợp lệ.
+    """
+    if len(payload) != NAV_HPPOSECEF.size:
+        return None
+    _, _, itow, x, y, z, x_hp, y_hp, z_hp, flags, p_acc = NAV_HPPOSECEF.unpack(payload)
+    if flags & 0x01:  # invalidEcef
+        return None
+    return (
+        itow,
+        x * 0.01 + x_hp * 0.0001,
+        y * 0.01 + y_hp * 0.0001,
+        z * 0.01 + z_hp * 0.0001,
+        p_acc * 0.0001,
+    )
+
+
+class SurveyInEngine:
+    """
+    Survey-in trên host: trung bình vị trí từ NAV-HPPOSECEF theo Welford
+    (mean + hiệp phương sai 3x3, bộ nhớ O(1)).
+
+    Hội tụ khi đã qua min_duration và cả hai điều kiện đều đạt:
+    • độ bất định của vị trí trung bình sqrt(trace(cov) / n_eff) <= target,
+      với n_eff = thời gian khảo sát / decorrelation (mẫu GNSS liên tiếp
+      tương quan mạnh nên không dùng trực tiếp số mẫu)
+    • vị trí trung bình dịch chuyển không quá target trong drift_window giây
+    """
+
+    def __init__(
+        self,
+        target_mm=100,
+        min_duration=30,
+        max_duration=300,
+        decorrelation=30,
+        drift_window=30,
+        max_pacc_mm=0,
+    ):
+        self.target = target_mm / 1000.0
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.decorrelation = decorrelation
+        self.drift_window = drift_window
+        self.max_pacc = max_pacc_mm / 1000.0
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.rejected = 0
+        self.origin = None  # mẫu đầu tiên; thống kê tính trên độ lệch so với nó
+        self.first_itow = None
+        self.duration = 0.0
+        self.mean = [0.0, 0.0, 0.0]
+        # Tổng bình phương độ lệch: xx, yy, zz, xy, xz, yz
+        self.m2 = [0.0] * 6
+        self.drift_mark = None  # (duration, mean) ở đầu cửa sổ drift
+        self.drift = None
+        self.converged = False
+
+    def update(self, payload):
+        """Thêm một NAV-HPPOSECEF; trả về True đúng một lần khi vừa hội tụ"""
+        sample = decode_nav_hpposecef(payload)
+        if sample is None or (self.max_pacc and sample[4] > self.max_pacc):
+            self.rejected += 1
+            return False
+        itow, x, y, z, _ = sample
+        if self.origin is None:
+            self.origin = (x, y, z)
+            self.first_itow = itow
+        self.duration = ((itow - self.first_itow) % WEEK_MS) / 1000.0
+        self.add(x - self.origin[0], y - self.origin[1], z - self.origin[2])
+
+        if self.converged:
+            return False
+        self._update_drift()
+        if self.duration >= self.min_duration and self.uncertainty() <= self.target:
+            if self.drift is not None and self.drift <= self.target:
+                self.converged = True
+                return True
+        return False
+
+    def add(self, dx, dy, dz):
+        self.n += 1
+        n = self.n
+        mean = self.mean
+        d0 = dx - mean[0]
+        d1 = dy - mean[1]
+        d2 = dz - mean[2]
+        mean[0] += d0 / n
+        mean[1] += d1 / n
+        mean[2] += d2 / n
+        e0 = dx - mean[0]
+        e1 = dy - mean[1]
+        e2 = dz - mean[2]
+        m2 = self.m2
+        m2[0] += d0 * e0
+        m2[1] += d1 * e1
+        m2[2] += d2 * e2
+        m2[3] += d0 * e1
+        m2[4] += d0 * e2
+        m2[5] += d1 * e2
+
+    def _update_drift(self):
+        if self.drift_mark is None:
+            self.drift_mark = (self.duration, tuple(self.mean))
+            return
+        started, mean = self.drift_mark
+        if self.duration - started >= self.drift_window:
+            self.drift = math.dist(mean, self.mean)
+            self.drift_mark = (self.duration, tuple(self.mean))
+
+    def covariance(self):
+        """Hiệp phương sai mẫu (m²): xx, yy, zz, xy, xz, yz"""
+        if self.n < 2:
+            return None
+        return [value / (self.n - 1) for value in self.m2]
+
+    def effective_samples(self):
+        if self.decorrelation <= 0:
+            return self.n
+        return max(1.0, min(self.n, self.duration / self.decorrelation))
+
+    def uncertainty(self):
+        """Độ bất định 3D (m) của vị trí trung bình"""
+        cov = self.covariance()
+        if cov is None:
+            return math.inf
+        return math.sqrt((cov[0] + cov[1] + cov[2]) / self.effective_samples())
+
+    def timed_out(self):
+        return self.max_duration > 0 and self.duration >= self.max_duration
+
+    def position_cm(self):
+        """Vị trí trung bình theo cm (đơn vị của gps.ecef_*)"""
+        if self.origin is None:
+            return None
+        return tuple(round((o + m) * 100) for o, m in zip(self.origin, self.mean))
+
+    def accuracy_mm(self):
+        value = self.uncertainty()
+        return None if math.isinf(value) else max(1, math.ceil(value * 1000))
+
+    def summary(self):
+        cov = self.covariance()
+        return {
+            "samples": self.n,
+            "rejected": self.rejected,
+            "duration": round(self.duration, 1),
+            "std_mm": None if cov is None else [round(math.sqrt(v) * 1000, 1) for v in cov[:3]],
+            "uncertainty_mm": self.accuracy_mm(),
+            "drift_mm": None if self.drift is None else round(self.drift * 1000, 1),
+            "target_mm": round(self.target * 1000),
+            "converged": self.converged,
+            "position_cm": self.position_cm(),
+        }
@@ -0,0 +1,229 @@
+import argparse
+import csv
+import gzip
+import io
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CSV_SUFFIX = ".csv"
+GZIP_SUFFIX = ".csv.gz"
+
+
+class TelemetryLog:
+    """
+    Log CSV cho dữ liệu đo (NAV-SVIN, ...) ghi từ thread nền.
+
+    record() chỉ thêm tuple vào list; thread nền ghi cả loạt khi đủ
+    flush_records bản ghi hoặc sau flush_interval giây. Mỗi file có một dòng
+    header tên cột, khi vượt max_bytes thì đóng, nén gzip và mở file mới;
+    chỉ giữ keep_files file gần nhất (0 = giữ tất cả).
+    """
+
+    def __init__(
+        self,
+        name,
+        fields,
+        directory="telemetry",
+        max_bytes=16 * 1024 * 1024,
+        keep_files=30,
+        flush_interval=1.0,
+        flush_records=256,
+    ):
+        self.name = name
+        self.fields = ("time",) + tuple(fields)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.pending = []
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+        self.file = None
+        self.file_path = None
+        self.file_size = 0
+
+        self.records = 0
+        self.write_batches = 0
+        self.rotations = 0
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name=f"TelemetryLog-{self.name}", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.wakeup.set()
+        self.thread.join(5)
+        self._close_file()
+
+    def record(self, *values):
+        """Thêm một bản ghi (theo thứ tự fields), thời gian được gắn tự động"""
+        self.pending.append((time.time(),) + values)
+        if not self.running:
+            self.start()
+        if len(self.pending) >= self.flush_records:
+            self.wakeup.set()
+
+    def _run(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        # list.append/slice đều atomic dưới GIL, không cần khóa thread đọc
+        batch = self.pending[:]
+        del self.pending[: len(batch)]
+
+        if self.file is None:
+            self._open_file()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerows(batch)
+        data = buffer.getvalue().encode()
+        self.file.write(data)
+        self.file.flush()
+        self.file_size += len(data)
+        self.records += len(batch)
+        self.write_batches += 1
+        if self.file_size >= self.max_bytes:
+            self._rotate()
+
+    def _open_file(self):
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S_%f")
+        self.file_path = os.path.join(self.directory, f"{self.name}_{stamp}{CSV_SUFFIX}")
+        # File .csv còn sót từ lần chạy trước (tắt đột ngột) được nén luôn
+        for path in list_files(self.directory, self.name):
+            if path.endswith(CSV_SUFFIX) and path != self.file_path:
+                self._compress(path)
+        self.file = open(self.file_path, "ab")
+        self.file_size = self.file.tell()
+        if self.file_size == 0:
+            header = (",".join(self.fields) + "\n").encode()
+            self.file.write(header)
+            self.file_size = len(header)
+
+    def _close_file(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+
+    def _rotate(self):
+        path = self.file_path
+        self._close_file()
+        self._compress(path)
+        self.rotations += 1
+        self._apply_retention()
+
+    def _compress(self, path):
+        try:
+            with open(path, "rb") as src, gzip.open(path[: -len(CSV_SUFFIX)] + GZIP_SUFFIX, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        except OSError as e:
+            print(f"[TELEMETRY] failed to compress {path}: {e}")
+
+    def _apply_retention(self):
+        if self.keep_files <= 0:
+            return
+        files = list_files(self.directory, self.name)
+        for path in files[: max(0, len(files) - self.keep_files)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            "records": self.records,
+            "write_batches": self.write_batches,
+            "rotations": self.rotations,
+            "pending": len(self.pending),
+            "file": self.file_path,
+        }
+
+
+def list_files(directory, name):
+    """Các file (.csv và .csv.gz) của log name, cũ nhất trước"""
+    if not os.path.isdir(directory):
+        return []
+    prefix = f"{name}_"
+    # Sau prefix phải là timestamp: "svin_" không được khớp "svin_complete_..."
+    files = [
+        f for f in os.listdir(directory)
+        if f.startswith(prefix)
+        and f[len(prefix) : len(prefix) + 1].isdigit()
+        and (f.endswith(CSV_SUFFIX) or f.endswith(GZIP_SUFFIX))
+    ]
+    return [os.path.join(directory, f) for f in sorted(files)]
+
+
+def load(directory, name, start=None, end=None):
+    """
+    Đọc toàn bộ log name thành dict cột -> dãy giá trị (numpy array nếu có
+    numpy), lọc theo time trong [start, end) nếu có.
+    """
+    header = None
+    rows = []
+    for path in list_files(directory, name):
+        opener = gzip.open if path.endswith(GZIP_SUFFIX) else open
+        with opener(path, "rt", newline="") as f:
+            reader = csv.reader(f)
+            file_header = next(reader, None)
+            if file_header is None:
+                continue
+            header = header or file_header
+            for row in reader:
+                if len(row) != len(header):
+                    continue  # dòng ghi dở khi tắt đột ngột
+                t = float(row[0])
+                if (start is not None and t < start) or (end is not None and t >= end):
+                    continue
+                rows.append(row)
+    if header is None:
+        return {}
+    columns = {}
+    for index, field in enumerate(header):
+        values = [row[index] for row in rows]
+        try:
+            values = [float(v) for v in values]
+        except ValueError:
+            pass
+        columns[field] = np.asarray(values) if np is not None else values
+    return columns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Xem log telemetry")
+    parser.add_argument("name", help="tên log, ví dụ svin")
+    parser.add_argument("--dir", default="telemetry")
+    args = parser.parse_args()
+
+    for path in list_files(args.dir, args.name):
+        print(f"{os.path.basename(path)}  {os.path.getsize(path)} bytes")
+    columns = load(args.dir, args.name)
+    if columns:
+        count = len(columns["time"])
+        print(f"{count} records, columns: {', '.join(columns)}")
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+
+import VariableManager
+
+TELEMETRY_EVENT = "telemetry"
+DEFAULT_PUBLISH_HZ = 0.0  # mặc định giữ các event cũ cho dashboard hiện có
+
+# Các trường NAV-SVIN dashboard dùng (bỏ version/reserved*)
+SVIN_FIELDS = ("iTOW", "dur", "meanX", "meanY", "meanZ", "meanXHP", "meanYHP", "meanZHP", "meanAcc", "obs", "valid", "active")
+BASE_DATA_FIELDS = ("name", "ecef_x", "ecef_y", "ecef_z", "acc", "mode", "rate")
+# Bộ đếm lỗi của RTCM3Framer và UBXCommandChannel giữ lại trong base_data
+RTCM3_FIELDS = ("frames", "resyncs", "crc_errors", "discarded_bytes")
+COMMAND_FIELDS = ("nacked", "timeouts", "failed")
+
+
+def compact_svin(data):
+    item = {field: data[field] for field in SVIN_FIELDS if field in data}
+    host = data.get("host")
+    if host is not None:
+        item["host"] = {key: value for key, value in host.items() if value is not None}
+    return item
+
+
+def compact_base_data(data):
+    item = {field: data[field] for field in BASE_DATA_FIELDS if field in data}
+    stream = data.get("stream")
+    if stream is not None:
+        # Chỉ giữ tần số mỗi message và [vệ tinh, tín hiệu, epoch mất] mỗi hệ
+        item["station_id"] = stream["station_id"]
+        item["types"] = {msg_type: t["rate_hz"] for msg_type, t in stream["types"].items()}
+        item["constellations"] = {
+            name: [c["satellites"], c["signals"], c["missed_epochs"]]
+            for name, c in stream["constellations"].items()
+        }
+    rtcm3 = data.get("rtcm3")
+    if rtcm3 is not None:
+        item["rtcm3"] = {field: rtcm3[field] for field in RTCM3_FIELDS if field in rtcm3}
+    commands = data.get("commands")
+    if commands is not None:
+        item["commands"] = {field: commands[field] for field in COMMAND_FIELDS if field in commands}
+    latency = data.get("latency")
+    if latency is not None:
+        # [p50, p99] (ms) mỗi histogram, gồm cả correction_age
+        item["latency"] = {name: [h["p50_ms"], h["p99_ms"]] for name, h in latency.items()}
+    link = data.get("link")
+    if link is not None:
+        item["link"] = link
+    return item
+
+
+# event -> hàm rút gọn dữ liệu trước khi gửi
+PRUNERS = {
+    "svin_status": compact_svin,
+    "base_data": compact_base_data,
+}
+
+
+class TelemetryPublisher:
+    """
+    Gửi telemetry lên Socket.IO theo nhịp cố định thay vì mỗi message.
+
+    publish() gọi được từ mọi thread và chỉ ghi đè giá trị mới nhất của mỗi
+    event trong namespace. Một task asyncio trên event loop riêng, cứ
+    1/socketio.publish_hz giây gửi một packet "telemetry" cho mỗi namespace
+    gộp mọi event đã đổi kể từ lần trước, dữ liệu đã rút gọn qua PRUNERS:
+
+        {"svin_status": {...}, "base_data": {...}}
+
+    socketio.publish_hz=0 (mặc định) giữ cách cũ: mỗi event (svin_status,
+    base_data, ...) được emit ngay với tên và dữ liệu như trước; chỉ bật
+    khi phía nhận đã xử lý event "telemetry".
+    """
+
+    def __init__(self, sio):
+        self.sio = sio  # socketio.Client, có thể gán sau khi đã kết nối
+        self.rate_hz = DEFAULT_PUBLISH_HZ
+        self.latest = {}  # namespace -> {event: data}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.task = None
+        self.published = 0
+        self.coalesced = 0  # giá trị bị ghi đè trước khi kịp gửi
+        self.packets = 0
+        self.dropped = 0  # packet bỏ vì chưa kết nối namespace
+
+    @property
+    def enabled(self):
+        return self.rate_hz > 0
+
+    def load(self):
+        self.rate_hz = VariableManager.instance.getFloat("socketio.publish_hz", DEFAULT_PUBLISH_HZ)
+
+    def apply_settings(self, keys):
+        if "socketio.publish_hz" not in keys:
+            return
+        self.load()
+        if self.enabled:
+            self.start()
+
+    def start(self):
+        if self.thread is not None or not self.enabled:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="TelemetryPublisher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self._stop)
+        self.thread.join(2)
+        self.loop = None
+        self.thread = None
+
+    def _stop(self):
+        self.task.cancel()
+        self.task.add_done_callback(lambda _: self.loop.stop())
+
+    def _run(self):
+        loop = self.loop
+        asyncio.set_event_loop(loop)
+        self.task = loop.create_task(self._publish_loop())
+        loop.run_forever()
+        loop.close()
+
+    async def _publish_loop(self):
+        next_flush = time.monotonic()
+        while True:
+            if not self.enabled:
+                await asyncio.sleep(1.0)
+                continue
+            next_flush += 1.0 / self.rate_hz
+            delay = next_flush - time.monotonic()
+            if delay < 0:
+                # Chậm hơn một chu kỳ: không gửi dồn, tính lại từ bây giờ
+                next_flush = time.monotonic()
+                delay = 0
+            await asyncio.sleep(delay)
+            self.flush()
+
+    def publish(self, namespace, event, data):
+        """Ghi nhận giá trị mới nhất của event (gọi được từ mọi thread)"""
+        with self.lock:
+            events = self.latest.setdefault(namespace, {})
+            if event in events:
+                self.coalesced += 1
+            events[event] = data
+            self.published += 1
+
+    def flush(self):
+        with self.lock:
+            latest = self.latest
+            self.latest = {}
+        sio = self.sio
+        for namespace, events in latest.items():
+            if sio is None or not sio.connected or namespace not in sio.namespaces:
+                self.dropped += 1
+                continue
+            packet = {}
+            for event, data in events.items():
+                pruner = PRUNERS.get(event)
+                packet[event] = pruner(data) if pruner is not None else data
+            try:
+                sio.emit(TELEMETRY_EVENT, packet, namespace=namespace)
+                self.packets += 1
+            except Exception as e:
+                print(f"[TELEMETRY] emit failed: {e}")
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "packets": self.packets,
+            "dropped": self.dropped,
+        }
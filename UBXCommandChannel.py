@@ -0,0 +1,202 @@
+from collections import deque
+from concurrent.futures import Future
+import time
+
+from PySide6.QtCore import QObject, QTimer, Signal as pyqtSignal
+
+from UBXProtocol import UBX_CLASS_CFG
+
+UBX_CLASS_ACK = 0x05
+UBX_ID_ACK_ACK = 0x01
+UBX_ID_ACK_NAK = 0x00
+
+
+class UBXCommand:
+    __slots__ = (
+        "frame", "msg_class", "msg_id", "label", "future", "attempts", "deadline", "sent_at",
+        "poll", "response", "seq", "first_sent", "acked_at",
+    )
+
+    def __init__(self, frame, label, poll=False, seq=0):
+        self.frame = bytes(frame)
+        self.msg_class = self.frame[2]
+        self.msg_id = self.frame[3]
+        self.label = label
+        self.poll = poll
+        self.response = None
+        self.future = Future()
+        self.attempts = 0
+        self.deadline = 0.0
+        self.sent_at = 0.0
+        self.seq = seq  # thứ tự gọi send()
+        self.first_sent = 0.0
+        self.acked_at = 0.0
+
+    def result(self, ok):
+        # Lệnh poll: payload trả lời (None nếu thất bại); lệnh thường: True/False
+        if self.poll:
+            return self.response if ok else None
+        return ok
+
+
+class UBXCommandChannel(QObject):
+    """
+    Gửi lệnh UBX-CFG có theo dõi ACK.
+
+    Mỗi lệnh có một slot chờ; tối đa window lệnh được gửi liên tiếp mà không
+    chờ ACK (receiver xử lý và trả ACK theo đúng thứ tự nhận). ACK-ACK/NAK
+    được ghép với lệnh cũ nhất đang chờ có cùng class/id. Hết timeout thì gửi
+    lại từ lệnh cũ nhất theo đúng thứ tự ban đầu (go-back-N), quá retries lần
+    thì lệnh thất bại.
+
+    ACK không mang số thứ tự: nếu một lệnh bị mất, ACK của lệnh sau được ghép
+    cho nó. Vì vậy khi gửi lại, các lệnh đã được ACK trong lúc lệnh bị timeout
+    còn chờ cũng được gửi lại trước nó (VALSET ghi lại cùng giá trị là vô hại,
+    chỉ thứ tự là quan trọng).
+
+    send() trả về concurrent.futures.Future (True = ACK, False = NAK/hết lần
+    thử) và phát command_done; không bao giờ chặn thread gọi. Lệnh không thuộc
+    class CFG được ghi thẳng và coi như thành công.
+
+    Lệnh poll (poll=True, ví dụ CFG-VALGET) nhận message trả lời cùng
+    class/id trước ACK; Future của nó nhận payload trả lời, None nếu thất bại.
+    """
+
+    command_done = pyqtSignal(str, bool)
+
+    def __init__(self, write, window=4, timeout=1.0, retries=2, parent=None):
+        super().__init__(parent)
+        self.write = write
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self.queue = deque()  # lệnh chưa gửi
+        self.in_flight = deque()  # lệnh đã gửi, chờ ACK (theo thứ tự gửi)
+        self.recent = deque(maxlen=window)  # lệnh ACK gần nhất, có thể bị ghép nhầm
+        self.sequence = 0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check_timeouts)
+
+        self.acked = 0
+        self.nacked = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.last_rtt = None
+
+    @property
+    def pending(self):
+        return bool(self.in_flight or self.queue)
+
+    def send(self, frame, label=None, poll=False):
+        command = UBXCommand(frame, label, poll, self.sequence)
+        self.sequence += 1
+        if command.msg_class != UBX_CLASS_CFG:
+            self.write(command.frame)
+            command.future.set_result(True)
+            return command.future
+        self.queue.append(command)
+        self._pump()
+        return command.future
+
+    def _pump(self):
+        while self.queue and len(self.in_flight) < self.window:
+            self._transmit(self.queue.popleft())
+        if self.in_flight and not self.timer.isActive():
+            self.timer.start(max(10, int(self.timeout * 250)))
+
+    def _transmit(self, command):
+        command.attempts += 1
+        command.response = None
+        command.sent_at = time.monotonic()
+        if command.attempts == 1:
+            command.first_sent = command.sent_at
+        command.deadline = command.sent_at + self.timeout
+        self.in_flight.append(command)
+        self.write(command.frame)
+
+    def on_ubx(self, msg_class, msg_id, payload):
+        """Đưa message UBX đã giải mã vào; trả về True nếu là ACK/trả lời của lệnh đang chờ"""
+        if msg_class == UBX_CLASS_CFG:
+            for command in self.in_flight:
+                if command.poll and command.response is None and command.msg_id == msg_id:
+                    command.response = bytes(payload)
+                    return True
+            return False
+        if msg_class != UBX_CLASS_ACK or len(payload) < 2:
+            return False
+        for command in self.in_flight:
+            if command.msg_class == payload[0] and command.msg_id == payload[1]:
+                self.in_flight.remove(command)
+                ok = msg_id == UBX_ID_ACK_ACK
+                command.acked_at = time.monotonic()
+                self.recent.append(command)
+                if command.future.done():
+                    # Lệnh gửi lại khi go-back-N, kết quả đã có từ trước
+                    self._pump()
+                    return True
+                if ok:
+                    self.acked += 1
+                    self.last_rtt = time.monotonic() - command.sent_at
+                else:
+                    self.nacked += 1
+                self._finish(command, ok, "NAK")
+                self._pump()
+                return True
+        return False
+
+    def check_timeouts(self):
+        in_flight = self.in_flight
+        # Lệnh luôn được gửi (lại) theo thứ tự nên lệnh đầu hết hạn trước
+        if in_flight and time.monotonic() >= in_flight[0].deadline:
+            head = in_flight[0]
+            self.timeouts += 1
+            # ACK ghép cho các lệnh trước head trong lúc head chờ có thể là ACK của
+            # lệnh sau: gửi lại cả các lệnh đó, theo thứ tự send()
+            commands = [
+                command
+                for command in self.recent
+                if command.seq < head.seq and command.acked_at >= head.first_sent
+            ]
+            commands += in_flight
+            in_flight.clear()
+            self.recent.clear()
+            if head.attempts <= self.retries:
+                print(f"[UBX] no ACK for {head.label or 'command'}, retry {head.attempts}")
+            else:
+                commands.remove(head)
+                self._finish(head, False, "timeout")
+            for command in commands:
+                self._transmit(command)
+        self._pump()
+        if not in_flight:
+            self.timer.stop()
+
+    def _finish(self, command, ok, reason=None):
+        if not ok:
+            self.failed += 1
+            print(f"[UBX] {command.label or 'command'} failed ({reason})")
+        if not command.future.done():
+            command.future.set_result(command.result(ok))
+        self.command_done.emit(command.label or "", ok)
+
+    def reset(self):
+        """Hủy mọi lệnh đang chờ (ví dụ khi mất kết nối), future nhận False (poll: None)"""
+        commands = list(self.in_flight) + list(self.queue)
+        self.in_flight.clear()
+        self.queue.clear()
+        self.recent.clear()
+        self.timer.stop()
+        for command in commands:
+            if not command.future.done():
+                command.future.set_result(command.result(False))
+
+    def stats(self):
+        return {
+            "acked": self.acked,
+            "nacked": self.nacked,
+            "timeouts": self.timeouts,
+            "failed": self.failed,
+            "in_flight": len(self.in_flight),
+            "queued": len(self.queue),
+            "last_rtt_ms": None if self.last_rtt is None else round(self.last_rtt * 1000, 1),
+        }
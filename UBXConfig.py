@@ -0,0 +1,325 @@
+import struct
+
+import UBXProtocol
+from UBXProtocol import (
+    LAYER_BBR,
+    LAYER_FLASH,
+    LAYER_RAM,
+    TRANSACTION_APPLY,
+    TRANSACTION_BEGIN,
+    TRANSACTION_CONTINUE,
+    TRANSACTION_NONE,
+    VALGET_LAYER_RAM,
+)
+
+# Giới hạn số key trong một CFG-VALSET / CFG-VALGET
+MAX_KEYS_PER_FRAME = 64
+
+# Kích thước value (byte) theo bit 28..30 của key ID
+KEY_SIZE = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8}
+
+# Kiểu dữ liệu theo tài liệu u-blox -> định dạng struct
+TYPE_FORMAT = {
+    "L": "<B",
+    "U1": "<B",
+    "I1": "<b",
+    "E1": "<B",
+    "X1": "<B",
+    "U2": "<H",
+    "I2": "<h",
+    "E2": "<H",
+    "X2": "<H",
+    "U4": "<I",
+    "I4": "<i",
+    "E4": "<I",
+    "X4": "<I",
+    "R4": "<f",
+    "U8": "<Q",
+    "I8": "<q",
+    "X8": "<Q",
+    "R8": "<d",
+}
+
+# Giá trị enum hay dùng
+TMODE_DISABLED = 0
+TMODE_SURVEY_IN = 1
+TMODE_FIXED = 2
+TMODE_POS_ECEF = 0
+TMODE_POS_LLH = 1
+
+
+class ConfigKey:
+    """
+    Một key cấu hình CFG-VAL*: ID, kiểu và hệ số tỉ lệ.
+
+    scale là giá trị một LSB theo đơn vị của unit, ví dụ CFG-TMODE-FIXED_POS_ACC
+    có LSB 0.1 mm nên scale=0.1, unit="mm": encode(12) ghi raw 120.
+    """
+
+    __slots__ = ("name", "key_id", "type", "scale", "unit", "format", "id_bytes")
+
+    def __init__(self, name, key_id, type_, scale=1, unit=""):
+        self.name = name
+        self.key_id = key_id
+        self.type = type_
+        self.scale = scale
+        self.unit = unit
+        self.format = struct.Struct(TYPE_FORMAT[type_])
+        self.id_bytes = struct.pack("<I", key_id)
+        if self.format.size != KEY_SIZE.get((key_id >> 28) & 0x07):
+            raise ValueError(f"{name}: type {type_} does not match size of key 0x{key_id:08x}")
+
+    @property
+    def size(self):
+        return self.format.size
+
+    def encode(self, value):
+        if self.type[0] == "R":
+            return self.format.pack(value / self.scale)
+        if self.scale != 1:
+            value = round(value / self.scale)
+        return self.format.pack(int(value))
+
+    def decode(self, data):
+        raw = self.format.unpack(data)[0]
+        return raw * self.scale if self.scale != 1 else raw
+
+    def __repr__(self):
+        return f"ConfigKey({self.name}, 0x{self.key_id:08x}, {self.type})"
+
+
+KEYS = {}  # tên -> ConfigKey
+BY_ID = {}  # key ID -> ConfigKey
+
+
+def register(name, key_id, type_, scale=1, unit=""):
+    key = ConfigKey(name, key_id, type_, scale, unit)
+    KEYS[name] = key
+    BY_ID[key_id] = key
+    return key
+
+
+def get_key(key):
+    """Nhận tên, key ID hoặc ConfigKey, trả về ConfigKey đã đăng ký"""
+    if isinstance(key, ConfigKey):
+        return key
+    if isinstance(key, int):
+        return BY_ID[key]
+    return KEYS[key]
+
+
+# ----------------------------------------------------------------------
+# Bảng key dùng chung cho mọi BaseController
+# ----------------------------------------------------------------------
+# Time mode (base station)
+register("CFG-TMODE-MODE", 0x20030001, "E1")
+register("CFG-TMODE-POS_TYPE", 0x20030002, "E1")
+register("CFG-TMODE-ECEF_X", 0x40030003, "I4", unit="cm")
+register("CFG-TMODE-ECEF_Y", 0x40030004, "I4", unit="cm")
+register("CFG-TMODE-ECEF_Z", 0x40030005, "I4", unit="cm")
+register("CFG-TMODE-ECEF_X_HP", 0x20030006, "I1", scale=0.1, unit="mm")
+register("CFG-TMODE-ECEF_Y_HP", 0x20030007, "I1", scale=0.1, unit="mm")
+register("CFG-TMODE-ECEF_Z_HP", 0x20030008, "I1", scale=0.1, unit="mm")
+register("CFG-TMODE-FIXED_POS_ACC", 0x4003000F, "U4", scale=0.1, unit="mm")
+register("CFG-TMODE-SVIN_MIN_DUR", 0x40030010, "U4", unit="s")
+register("CFG-TMODE-SVIN_ACC_LIMIT", 0x40030011, "U4", scale=0.1, unit="mm")
+
+# Tần số đo
+register("CFG-RATE-MEAS", 0x30210001, "U2", unit="ms")
+
+# Tần suất xuất message trên USB (số epoch giữa hai lần xuất, 0 = tắt)
+register("CFG-MSGOUT-UBX_NAV_HPPOSECEF_USB", 0x20910031, "U1")
+register("CFG-MSGOUT-UBX_NAV2_SVIN_USB", 0x20910523, "U1")
+register("CFG-MSGOUT-RTCM_3X_TYPE1005_USB", 0x209102C0, "U1")
+register("CFG-MSGOUT-RTCM_3X_TYPE1074_USB", 0x20910361, "U1")
+register("CFG-MSGOUT-RTCM_3X_TYPE1084_USB", 0x20910366, "U1")
+register("CFG-MSGOUT-RTCM_3X_TYPE1124_USB", 0x20910370, "U1")
+register("CFG-MSGOUT-RTCM_3X_TYPE1230_USB", 0x20910306, "U1")
+register("CFG-MSGOUT-NMEA_ID_GBS_USB", 0x209100E0, "U1")
+register("CFG-MSGOUT-NMEA_ID_GGA_USB", 0x209100BD, "U1")
+register("CFG-MSGOUT-NMEA_ID_GLL_USB", 0x209100CC, "U1")
+register("CFG-MSGOUT-NMEA_ID_GNS_USB", 0x209100B8, "U1")
+register("CFG-MSGOUT-NMEA_ID_GSA_USB", 0x209100C2, "U1")
+register("CFG-MSGOUT-NMEA_ID_GST_USB", 0x209100D6, "U1")
+register("CFG-MSGOUT-NMEA_ID_GSV_USB", 0x209100C7, "U1")
+register("CFG-MSGOUT-NMEA_ID_RMC_USB", 0x209100AE, "U1")
+register("CFG-MSGOUT-NMEA_ID_VTG_USB", 0x209100B3, "U1")
+
+RTCM_OUTPUT_KEYS = tuple(name for name in KEYS if name.startswith("CFG-MSGOUT-RTCM_3X_"))
+NMEA_OUTPUT_KEYS = tuple(name for name in KEYS if name.startswith("CFG-MSGOUT-NMEA_"))
+
+
+class ConfigTransaction:
+    """
+    Gom nhiều thay đổi cấu hình rồi đóng gói thành ít khung CFG-VALSET nhất.
+
+    set() ghi giá trị cho từng layer; giá trị đặt sau cùng được giữ. Khi
+    đóng gói, các layer cùng giá trị của một key được gộp thành một bitmask
+    (ví dụ RAM | FLASH), các key cùng bitmask chung một khung, tối đa
+    MAX_KEYS_PER_FRAME key mỗi khung. Nhóm nào cần nhiều khung thì dùng cờ
+    transaction (begin / continue / apply) để receiver áp dụng cả nhóm một
+    lần; nhóm vừa một khung thì gửi không cần transaction.
+    """
+
+    def __init__(self):
+        self.values = {}  # ConfigKey -> {layer bit: value}, theo thứ tự đặt
+
+    def set(self, key, value, layers=LAYER_RAM):
+        key = get_key(key)
+        per_layer = self.values.setdefault(key, {})
+        for layer in (LAYER_RAM, LAYER_BBR, LAYER_FLASH):
+            if layers & layer:
+                per_layer[layer] = value
+        return self
+
+    def update(self, values, layers=LAYER_RAM):
+        """Đặt nhiều key một lúc từ dict tên -> giá trị"""
+        for key, value in values.items():
+            self.set(key, value, layers)
+        return self
+
+    def __len__(self):
+        return len(self.values)
+
+    def keys(self):
+        return list(self.values)
+
+    def select(self, predicate):
+        """Transaction mới chỉ gồm các key mà predicate(ConfigKey) đúng"""
+        tx = ConfigTransaction()
+        for key, per_layer in self.values.items():
+            if predicate(key):
+                tx.values[key] = dict(per_layer)
+        return tx
+
+    def changed(self, current, layer=LAYER_RAM):
+        """
+        Transaction mới chỉ gồm các key có giá trị ở layer khác với current
+        (dict key ID -> raw bytes, ví dụ từ decode_valget). So sánh trên
+        bytes đã mã hóa nên không lệch vì làm tròn scale.
+        """
+        return self.select(
+            lambda key: layer in self.values[key]
+            and key.encode(self.values[key][layer]) != current.get(key.key_id)
+        )
+
+    def groups(self):
+        """Trả về dict bitmask layer -> list (key_bytes, value_bytes)"""
+        groups = {}
+        for key, per_layer in self.values.items():
+            masks = {}
+            for layer, value in per_layer.items():
+                encoded = key.encode(value)
+                masks[encoded] = masks.get(encoded, 0) | layer
+            for encoded, mask in masks.items():
+                groups.setdefault(mask, []).append((key.id_bytes, encoded))
+        return groups
+
+    def frames(self):
+        """Danh sách khung CFG-VALSET cần gửi, theo thứ tự"""
+        frames = []
+        for mask, items in self.groups().items():
+            chunks = [
+                tuple(items[i : i + MAX_KEYS_PER_FRAME])
+                for i in range(0, len(items), MAX_KEYS_PER_FRAME)
+            ]
+            if len(chunks) == 1:
+                frames.append(UBXProtocol.build_cfg_valset(chunks[0], mask))
+                continue
+            last = len(chunks) - 1
+            for index, chunk in enumerate(chunks):
+                if index == 0:
+                    transaction = TRANSACTION_BEGIN
+                elif index == last:
+                    transaction = TRANSACTION_APPLY
+                else:
+                    transaction = TRANSACTION_CONTINUE
+                frames.append(UBXProtocol.build_cfg_valset(chunk, mask, transaction))
+        return frames
+
+
+def valget_frames(keys, layer=VALGET_LAYER_RAM):
+    """Các khung CFG-VALGET để đọc keys, tối đa MAX_KEYS_PER_FRAME key mỗi khung"""
+    ids = [get_key(key).id_bytes for key in keys]
+    return [
+        UBXProtocol.build_cfg_valget(tuple(ids[i : i + MAX_KEYS_PER_FRAME]), layer)
+        for i in range(0, len(ids), MAX_KEYS_PER_FRAME)
+    ]
+
+
+def split_items(payload, pos=4):
+    """
+    Tách chuỗi key/value sau header; trả về list (key ID, raw bytes) hoặc
+    None nếu sai. Key chưa đăng ký vẫn tách được nhờ kích thước mã trong key ID.
+    """
+    items = []
+    while pos < len(payload):
+        if pos + 4 > len(payload):
+            return None
+        key_id = struct.unpack_from("<I", payload, pos)[0]
+        size = KEY_SIZE.get((key_id >> 28) & 0x07)
+        if size is None or pos + 4 + size > len(payload):
+            return None
+        items.append((key_id, bytes(payload[pos + 4 : pos + 4 + size])))
+        pos += 4 + size
+    return items
+
+
+def decode_valset(payload):
+    """Giải mã payload CFG-VALSET: (layer, transaction, items) hoặc None nếu sai"""
+    if len(payload) < 4 or payload[0] not in (0, 1):
+        return None
+    items = split_items(payload)
+    if items is None:
+        return None
+    transaction = payload[2] & 0x03 if payload[0] == 1 else TRANSACTION_NONE
+    return payload[1], transaction, items
+
+
+def decode_valget(payload):
+    """Giải mã payload trả lời CFG-VALGET thành dict key ID -> raw bytes (None nếu sai)"""
+    if not payload or len(payload) < 4 or payload[0] != 0x01:
+        return None
+    items = split_items(payload)
+    return None if items is None else dict(items)
+
+
+def decode_values(raw):
+    """dict key ID -> raw bytes thành dict tên -> giá trị (chỉ key đã đăng ký)"""
+    return {
+        BY_ID[key_id].name: BY_ID[key_id].decode(value)
+        for key_id, value in raw.items()
+        if key_id in BY_ID
+    }
+
+
+if __name__ == "__main__":
+    # Cấu hình đầy đủ lúc khởi động: RTCM bật, NMEA tắt, rate, fixed mode
+    tx = ConfigTransaction()
+    for name in RTCM_OUTPUT_KEYS:
+        tx.set(name, 1, LAYER_RAM | LAYER_FLASH)
+    for name in NMEA_OUTPUT_KEYS:
+        tx.set(name, 0, LAYER_RAM | LAYER_FLASH)
+    tx.set("CFG-RATE-MEAS", 1000, LAYER_RAM | LAYER_FLASH)
+    tx.update(
+        {
+            "CFG-TMODE-MODE": TMODE_FIXED,
+            "CFG-TMODE-POS_TYPE": TMODE_POS_ECEF,
+            "CFG-TMODE-ECEF_X": -191916128,
+            "CFG-TMODE-ECEF_Y": 582136888,
+            "CFG-TMODE-ECEF_Z": 175738897,
+            "CFG-TMODE-FIXED_POS_ACC": 120,
+        },
+        LAYER_RAM,
+    )
+    frames = tx.frames()
+    print(f"{len(tx)} keys -> {len(frames)} frames, {sum(len(f) for f in frames)} bytes")
+
+    # Nhiều key hơn giới hạn một khung: chia khung, dùng cờ transaction
+    tx = ConfigTransaction()
+    for index in range(150):
+        key = ConfigKey(f"MSGOUT_{index}", 0x20910000 + index, "U1")
+        tx.set(key, 0, LAYER_RAM | LAYER_FLASH)
+    for frame in tx.frames():
+        layer, transaction, items = decode_valset(frame[6:-2])
+        print(f"layer=0x{layer:02x} transaction={transaction} keys={len(items)}")
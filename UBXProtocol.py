@@ -0,0 +1,190 @@
+from functools import lru_cache
+from itertools import accumulate
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+UBX_SYNC = b"\xB5\x62"
+UBX_HEADER_LEN = 6
+UBX_CHECKSUM_LEN = 2
+UBX_MAX_PAYLOAD = 8192
+
+UBX_CLASS_CFG = 0x06
+UBX_ID_CFG_VALSET = 0x8A
+UBX_ID_CFG_VALGET = 0x8B
+
+LAYER_RAM = 0x01
+LAYER_BBR = 0x02
+LAYER_FLASH = 0x04
+
+# Trường transaction của CFG-VALSET (version 1)
+TRANSACTION_NONE = 0
+TRANSACTION_BEGIN = 1
+TRANSACTION_CONTINUE = 2
+TRANSACTION_APPLY = 3
+
+# Trường layer của CFG-VALGET là số thứ tự, không phải bitmask
+VALGET_LAYER_RAM = 0
+VALGET_LAYER_BBR = 1
+VALGET_LAYER_FLASH = 2
+VALGET_LAYER_DEFAULT = 7
+
+# Dưới ngưỡng này chi phí gọi numpy lớn hơn phần tính toán
+_NUMPY_MIN_LEN = 256
+
+
+def ubx_checksum(data):
+    """
+    Fletcher-8 trên class, id, length và payload. Trả về (ck_a, ck_b)
+
+    ck_a là tổng các byte, ck_b là tổng các tổng tích lũy, nên cả hai được
+    tính trong C (sum/accumulate hoặc numpy) thay vì vòng lặp từng byte.
+    """
+    if np is not None and len(data) >= _NUMPY_MIN_LEN:
+        arr = np.frombuffer(data, dtype=np.uint8)
+        return int(arr.sum()) & 0xFF, int(np.cumsum(arr, dtype=np.uint32).sum()) & 0xFF
+    return sum(data) & 0xFF, sum(accumulate(data)) & 0xFF
+
+
+def build_ubx(msg_class, msg_id, payload=b""):
+    """Đóng gói một khung UBX hoàn chỉnh (sync, header, payload, checksum)"""
+    body = struct.pack("<BBH", msg_class, msg_id, len(payload)) + bytes(payload)
+    ck_a, ck_b = ubx_checksum(body)
+    return UBX_SYNC + body + bytes((ck_a, ck_b))
+
+
+@lru_cache(maxsize=256)
+def build_cfg_valset(keys_values, layer, transaction=TRANSACTION_NONE):
+    """
+    Tạo khung UBX-CFG-VALSET, kết quả được nhớ theo (keys_values, layer, transaction).
+
+    keys_values là tuple các cặp (key, value) dạng bytes little-endian;
+    layer là bitmask (RAM | BBR | FLASH) nên một khung ghi được nhiều layer.
+    """
+    payload = bytearray((0x01, layer, transaction, 0x00))  # version 1, layer, transaction, reserved
+    for key, value in keys_values:
+        payload += key
+        payload += value
+    return build_ubx(UBX_CLASS_CFG, UBX_ID_CFG_VALSET, payload)
+
+
+@lru_cache(maxsize=64)
+def build_cfg_valget(keys, layer=VALGET_LAYER_RAM, position=0):
+    """Tạo khung poll UBX-CFG-VALGET; keys là tuple key ID dạng bytes little-endian"""
+    payload = bytearray(struct.pack("<BBH", 0x00, layer, position))  # version 0, layer, position
+    for key in keys:
+        payload += key
+    return build_ubx(UBX_CLASS_CFG, UBX_ID_CFG_VALGET, payload)
+
+
+# Các lệnh cố định, dựng sẵn một lần
+KEY_TMODE3_MODE = b"\x01\x00\x03\x20"  # 0x20030001
+CFG_VALSET_TMODE3_DISABLE = build_cfg_valset(
+    ((KEY_TMODE3_MODE, b"\x00"),), LAYER_RAM | LAYER_FLASH
+)
+
+
+class UBXStreamDecoder:
+    """
+    Bộ giải mã UBX dạng luồng, giữ buffer giữa các lần readyRead.
+
+    feed() duyệt buffer bằng con trỏ offset trên memoryview, trả về mọi khung
+    UBX hoàn chỉnh có trong dữ liệu và chỉ cắt buffer một lần ở cuối.
+    """
+
+    def __init__(self, max_payload=UBX_MAX_PAYLOAD):
+        self.buffer = bytearray()
+        self.max_payload = max_payload
+        self.messages = 0
+        self.checksum_errors = 0
+        self.discarded_bytes = 0
+
+    def reset(self):
+        self.buffer.clear()
+
+    def feed(self, data):
+        """Nạp dữ liệu mới, trả về list (msg_class, msg_id, payload)"""
+        messages = []
+        buffer = self.buffer
+        if data:
+            buffer.extend(data)
+        size = len(buffer)
+        pos = 0
+
+        with memoryview(buffer) as view:
+            while pos < size:
+                start = buffer.find(UBX_SYNC, pos)
+                if start == -1:
+                    # Giữ lại byte 0xB5 cuối cùng vì có thể là nửa đầu sync
+                    keep = 1 if buffer[size - 1] == 0xB5 else 0
+                    self.discarded_bytes += size - pos - keep
+                    pos = size - keep
+                    break
+                self.discarded_bytes += start - pos
+                pos = start
+
+                if size - pos < UBX_HEADER_LEN:
+                    break
+                length = buffer[pos + 4] | (buffer[pos + 5] << 8)
+                if length > self.max_payload:
+                    self.discarded_bytes += 1
+                    pos += 1
+                    continue
+                end = pos + UBX_HEADER_LEN + length + UBX_CHECKSUM_LEN
+                if end > size:
+                    break
+
+                ck_a, ck_b = ubx_checksum(view[pos + 2 : end - 2])
+                if ck_a != buffer[end - 2] or ck_b != buffer[end - 1]:
+                    self.checksum_errors += 1
+                    self.discarded_bytes += 1
+                    pos += 1
+                    continue
+
+                messages.append(
+                    (buffer[pos + 2], buffer[pos + 3], bytes(view[pos + 6 : end - 2]))
+                )
+                self.messages += 1
+                pos = end
+
+        if pos:
+            del buffer[:pos]
+        return messages
+
+    def stats(self):
+        return {
+            "messages": self.messages,
+            "checksum_errors": self.checksum_errors,
+            "discarded_bytes": self.discarded_bytes,
+            "buffered": len(self.buffer),
+        }
+
+
+if __name__ == "__main__":
+    import os
+    import timeit
+
+    def legacy_checksum(payload):
+        ck_a = 0
+        ck_b = 0
+        for byte in payload:
+            ck_a = (ck_a + byte) % 256
+            ck_b = (ck_b + ck_a) % 256
+        return [ck_a, ck_b]
+
+    payload = os.urandom(1024)
+    assert tuple(legacy_checksum(payload)) == ubx_checksum(payload)
+    assert tuple(legacy_checksum(payload)) == ubx_checksum(memoryview(payload))
+
+    number = 5000
+    for name, func in (
+        ("legacy", legacy_checksum),
+        ("ubx_checksum", ubx_checksum),
+        ("ubx_checksum(memoryview)", lambda p: ubx_checksum(memoryview(p))),
+    ):
+        t = timeit.timeit(lambda: func(payload), number=number) / number
+        print(f"{name:28s} {t * 1e6:8.2f} us / 1 KB message")
+    print(f"numpy: {'yes' if np is not None else 'no'}")
@@ -0,0 +1,287 @@
+import socket
+import struct
+import time
+import zlib
+
+from PySide6.QtCore import QTimer
+
+from FanoutConfig import StreamRoute
+from RTCM3Framer import is_epoch_end, is_msm, message_type, msm_epoch_ms
+import VariableManager
+
+# Header kiểu RTP (RFC 3550) trước payload RTCM3:
+# V=2|P|X|CC (1 byte), M|PT (1 byte), sequence (2), timestamp (4), SSRC (4)
+RTP_HEADER = struct.Struct(">BBHII")
+RTP_VERSION = 0x80
+RTP_MARKER = 0x80
+RTP_PAYLOAD_TYPE = 96  # payload type động
+
+DEFAULT_PORT = 8766
+# Vừa một khung Ethernet (1500 - IP - UDP - RTP) để không bị phân mảnh IP
+DEFAULT_MAX_DATAGRAM = 1400
+# Khung không thuộc epoch MSM nào (1005, 1230, ...) không bị giữ lâu hơn
+MAX_HOLD_SECONDS = 0.2
+MAX_HOLD_MS = int(MAX_HOLD_SECONDS * 1000)
+
+
+class UdpMode:
+    FRAME = "frame"  # mỗi khung RTCM3 một datagram
+    EPOCH = "epoch"  # gộp các khung của một epoch vào một datagram
+
+
+def parse_targets(items, default_port):
+    """["192.168.1.20", "192.168.1.21:9000"] -> [(host, port), ...]"""
+    targets = []
+    for item in items:
+        host, sep, port = item.rpartition(":")
+        if not sep:
+            host, port = item, default_port
+        targets.append((host, int(port)))
+    return targets
+
+
+def parse_datagram(data):
+    """Tách datagram: (sequence, timestamp, ssrc, marker, payload RTCM3)"""
+    _, marker_pt, seq, timestamp, ssrc = RTP_HEADER.unpack_from(data)
+    return seq, timestamp, ssrc, bool(marker_pt & RTP_MARKER), data[RTP_HEADER.size :]
+
+
+class SequenceTracker:
+    """Phía rover: đếm datagram bị mất / đến trễ theo sequence 16 bit"""
+
+    def __init__(self):
+        self.expected = None
+        self.received = 0
+        self.lost = 0
+        self.late = 0
+
+    def update(self, seq):
+        """Trả về số datagram bị mất ngay trước seq"""
+        self.received += 1
+        if self.expected is None:
+            self.expected = (seq + 1) & 0xFFFF
+            return 0
+        gap = (seq - self.expected) & 0xFFFF
+        if gap >= 0x8000:
+            # Datagram cũ hơn seq đã nhận (đảo thứ tự hoặc trùng)
+            self.late += 1
+            return 0
+        self.lost += gap
+        self.expected = (seq + 1) & 0xFFFF
+        return gap
+
+    def stats(self):
+        return {"received": self.received, "lost": self.lost, "late": self.late}
+
+
+class _UdpStream:
+    __slots__ = ("offset", "ssrc", "seq", "frames", "size", "since", "timestamp", "timer")
+
+    def __init__(self, offset, name):
+        self.offset = offset  # cổng đích = udp.port + offset
+        self.ssrc = zlib.crc32(str(name).encode())
+        self.seq = 0
+        self.frames = []
+        self.size = 0
+        self.since = 0.0
+        self.timestamp = 0  # epoch time MSM gần nhất (ms)
+        self.timer = None  # QTimer single-shot giới hạn thời gian giữ phần gộp
+
+
+class UdpRTCMOutput:
+    """
+    Phát RTCM3 qua UDP tới nhóm multicast (udp.group) và/hoặc danh sách
+    unicast (udp.targets): mỗi epoch một lần gửi cho mỗi đích, không phụ
+    thuộc số rover.
+
+    Mỗi datagram có header kiểu RTP: sequence tăng dần để rover phát hiện
+    mất gói (SequenceTracker), timestamp là epoch time MSM (ms), marker = 1
+    ở datagram cuối của epoch, SSRC = crc32 tên receiver. Với udp.mode=epoch
+    các khung được gộp tới hết epoch (MSM có multiple message bit = 0) nhưng
+    không vượt udp.max_datagram byte và không bị cắt đôi.
+
+    Receiver thứ i trong gps.receivers gửi tới cổng udp.port + i.
+    send_RTCM3() gọi thẳng từ thread đọc serial (DirectConnection); khung
+    đang gộp được gửi muộn nhất sau MAX_HOLD_SECONDS bằng một QTimer
+    single-shot của từng luồng, tạo trên chính thread đó và khởi động lại mỗi
+    khi bắt đầu gộp, kể cả khi luồng dừng ngay sau khung cuối.
+    """
+
+    def __init__(self):
+        self.sock = None
+        self.enabled = False
+        self.mode = UdpMode.EPOCH
+        self.max_datagram = DEFAULT_MAX_DATAGRAM
+        self.port = DEFAULT_PORT
+        self.group = ""
+        self.interface = "0.0.0.0"
+        self.ttl = 1
+        self.destinations = []  # (host, port) cho receiver đầu tiên
+        self.receivers = []
+        self.streams = {}  # tên receiver -> _UdpStream
+        self.datagrams = 0
+        self.bytes = 0
+        self.errors = 0
+        self.load()
+
+    def load(self):
+        settings = VariableManager.instance
+        self.enabled = settings.getBool("udp.enabled", False)
+        self.mode = settings.get("udp.mode", UdpMode.EPOCH)
+        self.max_datagram = int(settings.get("udp.max_datagram", DEFAULT_MAX_DATAGRAM))
+        self.port = int(settings.get("udp.port", DEFAULT_PORT))
+        self.group = settings.get("udp.group", "")
+        self.interface = settings.get("udp.interface", "0.0.0.0")
+        self.ttl = int(settings.get("udp.ttl", 1))
+        destinations = parse_targets(settings.getList("udp.targets"), self.port)
+        if self.group:
+            destinations.insert(0, (self.group, self.port))
+        self.destinations = destinations
+        self.receivers = VariableManager.receivers()
+        # Giữ sequence/timestamp của các luồng đang chạy, chỉ cập nhật cổng đích
+        for name, state in list(self.streams.items()):
+            state.offset = self.receivers.index(name) if name in self.receivers else 0
+
+    def start(self):
+        if not self.enabled or self.sock is not None:
+            return
+        if not self.destinations:
+            print("[UDP] no udp.group or udp.targets configured")
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        if self.group:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        self.sock = sock
+        print(f"[UDP STARTED] {self.mode} -> {', '.join(f'{h}:{p}' for h, p in self.destinations)}")
+
+    def stop(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def apply_settings(self, keys):
+        """Nạp lại udp.* (gọi được từ mọi thread)"""
+        if not any(key.startswith("udp.") for key in keys):
+            return
+        sock = self.sock
+        self.sock = None
+        if sock is not None:
+            sock.close()
+        self.load()
+        self.start()
+
+    def stream(self, name):
+        """Đầu vào cho receiver name, dùng làm đích của rtcm3_signal"""
+        return StreamRoute(self, name)
+
+    def _stream(self, name):
+        if name is None:
+            name = self.receivers[0]
+        state = self.streams.get(name)
+        if state is None:
+            offset = self.receivers.index(name) if name in self.receivers else 0
+            state = self.streams[name] = _UdpStream(offset, name)
+        return state
+
+    def send_RTCM3(self, data: bytes, stream=None):
+        if self.sock is None:
+            return
+        state = self._stream(stream)
+        end = is_epoch_end(data)
+        if is_msm(message_type(data)):
+            state.timestamp = msm_epoch_ms(data)
+        if self.mode == UdpMode.FRAME:
+            self._send(state, (data,), end)
+            return
+
+        now = time.monotonic()
+        if state.frames and state.size + len(data) > self.max_datagram:
+            # Epoch lớn hơn một datagram: gửi phần trước, marker chỉ ở phần cuối
+            self._flush(state, False)
+        if not state.frames:
+            state.since = now
+            if state.timer is None:
+                state.timer = self._hold_timer(state)
+            state.timer.start()
+        state.frames.append(data)
+        state.size += len(data)
+        if end or now - state.since > MAX_HOLD_SECONDS:
+            self._flush(state, end)
+
+    def _flush(self, state, marker):
+        self._send(state, state.frames, marker)
+        state.frames = []
+        state.size = 0
+        if state.timer is not None:
+            state.timer.stop()
+
+    def _hold_timer(self, state):
+        """Timer của luồng state, sống trên thread gọi send_RTCM3()"""
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.setInterval(MAX_HOLD_MS)
+        timer.timeout.connect(lambda: self._expire(state))
+        return timer
+
+    def _expire(self, state):
+        """Timer hết MAX_HOLD_SECONDS: gửi các khung (1005, 1230, ...) còn giữ"""
+        if state.frames and self.sock is not None:
+            self._flush(state, False)
+
+    def _send(self, state, frames, marker):
+        header = RTP_HEADER.pack(
+            RTP_VERSION,
+            (RTP_MARKER if marker else 0) | RTP_PAYLOAD_TYPE,
+            state.seq,
+            state.timestamp & 0xFFFFFFFF,
+            state.ssrc,
+        )
+        datagram = header + b"".join(frames)
+        state.seq = (state.seq + 1) & 0xFFFF
+        sock = self.sock
+        if sock is None:
+            return
+        for host, port in self.destinations:
+            try:
+                sock.sendto(datagram, (host, port + state.offset))
+            except OSError:
+                # Buffer gửi đầy / mạng chưa sẵn sàng: bỏ datagram, rover thấy qua sequence
+                self.errors += 1
+                continue
+            self.datagrams += 1
+            self.bytes += len(datagram)
+
+    def stats(self):
+        return {
+            "datagrams": self.datagrams,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "streams": {name: state.seq for name, state in self.streams.items()},
+        }
+
+
+if __name__ == "__main__":
+    # Nghe một nhóm multicast / cổng UDP và báo mất gói:
+    #   python UdpOutput.py 239.255.42.1 8766
+    import sys
+
+    group = sys.argv[1] if len(sys.argv) > 1 else "239.255.42.1"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("", port))
+    if socket.inet_aton(group)[0] >= 224:
+        membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton("0.0.0.0"))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    trackers = {}
+    while True:
+        data = sock.recv(65536)
+        seq, timestamp, ssrc, marker, payload = parse_datagram(data)
+        tracker = trackers.setdefault(ssrc, SequenceTracker())
+        lost = tracker.update(seq)
+        print(
+            f"ssrc={ssrc:08x} seq={seq} t={timestamp} {'M' if marker else ' '} "
+            f"{len(payload)} B{f' LOST {lost}' if lost else ''}"
+        )
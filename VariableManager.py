@@ -1,8 +1,80 @@
-from PySide6.QtCore import QObject, QMutex, QMutexLocker, QSettings
+from PySide6.QtCore import QObject, QMutex, QMutexLocker, QSettings, QFileSystemWatcher, Signal as pyqtSignal
 from typing import Any
+import os
+import threading
+
+# Gom các lần save() liên tiếp thành một lần ghi file
+SAVE_DELAY = 0.5
+
+_INVALID = object()  # giá trị không đổi được sang kiểu cần
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return _INVALID
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _INVALID
+
+
+def _to_bool(value):
+    if value == "false" or value == False:
+        return False
+    elif value == "true" or value == True:
+        return True
+    return _INVALID
+
+
+def _to_list(value):
+    # QSettings tự tách giá trị có dấu phẩy thành list
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value]
+    return [item.strip() for item in str(value).split(",") if item.strip()]
+
+
+class Snapshot:
+    """
+    Một phiên bản cấu hình: giá trị thô (values) và giá trị đã đổi kiểu
+    sẵn cho getInt/getFloat/getBool/getList. Chỉ dựng khi load/set/reload,
+    không bao giờ sửa tại chỗ nên đọc không cần khóa.
+    """
+
+    __slots__ = ("values", "ints", "floats", "bools", "lists")
+
+    def __init__(self, values):
+        self.values = values
+        self.ints = {name: _to_int(value) for name, value in values.items()}
+        self.floats = {name: _to_float(value) for name, value in values.items()}
+        self.bools = {name: _to_bool(value) for name, value in values.items()}
+        self.lists = {name: _to_list(value) for name, value in values.items()}
+
 
 class VariableManager(QObject):
+    """
+    Cấu hình lưu trong bộ nhớ.
+
+    File ini chỉ được đọc một lần khi load() (và khi file bị sửa từ bên ngoài);
+    get() đọc từ Snapshot không bao giờ bị sửa tại chỗ (set() thay bằng
+    Snapshot mới) nên không cần khóa. Giá trị được đổi kiểu một lần khi dựng
+    Snapshot, getInt()/getFloat()/getBool()/getList() chỉ tra dict. save()
+    chỉ lên lịch ghi nền: các key đã đổi được ghi vào file tạm rồi
+    os.replace() để file không bao giờ ghi dở.
+
+    watch() theo dõi file bằng QFileSystemWatcher (inotify trên Linux); khi
+    file bị sửa bên ngoài, snapshot được nạp lại và signal changed phát ra
+    danh sách key có giá trị mới.
+    """
+
     _instance = None
+    changed = pyqtSignal(list)
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
@@ -11,56 +83,244 @@ class VariableManager(QObject):
 
     def __init__(self):
         super().__init__()
-        self.mutex = QMutex()
+        self.mutex = QMutex()  # chỉ dùng cho ghi
         self.file_path = None
-        self.cache = {}  # Biến tạm để lưu trữ các giá trị được set
+        self.snapshot = Snapshot({})  # thay thế nguyên khối
+        self.dirty = set()  # key đã set() nhưng chưa ghi xuống file
+        self.save_timer = None
+        self.watcher = None
+        self.file_stat = None  # stat của file sau lần đọc/ghi gần nhất
+
+    @property
+    def values(self):
+        return self.snapshot.values
 
     def load(self, file_path):
         self.file_path = file_path
+        with QMutexLocker(self.mutex):
+            self.snapshot = Snapshot(self._read_file())
+            self.dirty.clear()
+            self.file_stat = self._stat()
+
+    def _read_file(self):
+        settings = QSettings(self.file_path, QSettings.Format.NativeFormat)
+        values = {name: settings.value(name) for name in settings.allKeys()}
+        del settings  # Đóng file sau khi tải xong
+        return values
+
+    def _stat(self):
+        try:
+            st = os.stat(self.file_path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
 
     def set(self, name: str, value: Any):
         if self.file_path is None:
             return
 
         with QMutexLocker(self.mutex):
-            self.cache[name] = value  # Lưu giá trị vào biến tạm
+            values = dict(self.values)
+            values[name] = value
+            self.snapshot = Snapshot(values)
+            self.dirty.add(name)
 
     def get(self, name: str, default_value=None):
         if self.file_path is None:
             return default_value
+        return self.values.get(name, default_value)
 
-        with QMutexLocker(self.mutex):
-            # Trước tiên, kiểm tra trong cache
-            if name in self.cache:
-                return self.cache[name]
-            
-            # Nếu không có trong cache, lấy từ file
-            settings = QSettings(self.file_path, QSettings.Format.NativeFormat)
-            value = settings.value(name, default_value)
-            del settings  # Đóng file sau khi tải xong
-            return value
+    def _fallback(self, convert, name, default_value):
+        if self.file_path is None or name not in self.values:
+            # Key không có: như trước đây, đổi kiểu giá trị mặc định
+            value = convert(default_value)
+            return default_value if value is _INVALID else value
+        return default_value
+
+    def getInt(self, name: str, default_value=None):
+        value = self.snapshot.ints.get(name, _INVALID)
+        if value is _INVALID:
+            return self._fallback(_to_int, name, default_value)
+        return value
+
+    def getFloat(self, name: str, default_value=None):
+        value = self.snapshot.floats.get(name, _INVALID)
+        if value is _INVALID:
+            return self._fallback(_to_float, name, default_value)
+        return value
 
     def getBool(self, name: str, default_value=None):
-        value = self.get(name, default_value)
-        if value == "false" or value == False:
-            return False
-        elif value == "true" or value == True:
-            return True
-        return default_value
+        value = self.snapshot.bools.get(name, _INVALID)
+        if value is _INVALID:
+            return self._fallback(_to_bool, name, default_value)
+        return value
+
+    def getList(self, name: str, default_value=None):
+        if self.file_path is not None:
+            value = self.snapshot.lists.get(name)
+            if value is not None:
+                return value
+        return _to_list(default_value)
+
+    def section(self, name):
+        """Cấu hình của một section [name] trong file, thiếu key thì lấy [General]"""
+        return Section(self, name)
+
+    def local_keys(self, keys):
+        """Các key trong [General] thuộc danh sách keys (từ signal changed)"""
+        return [key for key in keys if "/" not in key]
 
     def save(self):
+        """Lên lịch ghi các key đã đổi (không chặn thread gọi)"""
+        if self.file_path is None:
+            return
+
+        with QMutexLocker(self.mutex):
+            if not self.dirty or self.save_timer is not None:
+                return
+            self.save_timer = threading.Timer(SAVE_DELAY, self.flush)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def flush(self):
+        """Ghi ngay các key đã đổi xuống file"""
         if self.file_path is None:
             return
 
         with QMutexLocker(self.mutex):
-            settings = QSettings(self.file_path, QSettings.Format.NativeFormat)
-            for name, value in self.cache.items():
+            if self.save_timer is not None:
+                self.save_timer.cancel()
+                self.save_timer = None
+            if not self.dirty:
+                return
+            # Đọc lại file để giữ các key bị sửa bên ngoài mà chưa kịp reload
+            values = self._read_file()
+            for name in self.dirty:
+                values[name] = self.values[name]
+
+            temp_path = f"{self.file_path}.tmp"
+            settings = QSettings(temp_path, QSettings.Format.NativeFormat)
+            settings.clear()
+            for name, value in values.items():
                 settings.setValue(name, value)
             settings.sync()  # Ghi tất cả các thay đổi vào file
-            del settings  # Đóng file sau khi lưu xong
+            ok = settings.status() == QSettings.Status.NoError
+            del settings
+            if not ok:
+                print(f"[CONFIG] failed to write {temp_path}")
+                return
+            os.replace(temp_path, self.file_path)
+            self.dirty.clear()
+            self.file_stat = self._stat()
+
+    # ------------------------------------------------------------------
+    # Nạp lại khi file bị sửa bên ngoài
+    # ------------------------------------------------------------------
+    def watch(self):
+        """Theo dõi file cấu hình; cần event loop Qt ở thread gọi hàm này"""
+        if self.file_path is None or self.watcher is not None:
+            return
+        self.watcher = QFileSystemWatcher(self)
+        # Theo dõi cả thư mục: os.replace() thay inode nên watcher của file bị mất
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        self.watcher.addPath(directory)
+        self.watcher.addPath(self.file_path)
+        self.watcher.fileChanged.connect(self.reload)
+        self.watcher.directoryChanged.connect(self.reload)
+
+    def reload(self, _path=None):
+        if self.watcher is not None and self.file_path not in self.watcher.files():
+            if os.path.exists(self.file_path):
+                self.watcher.addPath(self.file_path)
+
+        with QMutexLocker(self.mutex):
+            stat = self._stat()
+            if stat is None or stat == self.file_stat:
+                return
+            self.file_stat = stat
+            values = self._read_file()
+            for name in self.dirty:
+                # Giá trị chưa lưu của chương trình được ưu tiên
+                values[name] = self.values[name]
+            old = self.values
+            # So sánh dạng chuỗi: giá trị set() có thể là int, giá trị đọc từ file là str
+            changed = [name for name in values if str(old.get(name)) != str(values[name])]
+            changed += [name for name in old if name not in values]
+            self.snapshot = Snapshot(values)
+
+        if changed:
+            print(f"[CONFIG] reloaded {self.file_path}: {', '.join(sorted(changed))}")
+            self.changed.emit(changed)
+
+class Section:
+    """
+    Một section [name] của file cấu hình, ví dụ cho receiver thứ hai:
+
+        [SITE2]
+        gps.ecef_x=...
+
+    QSettings lưu key của section dạng "SITE2/gps.ecef_x". get() tìm key
+    trong section trước rồi mới tới [General], nên section chỉ cần ghi các
+    giá trị khác; set() luôn ghi vào section.
+    """
+
+    def __init__(self, manager, name):
+        self.manager = manager
+        self.name = name
+        self.prefix = f"{name}/"
+
+    @property
+    def file_path(self):
+        return self.manager.file_path
+
+    def _global(self, getter, name, default_value):
+        if self.prefix + name in self.manager.values:
+            return getter(self.prefix + name, default_value)
+        return getter(name, default_value)
+
+    def get(self, name: str, default_value=None):
+        return self._global(self.manager.get, name, default_value)
+
+    def getInt(self, name: str, default_value=None):
+        return self._global(self.manager.getInt, name, default_value)
+
+    def getFloat(self, name: str, default_value=None):
+        return self._global(self.manager.getFloat, name, default_value)
+
+    def getBool(self, name: str, default_value=None):
+        return self._global(self.manager.getBool, name, default_value)
+
+    def getList(self, name: str, default_value=None):
+        return self._global(self.manager.getList, name, default_value)
+
+    def set(self, name: str, value: Any):
+        self.manager.set(self.prefix + name, value)
+
+    def save(self):
+        self.manager.save()
+
+    def local_keys(self, keys):
+        """Key (bỏ tiền tố section) bị đổi trong section hoặc trong [General]"""
+        result = []
+        for key in keys:
+            if key.startswith(self.prefix):
+                result.append(key[len(self.prefix) :])
+            elif "/" not in key:
+                result.append(key)
+        return result
 
-            # Xóa cache sau khi lưu
-            self.cache.clear()
 
 # Create a global instance
 instance = VariableManager()
+
+
+def receivers():
+    """Tên các receiver (gps.receivers); receiver đầu tiên dùng [General]"""
+    return instance.getList("gps.receivers") or ["BASE"]
+
+
+def receiver_settings(name):
+    """Cấu hình của receiver name: instance cho receiver đầu tiên, Section cho các receiver khác"""
+    if name == receivers()[0]:
+        return instance
+    return instance.section(name)
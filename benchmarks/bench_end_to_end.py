@@ -0,0 +1,163 @@
+"""
+Benchmark đầu-cuối: ReceiverEmulator (pty) -> BaseController -> backend phát
+RTCM -> rover TCP giả lập.
+
+Tiến trình server chạy giống main.py (BaseController trên QThread riêng,
+rtcm3_signal nối tới backend) nhưng không có Socket.IO và quét cổng. Emulator
+chèn khung đánh dấu thời gian lúc ghi ra serial nên độ trễ đo được là
+serial -> socket của rover.
+
+    python benchmarks/bench_end_to_end.py --backend qt asyncio --clients 10 200 1000 --rate 10
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import common
+from ReceiverEmulator import ReceiverEmulator
+
+
+def serve(ini, port):
+    common.raise_nofile_limit()
+    from PySide6.QtCore import QCoreApplication, QThread, Qt
+
+    import VariableManager
+    from BaseStation import BaseController
+
+    app = QCoreApplication(sys.argv)
+    VariableManager.instance.load(ini)
+    backend = VariableManager.instance.get("tcp.backend", "qt")
+    if backend == "asyncio":
+        from AsyncFanout import AsyncFanoutServer
+
+        tcp_server = AsyncFanoutServer()
+    elif backend == "multiprocess":
+        from MultiProcessFanout import MultiProcessFanout
+
+        tcp_server = MultiProcessFanout()
+    else:
+        from BaseTCPServer import BaseTCPServer
+
+        tcp_server = BaseTCPServer()
+    tcp_server.start()
+
+    base_station = BaseController(port=port)
+    base_station_thread = QThread()
+    base_station.moveToThread(base_station_thread)
+    base_station_thread.started.connect(base_station.start)
+    base_station_thread.finished.connect(base_station.stop, Qt.ConnectionType.DirectConnection)
+    if backend == "qt":
+        base_station.rtcm3_signal.connect(tcp_server.send_RTCM3, Qt.ConnectionType.QueuedConnection)
+    else:
+        base_station.rtcm3_signal.connect(tcp_server.send_RTCM3, Qt.ConnectionType.DirectConnection)
+    base_station_thread.start()
+
+    def shutdown(*_):
+        tcp_server.stop()
+        base_station_thread.quit()
+        base_station_thread.wait(2000)
+        app.quit()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print("READY", flush=True)
+    app.exec()
+
+
+def run(backend, clients, args):
+    emulator = ReceiverEmulator(rate=args.rate, replay=args.replay, baudrate=args.baudrate)
+    emulator.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        ini = os.path.join(tmp, "bench.ini")
+        common.write_ini(
+            ini,
+            {
+                "gps.ecef_x": -191916128,
+                "gps.ecef_y": 582136888,
+                "gps.ecef_z": 175738897,
+                "gps.accuracy": 120,
+                "gps.rate": int(args.rate),
+                "tcp.host": "127.0.0.1",
+                "tcp.port": args.port,
+                "tcp.backend": backend,
+                "tcp.mode": "raw",
+                "tcp.workers": args.workers,
+            },
+        )
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", ini, "--serial", emulator.port],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            while True:
+                line = server.stdout.readline()
+                if not line:
+                    raise RuntimeError(f"{backend} server exited")
+                if line.startswith("READY"):
+                    break
+            # Đọc bỏ phần log còn lại: pipe đầy thì print() của server bị chặn
+            threading.Thread(target=server.stdout.read, daemon=True).start()
+            frames0 = emulator.frames_sent
+            t0 = time.monotonic()
+            result = common.run_rovers(
+                "127.0.0.1",
+                args.port,
+                clients,
+                args.duration,
+                server_pid=server.pid,
+                sample_every=args.sample_every,
+            )
+            result["frames_per_s"] = (emulator.frames_sent - frames0) / (time.monotonic() - t0)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            emulator.stop()
+    result["backend"] = backend
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", nargs="+", default=["qt"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[10, 200, 1000])
+    parser.add_argument("--rate", type=float, default=10.0, help="epoch/s của emulator")
+    parser.add_argument("--replay", help="phát lại file RTCM3 thay vì dữ liệu tổng hợp")
+    parser.add_argument("--baudrate", type=int, help="giới hạn tốc độ pty như UART thật")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=28766)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--sample-every", type=int, default=1, help="đo độ trễ trên 1/N rover")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--serial", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.serial)
+        return
+
+    common.raise_nofile_limit()
+    print(
+        f"{'backend':12s} {'clients':>7s} {'frames/s':>9s} {'MB/s':>7s} {'cpu%':>6s} {'rss MB':>7s} "
+        f"{'p50 ms':>7s} {'p95 ms':>7s} {'p99 ms':>7s}"
+    )
+    for clients in args.clients:
+        for backend in args.backend:
+            r = run(backend, clients, args)
+            print(
+                f"{r['backend']:12s} {r['clients']:7d} {r['frames_per_s']:9.1f} {r['bytes_per_s'] / 1e6:7.2f} "
+                f"{r['cpu_percent']:6.1f} {r['rss_mb']:7.1f} {r['latency_p50_ms']:7.2f} "
+                f"{r['latency_p95_ms']:7.2f} {r['latency_p99_ms']:7.2f}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Load test so sánh các backend phát RTCM: "qt" (BaseTCPServer), "asyncio"
+(AsyncFanoutServer) và "multiprocess" (MultiProcessFanout).
+
+Server chạy trong tiến trình riêng, một thread giả lập thread đọc serial và
+phát epoch RTCM3 tổng hợp (kèm khung đánh dấu thời gian) với tần số --rate.
+Rover giả lập chạy trên nhiều tiến trình; đo CPU của server trên mỗi client
+và độ trễ p50/p99 từ lúc tạo khung tới lúc rover nhận được.
+
+    python benchmarks/bench_fanout.py --backend qt asyncio multiprocess --clients 500 2000 5000
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import common
+
+
+def publisher(publish, rate, stop):
+    period = 1.0 / rate
+    epoch_ms = 0
+    next_time = time.monotonic()
+    while not stop.is_set():
+        for frame in common.synthetic_epoch(epoch_ms):
+            publish(frame)
+        epoch_ms += int(period * 1000)
+        next_time += period
+        delay = next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def serve(backend, ini, rate):
+    common.raise_nofile_limit()
+    import VariableManager
+
+    VariableManager.instance.load(ini)
+    stop = threading.Event()
+
+    if backend == "qt":
+        from PySide6.QtCore import QCoreApplication, QObject, Qt, Signal
+
+        from BaseTCPServer import BaseTCPServer
+
+        class Emitter(QObject):
+            rtcm3_signal = Signal(bytes)
+
+        app = QCoreApplication(sys.argv)
+        server = BaseTCPServer()
+        server.start()
+        emitter = Emitter()
+        emitter.rtcm3_signal.connect(server.send_RTCM3, Qt.ConnectionType.QueuedConnection)
+        threading.Thread(
+            target=publisher, args=(emitter.rtcm3_signal.emit, rate, stop), daemon=True
+        ).start()
+        signal.signal(signal.SIGTERM, lambda *_: app.quit())
+        print("READY", flush=True)
+        app.exec()
+    else:
+        if backend == "multiprocess":
+            from MultiProcessFanout import MultiProcessFanout
+
+            server = MultiProcessFanout()
+        else:
+            from AsyncFanout import AsyncFanoutServer
+
+            server = AsyncFanoutServer()
+        server.start()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        print("READY", flush=True)
+        publisher(server.send_RTCM3, rate, stop)
+        server.stop()
+
+
+def run(backend, clients, args):
+    port = args.port
+    with tempfile.TemporaryDirectory() as tmp:
+        ini = os.path.join(tmp, "bench.ini")
+        common.write_ini(
+            ini,
+            {
+                "tcp.host": "127.0.0.1",
+                "tcp.port": port,
+                "tcp.backend": backend,
+                "tcp.mode": "raw",
+                "tcp.workers": args.workers,
+            },
+        )
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", backend, "--ini", ini, "--rate", str(args.rate)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            while True:
+                line = server.stdout.readline()
+                if not line:
+                    raise RuntimeError(f"{backend} server exited")
+                if line.startswith("READY"):
+                    break
+            result = common.run_rovers(
+                "127.0.0.1", port, clients, args.duration, server_pid=server.pid, sample_every=args.sample_every
+            )
+        finally:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+    result["backend"] = backend
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", nargs="+", default=["qt", "asyncio"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[500, 2000, 5000])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=10.0, help="epoch/s")
+    parser.add_argument("--port", type=int, default=28765)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="tcp.workers cho multiprocess")
+    parser.add_argument("--sample-every", type=int, default=10, help="đo độ trễ trên 1/N rover")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--ini", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.ini, args.rate)
+        return
+
+    common.raise_nofile_limit()
+    print(
+        f"{'backend':12s} {'clients':>7s} {'conn':>6s} {'MB/s':>7s} {'cpu%':>6s} "
+        f"{'us/cli/s':>9s} {'rss MB':>7s} {'p50 ms':>7s} {'p99 ms':>7s}"
+    )
+    for clients in args.clients:
+        for backend in args.backend:
+            r = run(backend, clients, args)
+            print(
+                f"{r['backend']:12s} {r['clients']:7d} {r['connected']:6d} {r['bytes_per_s'] / 1e6:7.2f} "
+                f"{r['cpu_percent']:6.1f} {r['cpu_us_per_client_s']:9.1f} {r['rss_mb']:7.1f} "
+                f"{r['latency_p50_ms']:7.2f} {r['latency_p99_ms']:7.2f}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
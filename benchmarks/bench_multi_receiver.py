@@ -0,0 +1,209 @@
+"""
+Benchmark nhiều receiver: RSS và CPU khi chạy N BaseController trong một
+tiến trình (gps.receivers, mỗi receiver một thread và một mountpoint, dùng
+chung backend phát) so với N tiến trình một receiver như trước.
+
+Mỗi receiver là một ReceiverEmulator (pty); mỗi mountpoint có một rover
+NTRIP để kiểm tra dữ liệu của từng receiver tới đúng luồng.
+
+    python benchmarks/bench_multi_receiver.py --receivers 1 2 4 8 --rate 10
+"""
+import argparse
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+from ReceiverEmulator import ReceiverEmulator
+
+
+def serve(ini):
+    common.raise_nofile_limit()
+    from PySide6.QtCore import QCoreApplication, QThread, Qt
+
+    import VariableManager
+    from BaseStation import BaseController
+
+    app = QCoreApplication(sys.argv)
+    VariableManager.instance.load(ini)
+    backend = VariableManager.instance.get("tcp.backend", "qt")
+    if backend == "asyncio":
+        from AsyncFanout import AsyncFanoutServer
+
+        tcp_server = AsyncFanoutServer()
+        connection = Qt.ConnectionType.DirectConnection
+    else:
+        from BaseTCPServer import BaseTCPServer
+
+        tcp_server = BaseTCPServer()
+        connection = Qt.ConnectionType.QueuedConnection
+    tcp_server.start()
+
+    threads = []
+    for name in VariableManager.receivers():
+        settings = VariableManager.receiver_settings(name)
+        base_station = BaseController(port=settings.get("gps.port"), name=name, settings=settings)
+        thread = QThread()
+        base_station.moveToThread(thread)
+        thread.started.connect(base_station.start)
+        base_station.rtcm3_signal.connect(tcp_server.stream(name).send_RTCM3, connection)
+        thread.start()
+        threads.append((base_station, thread))
+
+    def shutdown(*_):
+        tcp_server.stop()
+        for _, thread in threads:
+            thread.quit()
+            thread.wait(2000)
+        app.quit()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print("READY", flush=True)
+    app.exec()
+
+
+def start_server(tmp, tag, port, emulators, args):
+    """Một tiến trình phục vụ các receiver của emulators, trả về (Popen, mountpoints)"""
+    names = [f"{tag}R{i}" for i in range(len(emulators))]
+    values = {
+        "gps.ecef_x": -191916128,
+        "gps.ecef_y": 582136888,
+        "gps.ecef_z": 175738897,
+        "gps.accuracy": 120,
+        "gps.rate": int(args.rate),
+        "gps.receivers": ",".join(names),
+        "gps.port": emulators[0].port,
+        "tcp.host": "127.0.0.1",
+        "tcp.port": port,
+        "tcp.backend": args.backend,
+        "tcp.mode": "ntrip",
+        "telemetry.dir": os.path.join(tmp, "telemetry"),
+    }
+    sections = {name: {"gps.port": emulator.port} for name, emulator in zip(names[1:], emulators[1:])}
+    ini = os.path.join(tmp, f"{tag}.ini")
+    common.write_ini(ini, values, sections)
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", ini],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    while True:
+        line = server.stdout.readline()
+        if not line:
+            raise RuntimeError("server exited")
+        if line.startswith("READY"):
+            break
+    return server, [(port, name) for name in names]
+
+
+def count_bytes(mounts, duration):
+    """Một rover NTRIP cho mỗi (port, mountpoint), trả về số byte RTCM nhận được"""
+    selector = selectors.DefaultSelector()
+    received = {}
+    for port, name in mounts:
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(f"GET /{name} HTTP/1.0\r\nUser-Agent: NTRIP bench\r\n\r\n".encode())
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, name)
+        received[name] = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        for key, _ in selector.select(max(0.0, end - time.monotonic())):
+            data = key.fileobj.recv(65536)
+            if data:
+                received[key.data] += len(data)
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+    return received
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(5)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def run(count, shared, args):
+    emulators = [ReceiverEmulator(rate=args.rate) for _ in range(count)]
+    for emulator in emulators:
+        emulator.start()
+    servers = []
+    mounts = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            if shared:
+                server, server_mounts = start_server(tmp, "S", args.port, emulators, args)
+                servers.append(server)
+                mounts.extend(server_mounts)
+            else:
+                for i, emulator in enumerate(emulators):
+                    server, server_mounts = start_server(tmp, f"P{i}", args.port + i, [emulator], args)
+                    servers.append(server)
+                    mounts.extend(server_mounts)
+            # Bỏ qua giai đoạn cấu hình receiver
+            time.sleep(args.warmup)
+            cpu0 = sum(common.proc_cpu_seconds(s.pid) for s in servers)
+            t0 = time.monotonic()
+            received = count_bytes(mounts, args.duration)
+            elapsed = time.monotonic() - t0
+            cpu = sum(common.proc_cpu_seconds(s.pid) for s in servers) - cpu0
+            rss = sum(common.proc_rss_mb(s.pid) for s in servers)
+            for server in servers:
+                stop_server(server)
+    finally:
+        for emulator in emulators:
+            emulator.stop()
+    return {
+        "rss_mb": rss,
+        "cpu_percent": 100.0 * cpu / elapsed,
+        "silent": sum(1 for value in received.values() if not value),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receivers", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--backend", default="qt", choices=("qt", "asyncio"))
+    parser.add_argument("--rate", type=float, default=10.0, help="epoch/s của mỗi emulator")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=28900)
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    common.raise_nofile_limit()
+    print(
+        f"{'receivers':>9s} {'mode':>9s} {'rss MB':>7s} {'MB/rx':>6s} {'cpu%':>6s} {'cpu%/rx':>7s} {'silent':>6s}"
+    )
+    baseline = {}
+    for count in args.receivers:
+        for shared in (True, False):
+            mode = "shared" if shared else "separate"
+            r = run(count, shared, args)
+            # Phần tăng thêm cho mỗi receiver so với lần chạy một receiver
+            base = baseline.setdefault(mode, r if count == 1 else None)
+            if base is not None and count > 1:
+                per_rss = (r["rss_mb"] - base["rss_mb"]) / (count - 1)
+                per_cpu = (r["cpu_percent"] - base["cpu_percent"]) / (count - 1)
+            else:
+                per_rss, per_cpu = r["rss_mb"], r["cpu_percent"]
+            print(
+                f"{count:9d} {mode:>9s} {r['rss_mb']:7.1f} {per_rss:6.1f} "
+                f"{r['cpu_percent']:6.1f} {per_cpu:7.2f} {r['silent']:6d}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark khởi động main.py: thời gian từ lúc chạy tiến trình tới khi cổng
+TCP nhận kết nối, tới byte RTCM đầu tiên ở client raw, và RSS lúc đó.
+
+main.py chạy trong thư mục tạm với global_variable.ini riêng; gps.port trỏ
+tới ReceiverEmulator nên không quét USB. Lần chạy đầu cấu hình receiver,
+các lần sau giống khởi động lại service (warm start).
+
+    python benchmarks/bench_startup.py --backend qt asyncio --runs 5
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+from ReceiverEmulator import ReceiverEmulator
+
+MAIN = os.path.join(common.ROOT, "main.py")
+
+
+def wait_listening(port, process, deadline):
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("main.py exited")
+        try:
+            return socket.create_connection(("127.0.0.1", port), timeout=0.5)
+        except OSError:
+            time.sleep(0.002)
+    return None
+
+
+def start_once(tmp, port, timeout):
+    """Trả về (giây tới listen, giây tới byte RTCM đầu, RSS MB) hoặc None nếu quá hạn"""
+    started = time.monotonic()
+    deadline = started + timeout
+    process = subprocess.Popen(
+        [sys.executable, MAIN],
+        cwd=tmp,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        sock = wait_listening(port, process, deadline)
+        if sock is None:
+            return None
+        listening = time.monotonic() - started
+        with sock:
+            sock.settimeout(max(0.01, deadline - time.monotonic()))
+            try:
+                if not sock.recv(1):
+                    return None
+            except socket.timeout:
+                return None
+        first_byte = time.monotonic() - started
+        return listening, first_byte, common.proc_rss_mb(process.pid)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run(backend, emulator, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        common.write_ini(
+            os.path.join(tmp, "global_variable.ini"),
+            {
+                "gps.ecef_x": -191916128,
+                "gps.ecef_y": 582136888,
+                "gps.ecef_z": 175738897,
+                "gps.accuracy": 120,
+                "gps.rate": int(args.rate),
+                "gps.port": emulator.port,
+                "tcp.host": "127.0.0.1",
+                "tcp.port": args.port,
+                "tcp.backend": backend,
+                "tcp.mode": "raw",
+                "tcp.workers": args.workers,
+                "telemetry.dir": os.path.join(tmp, "telemetry"),
+            },
+        )
+        # Lần đầu cấu hình receiver, không tính
+        start_once(tmp, args.port, args.timeout)
+        samples = [start_once(tmp, args.port, args.timeout) for _ in range(args.runs)]
+    valid = [s for s in samples if s is not None]
+    if not valid:
+        return None
+    return {
+        "backend": backend,
+        "listen_ms": statistics.median(s[0] for s in valid) * 1000,
+        "first_rtcm_ms": statistics.median(s[1] for s in valid) * 1000,
+        "rss_mb": statistics.median(s[2] for s in valid),
+        "timeouts": len(samples) - len(valid),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", nargs="+", default=["qt"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=1.0, help="epoch/s của emulator")
+    parser.add_argument("--timeout", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=28767)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    emulator = ReceiverEmulator(rate=args.rate)
+    emulator.start()
+    try:
+        print(f"{'backend':12s} {'listen ms':>9s} {'1st RTCM ms':>11s} {'rss MB':>7s} {'timeouts':>8s}")
+        for backend in args.backend:
+            r = run(backend, emulator, args)
+            if r is None:
+                print(f"{backend:12s} no successful start")
+                continue
+            print(
+                f"{r['backend']:12s} {r['listen_ms']:9.0f} {r['first_rtcm_ms']:11.0f} "
+                f"{r['rss_mb']:7.1f} {r['timeouts']:8d}",
+                flush=True,
+            )
+    finally:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Benchmark UDP multicast so với TCP: CPU của tiến trình server khi phục vụ N
+rover qua TCP (mỗi rover một lần ghi mỗi khung) và qua UDP multicast (một
+datagram mỗi epoch cho mọi rover).
+
+Rover UDP là N socket cùng tham gia nhóm multicast trên loopback; mỗi socket
+theo dõi sequence để đếm datagram mất và đo độ trễ từ khung đánh dấu thời
+gian của ReceiverEmulator.
+
+    python benchmarks/bench_udp.py --clients 10 200 1000 --rate 10
+"""
+import argparse
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+from ReceiverEmulator import ReceiverEmulator
+
+GROUP = "239.255.42.1"
+
+
+def serve(ini, port):
+    common.raise_nofile_limit()
+    from PySide6.QtCore import QCoreApplication, QThread, Qt
+
+    import VariableManager
+    from BaseStation import BaseController
+    from UdpOutput import UdpRTCMOutput
+
+    app = QCoreApplication(sys.argv)
+    VariableManager.instance.load(ini)
+    backend = VariableManager.instance.get("tcp.backend", "qt")
+    if backend == "asyncio":
+        from AsyncFanout import AsyncFanoutServer
+
+        tcp_server = AsyncFanoutServer()
+        connection = Qt.ConnectionType.DirectConnection
+    else:
+        from BaseTCPServer import BaseTCPServer
+
+        tcp_server = BaseTCPServer()
+        connection = Qt.ConnectionType.QueuedConnection
+    tcp_server.start()
+    udp_output = UdpRTCMOutput()
+    udp_output.start()
+
+    base_station = BaseController(port=port)
+    base_station_thread = QThread()
+    base_station.moveToThread(base_station_thread)
+    base_station_thread.started.connect(base_station.start)
+    base_station_thread.finished.connect(base_station.stop, Qt.ConnectionType.DirectConnection)
+    base_station.rtcm3_signal.connect(tcp_server.send_RTCM3, connection)
+    base_station.rtcm3_signal.connect(udp_output.send_RTCM3, Qt.ConnectionType.DirectConnection)
+    base_station_thread.start()
+
+    def shutdown(*_):
+        tcp_server.stop()
+        udp_output.stop()
+        base_station_thread.quit()
+        base_station_thread.wait(2000)
+        app.quit()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print("READY", flush=True)
+    app.exec()
+
+
+def _udp_rovers(port, count, sample_every, ready, started, stopped, report):
+    from UdpOutput import SequenceTracker, parse_datagram
+
+    common.raise_nofile_limit()
+    selector = selectors.DefaultSelector()
+    membership = struct.pack("4s4s", socket.inet_aton(GROUP), socket.inet_aton("127.0.0.1"))
+    for index in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        sock.bind(("", port))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, (SequenceTracker(), index % sample_every == 0))
+    ready.set()
+    received = 0
+    latency = []
+    measuring = False
+    while not stopped.is_set():
+        if not measuring and started.is_set():
+            measuring = True
+            received = 0
+            for key in selector.get_map().values():
+                key.data[0].__init__()
+        for key, _ in selector.select(0.05):
+            tracker, sampled = key.data
+            try:
+                data = key.fileobj.recv(65536)
+            except BlockingIOError:
+                continue
+            now = time.monotonic_ns()
+            seq, _, _, _, payload = parse_datagram(data)
+            tracker.update(seq)
+            received += len(data)
+            # Khung đánh dấu thời gian đứng đầu datagram của epoch
+            if measuring and sampled and len(payload) >= 16:
+                if (payload[3] << 4 | payload[4] >> 4) == common.STAMP_TYPE:
+                    sent = struct.unpack_from(">Q", payload, 5)[0]
+                    latency.append((now - sent) / 1e6)
+    lost = sum(key.data[0].lost for key in selector.get_map().values())
+    datagrams = sum(key.data[0].received for key in selector.get_map().values())
+    report.put((received, datagrams, lost, latency))
+
+
+def run_udp_rovers(port, clients, duration, server_pid, sample_every):
+    context = multiprocessing.get_context("spawn")
+    ready, started, stopped = context.Event(), context.Event(), context.Event()
+    report = context.Queue()
+    process = context.Process(
+        target=_udp_rovers, args=(port, clients, sample_every, ready, started, stopped, report)
+    )
+    process.start()
+    ready.wait(30)
+    time.sleep(0.5)
+    cpu0 = common.proc_cpu_seconds(server_pid)
+    started.set()
+    t0 = time.monotonic()
+    time.sleep(duration)
+    elapsed = time.monotonic() - t0
+    cpu = common.proc_cpu_seconds(server_pid) - cpu0
+    stopped.set()
+    received, datagrams, lost, latency = report.get(timeout=30)
+    process.join(5)
+    return {
+        "clients": clients,
+        "bytes_per_s": received / elapsed,
+        "cpu_percent": 100.0 * cpu / elapsed,
+        "rss_mb": common.proc_rss_mb(server_pid),
+        "latency_p50_ms": common.percentile(latency, 50),
+        "latency_p99_ms": common.percentile(latency, 99),
+        "loss": lost / max(1, lost + datagrams),
+    }
+
+
+def run(transport, clients, args):
+    emulator = ReceiverEmulator(rate=args.rate)
+    emulator.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        ini = os.path.join(tmp, "bench.ini")
+        common.write_ini(
+            ini,
+            {
+                "gps.ecef_x": -191916128,
+                "gps.ecef_y": 582136888,
+                "gps.ecef_z": 175738897,
+                "gps.accuracy": 120,
+                "gps.rate": int(args.rate),
+                "tcp.host": "127.0.0.1",
+                "tcp.port": args.port,
+                "tcp.mode": "raw",
+                "tcp.backend": args.backend,
+                "udp.enabled": "true" if transport == "udp" else "false",
+                "udp.group": GROUP,
+                "udp.port": args.udp_port,
+                "udp.interface": "127.0.0.1",
+                "telemetry.dir": os.path.join(tmp, "telemetry"),
+            },
+        )
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", ini, "--serial", emulator.port],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            while True:
+                line = server.stdout.readline()
+                if not line:
+                    raise RuntimeError("server exited")
+                if line.startswith("READY"):
+                    break
+            # Bỏ qua giai đoạn cấu hình receiver
+            time.sleep(args.warmup)
+            if transport == "udp":
+                result = run_udp_rovers(args.udp_port, clients, args.duration, server.pid, args.sample_every)
+            else:
+                result = common.run_rovers(
+                    "127.0.0.1", args.port, clients, args.duration,
+                    server_pid=server.pid, sample_every=args.sample_every,
+                )
+                result["loss"] = 0.0
+        finally:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            emulator.stop()
+    result["transport"] = transport
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", nargs="+", type=int, default=[10, 200, 1000])
+    parser.add_argument("--transport", nargs="+", default=["tcp", "udp"])
+    parser.add_argument("--backend", default="qt", choices=("qt", "asyncio"), help="backend TCP")
+    parser.add_argument("--rate", type=float, default=10.0, help="epoch/s của emulator")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=28768)
+    parser.add_argument("--udp-port", type=int, default=28769)
+    parser.add_argument("--sample-every", type=int, default=10, help="đo độ trễ trên 1/N rover")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--serial", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.serial)
+        return
+
+    common.raise_nofile_limit()
+    print(
+        f"{'transport':9s} {'clients':>7s} {'MB/s':>7s} {'cpu%':>6s} {'rss MB':>7s} "
+        f"{'p50 ms':>7s} {'p99 ms':>7s} {'loss':>6s}"
+    )
+    for clients in args.clients:
+        for transport in args.transport:
+            r = run(transport, clients, args)
+            print(
+                f"{r['transport']:9s} {r['clients']:7d} {r['bytes_per_s'] / 1e6:7.2f} {r['cpu_percent']:6.1f} "
+                f"{r['rss_mb']:7.1f} {r['latency_p50_ms']:7.2f} {r['latency_p99_ms']:7.2f} {r['loss']:6.2%}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark khởi động: thời gian từ BaseController.start() tới khung RTCM3 đầu
+tiên, khi receiver đã được cấu hình sẵn (khởi động lại service).
+
+• cold: cấu hình message xuất rồi _disable + fixed mode như trước
+• warm: nhận RTCM ngay, CFG-VALGET và chỉ ghi key khác (gps.warm_start)
+
+ReceiverEmulator mất TMODE_RESTART_EPOCHS epoch RTCM mỗi khi TMODE bị ghi.
+
+    python benchmarks/bench_warm_start.py --rate 1 --runs 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import termios
+import time
+
+import common
+from ReceiverEmulator import ReceiverEmulator
+
+
+def start_once(app, emulator, warm, timeout):
+    from PySide6.QtCore import QTimer
+
+    import VariableManager
+    from BaseStation import BaseController
+
+    # Khởi động ở pha ngẫu nhiên so với epoch; bỏ dữ liệu tồn trong pty
+    # (cổng USB thật không giữ dữ liệu khi đang đóng)
+    time.sleep(random.uniform(0, 1.0 / emulator.rate))
+    termios.tcflush(emulator.slave, termios.TCIFLUSH)
+
+    VariableManager.instance.set("gps.warm_start", "true" if warm else "false")
+    base_station = BaseController(port=emulator.port)
+    first_frame = []
+
+    def on_frame(frame):
+        if not first_frame:
+            first_frame.append(time.monotonic())
+            app.quit()
+
+    base_station.rtcm3_signal.connect(on_frame)
+    # Timer riêng cho mỗi lần chạy, dừng lại để không thoát nhầm lần sau
+    timer = QTimer()
+    timer.timeout.connect(app.quit)
+    timer.start(int(timeout * 1000))
+    started = time.monotonic()
+    base_station.start()
+    app.exec()
+    timer.stop()
+    elapsed = first_frame[0] - started if first_frame else None
+
+    # Chờ các lệnh còn lại được ACK trước khi đóng cổng
+    deadline = time.monotonic() + timeout
+    while base_station.commands.pending and time.monotonic() < deadline:
+        app.processEvents()
+    if base_station.watchdog_timer is not None:
+        base_station.watchdog_timer.stop()
+    base_station.stop_logs()
+    base_station._close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=1.0, help="epoch/s của emulator")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    from PySide6.QtCore import QCoreApplication
+
+    import VariableManager
+
+    app = QCoreApplication(sys.argv)
+    emulator = ReceiverEmulator(rate=args.rate)
+    emulator.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        ini = os.path.join(tmp, "bench.ini")
+        common.write_ini(
+            ini,
+            {
+                "gps.ecef_x": -191916128,
+                "gps.ecef_y": 582136888,
+                "gps.ecef_z": 175738897,
+                "gps.accuracy": 120,
+                "gps.rate": int(args.rate),
+                "telemetry.dir": os.path.join(tmp, "telemetry"),
+            },
+        )
+        VariableManager.instance.load(ini)
+        try:
+            # Lần đầu cấu hình receiver, các lần sau giống khởi động lại service
+            start_once(app, emulator, False, args.timeout)
+            for warm in (False, True):
+                restarts = emulator.tmode_restarts
+                samples = [start_once(app, emulator, warm, args.timeout) for _ in range(args.runs)]
+                valid = [s * 1000 for s in samples if s is not None]
+                print(
+                    f"{'warm' if warm else 'cold'}: start -> first RTCM "
+                    f"median {statistics.median(valid):.0f} ms, max {max(valid):.0f} ms, "
+                    f"timeouts {len(samples) - len(valid)}, "
+                    f"TMODE restarts {emulator.tmode_restarts - restarts}/{args.runs}"
+                )
+        finally:
+            emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
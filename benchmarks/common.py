@@ -0,0 +1,237 @@
+"""
+Tiện ích dùng chung cho các benchmark: tạo khung RTCM3 giả lập có gắn thời
+điểm gửi, đo CPU/RSS của tiến trình và giả lập nhiều rover TCP.
+"""
+import asyncio
+import multiprocessing
+import os
+import resource
+import struct
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from ReceiverEmulator import (  # noqa: E402,F401
+    STAMP_TYPE,
+    rtcm_frame,
+    stamp_frame,
+    synthetic_epoch,
+)
+
+
+def raise_nofile_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def proc_tree(pid):
+    """pid cùng mọi tiến trình con cháu (ví dụ worker của backend multiprocess)"""
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def proc_cpu_seconds(pid):
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0
+    for current in proc_tree(pid):
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])
+    return total / ticks
+
+
+def proc_rss_mb(pid):
+    total = 0
+    for current in proc_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total / 1024.0
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return values[index]
+
+
+class RoverProtocol(asyncio.Protocol):
+    """Rover giả lập; chỉ rover được lấy mẫu mới tách khung để đo độ trễ"""
+
+    def __init__(self, state, sampled, request):
+        self.state = state
+        self.sampled = sampled
+        self.request = request
+        self.buffer = bytearray()
+        self.header_done = request is None
+
+    def connection_made(self, transport):
+        if self.request is not None:
+            transport.write(self.request)
+
+    def data_received(self, data):
+        self.state["bytes"] += len(data)
+        if not self.sampled or not self.state["measuring"]:
+            return
+        now = time.monotonic_ns()
+        buffer = self.buffer
+        buffer.extend(data)
+        if not self.header_done:
+            end = buffer.find(b"\r\n\r\n")
+            if end == -1:
+                return
+            del buffer[: end + 4]
+            self.header_done = True
+        pos = 0
+        size = len(buffer)
+        while True:
+            start = buffer.find(0xD3, pos)
+            if start == -1 or size - start < 3:
+                pos = size if start == -1 else start
+                break
+            end = start + 3 + (((buffer[start + 1] & 0x03) << 8) | buffer[start + 2]) + 3
+            if end > size:
+                pos = start
+                break
+            if end - start >= 16 and (buffer[start + 3] << 4 | buffer[start + 4] >> 4) == STAMP_TYPE:
+                sent = struct.unpack_from(">Q", buffer, start + 5)[0]
+                self.state["latency"].append((now - sent) / 1e6)
+            pos = end
+        del buffer[:pos]
+
+
+async def _rover_worker(host, port, count, sample_every, request, started, stopped, report):
+    state = {"bytes": 0, "latency": [], "measuring": False}
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(200)
+    transports = []
+
+    async def connect(index):
+        async with semaphore:
+            for _ in range(20):
+                try:
+                    transport, _ = await loop.create_connection(
+                        lambda: RoverProtocol(state, index % sample_every == 0, request),
+                        host,
+                        port,
+                    )
+                    transports.append(transport)
+                    return
+                except OSError:
+                    await asyncio.sleep(0.1)
+
+    await asyncio.gather(*(connect(i) for i in range(count)))
+    report.put(("connected", len(transports)))
+    while not started.is_set():
+        await asyncio.sleep(0.05)
+    state["measuring"] = True
+    state["bytes"] = 0
+    while not stopped.is_set():
+        await asyncio.sleep(0.05)
+    state["measuring"] = False
+    report.put(("result", state["bytes"], state["latency"]))
+    for transport in transports:
+        transport.close()
+
+
+def _rover_process(host, port, count, sample_every, request, started, stopped, report):
+    raise_nofile_limit()
+    asyncio.run(_rover_worker(host, port, count, sample_every, request, started, stopped, report))
+
+
+def run_rovers(host, port, clients, duration, server_pid=None, sample_every=10, request=None, workers=None):
+    """
+    Mở `clients` kết nối rover từ nhiều tiến trình, đo trong `duration` giây.
+    Trả về dict: connected, bytes/s, latency p50/p99 (ms), CPU/RSS của server.
+    """
+    if workers is None:
+        workers = max(1, min(os.cpu_count() or 1, (clients + 499) // 500))
+    started = multiprocessing.Event()
+    stopped = multiprocessing.Event()
+    report = multiprocessing.Queue()
+    per_worker = [clients // workers + (1 if i < clients % workers else 0) for i in range(workers)]
+    processes = [
+        multiprocessing.Process(
+            target=_rover_process,
+            args=(host, port, n, sample_every, request, started, stopped, report),
+            daemon=True,
+        )
+        for n in per_worker
+        if n
+    ]
+    for process in processes:
+        process.start()
+
+    connected = 0
+    for _ in processes:
+        kind, count = report.get(timeout=120)
+        connected += count
+
+    time.sleep(1.0)  # warm up
+    cpu0 = proc_cpu_seconds(server_pid) if server_pid else 0.0
+    t0 = time.monotonic()
+    started.set()
+    time.sleep(duration)
+    stopped.set()
+    elapsed = time.monotonic() - t0
+    cpu1 = proc_cpu_seconds(server_pid) if server_pid else 0.0
+    rss = proc_rss_mb(server_pid) if server_pid else 0.0
+
+    total_bytes = 0
+    latency = []
+    for _ in processes:
+        _, nbytes, samples = report.get(timeout=60)
+        total_bytes += nbytes
+        latency.extend(samples)
+    for process in processes:
+        process.join(5)
+
+    cpu = cpu1 - cpu0
+    return {
+        "clients": clients,
+        "connected": connected,
+        "bytes_per_s": total_bytes / elapsed,
+        "cpu_percent": 100.0 * cpu / elapsed,
+        "cpu_us_per_client_s": 1e6 * cpu / elapsed / max(1, connected),
+        "rss_mb": rss,
+        "latency_p50_ms": percentile(latency, 50),
+        "latency_p95_ms": percentile(latency, 95),
+        "latency_p99_ms": percentile(latency, 99),
+        "samples": len(latency),
+    }
+
+
+def write_ini(path, values, sections=None):
+    """Ghi file cấu hình; sections: tên section -> dict key (receiver phụ)"""
+    with open(path, "w") as f:
+        f.write("[General]\n")
+        for key, value in values.items():
+            f.write(f"{key}={value}\n")
+        for name, section in (sections or {}).items():
+            f.write(f"\n[{name}]\n")
+            for key, value in section.items():
+                f.write(f"{key}={value}\n")
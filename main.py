@@ -1,58 +1,171 @@
 import sys
-
-from PySide6.QtCore import Qt, QTimer
-from PySide6.QtCore import QThread
-from PySide6.QtWidgets import QApplication
 import signal
 import os
 import threading
-from SerialDeviceSanner import DevicePortScanner
-from BaseStation import BaseController
-from BaseTCPServer import BaseTCPServer
-import Console
-import VariableManager
 
 current_path = os.path.dirname(os.path.abspath(__file__))
 
-os.environ["QT_QPA_PLATFORM"] = "offscreen"
-
+# Chỉ import khi chạy thật: worker của backend multiprocess (spawn) import lại
+# file này và không cần Qt hay BaseController
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    # Daemon không có giao diện: QCoreApplication, không cần QtWidgets / QPA
+    from PySide6.QtCore import QCoreApplication, Qt, QThread, QTimer
+
+    import VariableManager
+    import LatencyMetrics
+
+    app = QCoreApplication(sys.argv)
     VariableManager.instance.load("global_variable.ini")
-    # TCP server
-    tcp_server = BaseTCPServer()
+    # Đo độ trễ + endpoint Prometheus (metrics.enabled), phải load trước khi tạo server
+    LatencyMetrics.instance.load()
+    # TCP server: "qt" (QTcpServer), "asyncio" (event loop riêng) hoặc
+    # "multiprocess" (nhiều tiến trình asyncio đọc chung ring buffer).
+    # Chỉ import backend được chọn.
+    tcp_backend = VariableManager.instance.get("tcp.backend", "qt")
+    if tcp_backend == "asyncio":
+        from AsyncFanout import AsyncFanoutServer
+
+        tcp_server = AsyncFanoutServer()
+    elif tcp_backend == "multiprocess":
+        from MultiProcessFanout import MultiProcessFanout
+
+        tcp_server = MultiProcessFanout()
+    else:
+        from BaseTCPServer import BaseTCPServer
+
+        tcp_server = BaseTCPServer()
     tcp_server.start()
+    # UDP multicast/unicast (udp.enabled): một lần gửi mỗi epoch cho mọi rover trong LAN.
+    # Chỉ import khi bật; bật/tắt udp.enabled cần khởi động lại
+    udp_output = None
+    if VariableManager.instance.getBool("udp.enabled", False):
+        from UdpOutput import UdpRTCMOutput
+
+        udp_output = UdpRTCMOutput()
+        udp_output.start()
+
+    from BaseStation import BaseController
+    import Console
+
+    # Cổng của receiver chính: gps.port nếu cấu hình sẵn (khởi động nhanh,
+    # không quét), ngược lại quét USB
+    scanner = None
+    scanner_thread = None
+    gps_port = VariableManager.instance.get("gps.port")
+    if not gps_port or any(
+        VariableManager.receiver_settings(name).get("gps.serial_number")
+        for name in VariableManager.receivers()[1:]
+    ):
+        from SerialDeviceSanner import DevicePortScanner
+
+        scanner = DevicePortScanner()
+        scanner_thread = QThread()
+        scanner.moveToThread(scanner_thread)
+        scanner_thread.start()
+        scanner.start_watcher()
+    if not gps_port:
+        gps_port = scanner.find_base_port()
+
+    # Mỗi receiver trong gps.receivers: BaseController + thread + namespace
+    # Socket.IO riêng, cùng chia sẻ một tcp_server (mỗi receiver một luồng RTCM)
+    Console.publisher.load()
+    Console.publisher.start()
+    receivers = VariableManager.receivers()
+    base_stations = []
+    base_station_threads = []
+    for name in receivers:
+        settings = VariableManager.receiver_settings(name)
+        if name == receivers[0]:
+            port = gps_port
+            port_resolver = scanner.resolve_base_port if scanner is not None else None
+            cmd = Console.ExternalCmdServer()
+        else:
+            # Receiver phụ: [name] gps.serial_number (nhận theo USB) hoặc gps.port
+            port = settings.get("gps.port")
+            serial_number = settings.get("gps.serial_number")
+            port_resolver = None
+            if serial_number:
+                scanner.add_receiver(name, serial_number)
+                port = scanner.find_receiver_port(name)
+                port_resolver = lambda name=name: scanner.resolve_receiver_port(name)
+            print(f"{name} port >> {port}")
+            cmd = Console.ExternalCmdServer(settings.get("gps.namespace", f"/base/{name}"))
+
+        base_station = BaseController(port=port, name=name, settings=settings)
+        # Watchdog tìm lại cổng nếu tên tty đổi sau khi USB enumerate lại
+        base_station.port_resolver = port_resolver
+        if name == receivers[0] and VariableManager.instance.getBool("archive.enabled", False):
+            from StreamArchive import StreamRecorder
+
+            recorder = StreamRecorder(
+                directory=VariableManager.instance.get("archive.dir", "archive"),
+                segment_bytes=int(VariableManager.instance.get("archive.segment_mb", 64)) * 1024 * 1024,
+                segment_seconds=int(VariableManager.instance.get("archive.segment_minutes", 60)) * 60,
+                flush_interval=int(VariableManager.instance.get("archive.flush_ms", 500)) / 1000.0,
+                keep_segments=int(VariableManager.instance.get("archive.keep_segments", 0)),
+            )
+            recorder.start()
+            base_station.recorder = recorder
+            app.aboutToQuit.connect(recorder.stop)
+            if LatencyMetrics.instance.enabled:
+                LatencyMetrics.instance.register("archive", recorder.stats)
+        if LatencyMetrics.instance.enabled:
+            suffix = "" if name == receivers[0] else f"_{name}"
+            LatencyMetrics.instance.register(f"rtcm3{suffix}", base_station.rtcm3_framer.stats)
+            LatencyMetrics.instance.register(f"link{suffix}", base_station.link_stats)
+        base_station_thread = QThread()
+        base_station.moveToThread(base_station_thread)
+        base_station_thread.started.connect(base_station.start)
+        # Dừng timer / đóng cổng trong chính thread của BaseController trước khi thread kết thúc
+        base_station_thread.finished.connect(base_station.stop, Qt.ConnectionType.DirectConnection)
+        base_station_thread.start()
+
+        cmd.survey_in.connect(base_station.start_survey_in_mode)
+        cmd.fixed.connect(base_station.start_fixed_mode)
+        cmd.rate.connect(base_station.set_rate)
+        cmd.request_signal.connect(base_station.get_data)
+        stream = tcp_server.stream(name)
+        if tcp_backend in ("asyncio", "multiprocess"):
+            # send_RTCM3 của các backend này an toàn khi gọi từ thread đọc serial
+            base_station.rtcm3_signal.connect(stream.send_RTCM3, Qt.ConnectionType.DirectConnection)
+        else:
+            base_station.rtcm3_signal.connect(stream.send_RTCM3, Qt.ConnectionType.QueuedConnection)
+        if udp_output is not None:
+            # sendto không chặn, gọi thẳng từ thread đọc serial
+            base_station.rtcm3_signal.connect(udp_output.stream(name).send_RTCM3, Qt.ConnectionType.DirectConnection)
+        if Console.publisher.enabled:
+            # publish() chỉ ghi giá trị mới nhất, gọi thẳng từ thread của BaseController
+            base_station.survey_in_data.connect(cmd.send_svin_status, Qt.ConnectionType.DirectConnection)
+            base_station.base_data.connect(cmd.respone_data, Qt.ConnectionType.DirectConnection)
+        else:
+            base_station.survey_in_data.connect(cmd.send_svin_status)
+            base_station.base_data.connect(cmd.respone_data)
+        app.aboutToQuit.connect(base_station.stop_logs)
+        VariableManager.instance.changed.connect(base_station.apply_settings)
+        base_stations.append(base_station)
+        base_station_threads.append(base_station_thread)
 
-    # Scan gps port
-    scanner = DevicePortScanner()
-    scanner_thread = QThread()
-    scanner.moveToThread(scanner_thread)
-    scanner_thread.start()
-    gps_port = scanner.find_base_port()
-    
-    cmd = Console.ExternalCmdServer()
     threadSocketIO = threading.Thread(target=Console.socketio_thread)
     threadSocketIO.daemon = True
     threadSocketIO.start()
-    
-    # Base Station
-    base_station = BaseController(port=gps_port)
-    base_station_thread = QThread()
-    base_station.moveToThread(base_station_thread)
-    base_station_thread.started.connect(base_station.run_fixed_mode)
-    base_station_thread.start()
-    
-    
-    cmd.survey_in.connect(base_station.start_survey_in_mode)
-    cmd.fixed.connect(base_station.start_fixed_mode)
-    cmd.rate.connect(base_station.set_rate)
-    cmd.request_signal.connect(base_station.get_data)
-    base_station.rtcm3_signal.connect(tcp_server.send_RTCM3,Qt.ConnectionType.QueuedConnection)
-    base_station.survey_in_data.connect(cmd.send_svin_status)
-    base_station.base_data.connect(cmd.respone_data)
+
+    if LatencyMetrics.instance.enabled:
+        if udp_output is not None:
+            LatencyMetrics.instance.register("udp", udp_output.stats)
+        app.aboutToQuit.connect(LatencyMetrics.instance.stop)
     app.aboutToQuit.connect(tcp_server.stop)
-    
-    base_station.get_data() # emit to nest server
+    app.aboutToQuit.connect(Console.publisher.stop)
+    # Sửa global_variable.ini khi đang chạy: áp dụng ngay, không cần khởi động lại
+    VariableManager.instance.watch()
+    VariableManager.instance.changed.connect(tcp_server.apply_settings)
+    if udp_output is not None:
+        app.aboutToQuit.connect(udp_output.stop)
+        VariableManager.instance.changed.connect(udp_output.apply_settings)
+    VariableManager.instance.changed.connect(Console.publisher.apply_settings)
+    app.aboutToQuit.connect(VariableManager.instance.flush)
+
+    for base_station in base_stations:
+        base_station.get_data() # emit to nest server
     
     timer = QTimer()
     timer.start(100)  # mỗi 100ms
@@ -60,10 +173,12 @@ if __name__ == "__main__":
 
     def handleIntSignal(signum, frame):
         tcp_server.stop()
-        scanner_thread.quit()
-        scanner_thread.wait(2000)
-        base_station_thread.quit()
-        base_station_thread.wait(2000)
+        if scanner_thread is not None:
+            scanner_thread.quit()
+            scanner_thread.wait(2000)
+        for base_station_thread in base_station_threads:
+            base_station_thread.quit()
+            base_station_thread.wait(2000)
         app.quit()
 
     signal.signal(signal.SIGINT, handleIntSignal)
@@ -0,0 +1,68 @@
+import base64
+
+import pytest
+
+import NtripCaster
+from NtripCaster import Mountpoint, NtripError, dispatch, parse_request
+
+
+def request(lines):
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+def test_parse_v2_request():
+    data = request(
+        [
+            "GET /BASE?messages=1005:10,1074%3A1 HTTP/1.1",
+            "Host: caster",
+            "Ntrip-Version: Ntrip/2.0",
+            "User-Agent: NTRIP test",
+            "Authorization: Basic dXNlcjpwYXNz",
+        ]
+    )
+    req, used = parse_request(bytearray(data + b"\xd3"))
+    assert used == len(data)
+    assert req.mountpoint == "BASE"
+    assert req.messages == "1005:10,1074:1"
+    assert req.ntrip_version == NtripCaster.NTRIP_V2
+    assert req.user_agent == "NTRIP test"
+    assert req.authorization == "Basic dXNlcjpwYXNz"
+
+
+def test_parse_incomplete_and_invalid():
+    assert parse_request(bytearray(b"GET /BASE HTTP/1.0\r\n")) == (None, 0)
+    with pytest.raises(NtripError):
+        parse_request(bytearray(b"x" * (NtripCaster.MAX_REQUEST_SIZE + 1)))
+    with pytest.raises(NtripError):
+        parse_request(bytearray(request(["POST /BASE HTTP/1.1"])))
+    with pytest.raises(NtripError):
+        parse_request(bytearray(request(["GET /BASE"])))
+
+
+def test_dispatch():
+    token = base64.b64encode(b"user:pass").decode()
+    mountpoints = {"BASE": Mountpoint("BASE"), "SECURE": Mountpoint("SECURE", "user", "pass")}
+
+    def answer(lines):
+        req, _ = parse_request(bytearray(request(lines)))
+        return dispatch(req, mountpoints)
+
+    response, mount = answer(["GET / HTTP/1.0"])
+    assert mount is None and response.startswith(b"SOURCETABLE 200 OK")
+    assert b"STR;SECURE;" in response and response.endswith(b"ENDSOURCETABLE\r\n")
+
+    response, mount = answer(["GET /NOPE HTTP/1.1", "Ntrip-Version: Ntrip/2.0"])
+    assert mount is None and b"404" in response.split(b"\r\n")[0]
+
+    response, mount = answer(["GET /SECURE HTTP/1.0"])
+    assert mount is None and b"401" in response.split(b"\r\n")[0]
+
+    response, mount = answer(["GET /SECURE HTTP/1.0", f"Authorization: Basic {token}"])
+    assert mount is mountpoints["SECURE"] and response == b"ICY 200 OK\r\n\r\n"
+
+    response, mount = answer(["GET /BASE HTTP/1.1", "Ntrip-Version: Ntrip/2.0"])
+    assert mount is mountpoints["BASE"] and b"Transfer-Encoding: chunked" in response
+
+
+def test_chunk():
+    assert NtripCaster.chunk(b"\xd3" * 26) == b"1A\r\n" + b"\xd3" * 26 + b"\r\n"
@@ -0,0 +1,71 @@
+from RTCM3Framer import (
+    RTCM3Framer,
+    crc24q,
+    is_epoch_end,
+    message_type,
+    msm_epoch_ms,
+    msm_gps_time_ms,
+)
+from ReceiverEmulator import msm_payload, rtcm_frame, synthetic_epoch
+
+
+def test_crc24q_known_value():
+    # Khung 1005 rỗng: CRC-24Q của D3 00 00 là 0x000000, của "123456789" là 0xCDE703
+    assert crc24q(b"") == 0
+    assert crc24q(b"123456789") == 0xCDE703
+
+
+def test_frames_split_across_reads():
+    frames = synthetic_epoch(1000, stamp=False)
+    data = b"".join(frames)
+    framer = RTCM3Framer()
+    out = []
+    for i in range(0, len(data), 7):
+        out += framer.feed(data[i : i + 7])
+    assert out == frames
+    assert framer.stats()["buffered"] == 0
+    assert framer.crc_errors == 0
+
+
+def test_resync_after_garbage():
+    frame = rtcm_frame(msm_payload(1074, 5000, False, 40))
+    # NMEA lẫn vào và một byte 0xD3 giả có reserved bit khác 0
+    garbage = b"$GNGGA,123*00\r\n\xd3\xff"
+    framer = RTCM3Framer()
+    assert framer.feed(garbage + frame + garbage + frame) == [frame, frame]
+    assert framer.discarded_bytes == 2 * len(garbage)
+    assert framer.resyncs > 0
+
+
+def test_bad_crc_is_skipped():
+    frame = rtcm_frame(msm_payload(1074, 5000, False, 40))
+    broken = bytearray(frame)
+    broken[10] ^= 0xFF
+    framer = RTCM3Framer()
+    assert framer.feed(bytes(broken) + frame) == [frame]
+    assert framer.crc_errors == 1
+
+
+def test_partial_frame_is_kept():
+    frame = rtcm_frame(msm_payload(1084, 5000, True, 60))
+    framer = RTCM3Framer()
+    assert framer.feed(frame[:-1]) == []
+    assert framer.feed(frame[-1:]) == [frame]
+
+
+def test_msm_header_fields():
+    frames = synthetic_epoch(123000, stamp=False)
+    types = [message_type(frame) for frame in frames]
+    assert types == [1005, 1074, 1084, 1094, 1124]
+    # Chỉ MSM cuối cùng của epoch có multiple message bit = 0
+    assert [is_epoch_end(frame) for frame in frames] == [False, False, False, False, True]
+    assert msm_epoch_ms(frames[1]) == 123000
+    assert msm_epoch_ms(frames[4]) == 123000 - 14000
+
+
+def test_msm_gps_time_is_common_to_constellations():
+    frames = synthetic_epoch(345678000, stamp=False)
+    assert {msm_gps_time_ms(frame) for frame in frames[1:]} == {345678000 % 86400000, 345678000}
+    # GPS/GAL/BDS cùng time of week, GLONASS cùng GPS time of day
+    assert msm_gps_time_ms(frames[1]) == msm_gps_time_ms(frames[3]) == msm_gps_time_ms(frames[4])
+    assert msm_gps_time_ms(frames[2]) == 345678000 % 86400000
@@ -0,0 +1,49 @@
+from RTCM3Stats import RTCM3StreamStats
+from ReceiverEmulator import MSM_MASKS, synthetic_epoch
+
+
+def feed_epochs(stats, epochs):
+    for epoch_ms in epochs:
+        stats.feed(synthetic_epoch(epoch_ms, stamp=False), now=epoch_ms / 1000)
+
+
+def test_counts_satellites_and_signals():
+    stats = RTCM3StreamStats()
+    feed_epochs(stats, [1000, 2000])
+    summary = stats.summary(now=2.0)
+    gps = summary["constellations"]["GPS"]
+    assert gps["satellites"] == bin(MSM_MASKS[1074][0]).count("1")
+    assert gps["signals"] == 2
+    assert summary["station_id"] == 0
+    assert summary["types"]["1074"]["count"] == 2
+    assert summary["types"]["1074"]["rate_hz"] == 1.0
+
+
+def test_detects_missing_epochs():
+    stats = RTCM3StreamStats()
+    epochs = [i * 1000 for i in range(1, 21)]
+    del epochs[10:13]
+    feed_epochs(stats, epochs)
+    for name in ("GPS", "GLONASS", "Galileo", "BeiDou"):
+        item = stats.summary()["constellations"][name]
+        assert item["interval_ms"] == 1000
+        assert item["gaps"] == 1
+        assert item["missed_epochs"] == 3
+        assert item["max_gap_ms"] == 4000
+
+
+def test_week_rollover_is_not_a_gap():
+    week_ms = 7 * 86400 * 1000
+    stats = RTCM3StreamStats()
+    feed_epochs(stats, [week_ms - 3000, week_ms - 2000, week_ms - 1000, 0, 1000])
+    assert stats.summary()["constellations"]["GPS"]["gaps"] == 0
+
+
+def test_rate_change_is_learned():
+    stats = RTCM3StreamStats()
+    epochs = [i * 1000 for i in range(1, 6)] + [5000 + i * 2000 for i in range(1, 8)]
+    feed_epochs(stats, epochs)
+    gps = stats.summary()["constellations"]["GPS"]
+    assert gps["interval_ms"] == 2000
+    # Chỉ tính là mất epoch tới khi xác nhận chu kỳ mới
+    assert gps["missed_epochs"] <= 3
@@ -0,0 +1,75 @@
+import pytest
+
+from RTCMFilter import MessageSubscription, SubscriptionRegistry
+from ReceiverEmulator import msm_payload, rtcm_frame, synthetic_epoch
+
+
+def frame_1005():
+    return rtcm_frame((1005 << 4).to_bytes(2, "big") + bytes(17))
+
+
+def test_parse_spec():
+    sub = MessageSubscription("1005:10, 1074:1,1230,-1124,*")
+    assert sub.periods == {1005: 10000, 1074: 1000, 1230: 0}
+    assert sub.blocked == {1124}
+    assert sub.pass_others
+    assert sub.spec == "1005:10,1074:1,1230,-1124,*"
+
+
+@pytest.mark.parametrize(
+    "spec", ["abc", "1005:abc", "1005:nan", "1005:inf", "1005:-1", "-x", "999", "4096", "1005:1e400"]
+)
+def test_bad_spec_raises_value_error(spec):
+    with pytest.raises(ValueError):
+        MessageSubscription(spec)
+
+
+def test_whitelist_and_blocklist():
+    sub = MessageSubscription("1074")
+    frames = synthetic_epoch(1000, stamp=False)
+    assert [sub.accept(frame, now=0) for frame in frames] == [False, True, False, False, False]
+    sub = MessageSubscription("-1005,*")
+    assert [sub.accept(frame, now=0) for frame in frames] == [False, True, True, True, True]
+
+
+def test_non_msm_period_with_jitter():
+    sub = MessageSubscription("1005:10")
+    frame = frame_1005()
+    assert sub.accept(frame, now=0.0)
+    assert not sub.accept(frame, now=5.0)
+    # Cho phép sớm 10% do jitter
+    assert sub.accept(frame, now=9.5)
+
+
+def test_msm_decimation_keeps_same_epoch_for_every_constellation():
+    sub = MessageSubscription("1074:5,1084:5,1094:5,1124:5")
+    kept = []
+    for second in range(1, 21):
+        epoch_ms = 600000000 + second * 1000
+        accepted = [sub.accept(frame, now=second) for frame in synthetic_epoch(epoch_ms, stamp=False)[1:]]
+        # Mọi hệ cùng được giữ hoặc cùng bị bỏ trong một epoch
+        assert len(set(accepted)) == 1
+        if accepted[0]:
+            kept.append(epoch_ms)
+    # Epoch đầu tiên luôn được gửi, sau đó chỉ các epoch chia hết cho 5 s
+    assert kept[1:] == [600005000, 600010000, 600015000, 600020000]
+
+
+def test_msm_split_epoch_is_sent_whole():
+    sub = MessageSubscription("1077:5")
+    results = []
+    for second, epoch_ms in enumerate((600000000, 600001000, 600005000)):
+        # Receiver chia epoch thành hai message 1077 cách nhau 2 ms
+        first = rtcm_frame(msm_payload(1077, epoch_ms, True, 40))
+        last = rtcm_frame(msm_payload(1077, epoch_ms, False, 40))
+        results.append((sub.accept(first, now=second), sub.accept(last, now=second + 0.002)))
+    assert results == [(True, True), (False, False), (True, True)]
+
+
+def test_registry_shares_config_specs_per_stream():
+    registry = SubscriptionRegistry()
+    assert registry.get("*") is None
+    assert registry.get("") is None
+    first = registry.get("1005:10,1074", "BASE")
+    assert registry.get(" 1005:10 ,1074", "BASE") is first
+    assert registry.get("1005:10,1074", "SITE2") is not first
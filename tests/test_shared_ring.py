@@ -0,0 +1,57 @@
+import pytest
+
+from SharedRing import SharedFrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(create=True, slots=8, slot_data=64)
+    yield ring
+    ring.close()
+
+
+def test_publish_and_read_from_other_handle(ring):
+    reader = SharedFrameRing(name=ring.name)
+    try:
+        assert reader.read(1) is None
+        assert ring.publish(b"first") == 1
+        assert ring.publish(b"second") == 2
+        assert reader.head == 2
+        assert reader.read_available(1) == ([b"first", b"second"], 3, 0)
+        assert reader.read(3) is None
+    finally:
+        reader.close()
+
+
+def test_slow_reader_detects_overrun(ring):
+    for i in range(20):
+        ring.publish(bytes([i]))
+    frames, next_seq, lost = ring.read_available(1)
+    assert next_seq == 21
+    assert frames == [bytes([i]) for i in range(20 - len(frames), 20)]
+    assert lost == 20 - len(frames)
+    assert len(frames) < 8
+
+
+def test_read_available_stops_at_limit(ring):
+    for i in range(5):
+        ring.publish(bytes([i]))
+    assert ring.read_available(1, limit=3) == ([b"\x00", b"\x01", b"\x02"], 4, 0)
+    assert ring.read_available(4, limit=3) == ([b"\x03", b"\x04"], 6, 0)
+
+
+def test_frame_too_large(ring):
+    with pytest.raises(ValueError):
+        ring.publish(bytes(65))
+
+
+def test_attach_to_non_ring_fails():
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=64)
+    try:
+        with pytest.raises(ValueError):
+            SharedFrameRing(name=shm.name)
+    finally:
+        shm.close()
+        shm.unlink()
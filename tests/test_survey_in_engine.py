@@ -0,0 +1,62 @@
+import random
+
+from SurveyInEngine import NAV_HPPOSECEF, SurveyInEngine, decode_nav_hpposecef
+
+TRUE_POSITION = (-1919161.28, 5821368.88, 1757388.97)
+
+
+def hpposecef(itow, x, y, z, p_acc=0.5, invalid=False):
+    coords = []
+    for value in (x, y, z):
+        tenths = round(value * 10000)  # 0.1 mm
+        cm = int(tenths / 100)
+        coords.append((cm, tenths - cm * 100))
+    (x_cm, x_hp), (y_cm, y_hp), (z_cm, z_hp) = coords
+    return NAV_HPPOSECEF.pack(
+        0, bytes(3), itow, x_cm, y_cm, z_cm, x_hp, y_hp, z_hp, 1 if invalid else 0, round(p_acc * 10000)
+    )
+
+
+def test_decode_high_precision():
+    payload = hpposecef(1000, *TRUE_POSITION)
+    itow, x, y, z, p_acc = decode_nav_hpposecef(payload)
+    assert itow == 1000
+    assert abs(x - TRUE_POSITION[0]) < 1e-4 and abs(z - TRUE_POSITION[2]) < 1e-4
+    assert p_acc == 0.5
+    assert decode_nav_hpposecef(hpposecef(1000, *TRUE_POSITION, invalid=True)) is None
+
+
+def run(engine, noise, seconds, seed=1):
+    rng = random.Random(seed)
+    for second in range(seconds):
+        sample = [value + rng.gauss(0, noise) for value in TRUE_POSITION]
+        if engine.update(hpposecef(100000 + second * 1000, *sample)):
+            return second
+    return None
+
+
+def test_converges_to_true_position():
+    engine = SurveyInEngine(target_mm=100, min_duration=30, decorrelation=1, drift_window=10)
+    second = run(engine, noise=0.2, seconds=600)
+    assert second is not None and second >= 30
+    assert engine.converged
+    x, y, z = engine.position_cm()
+    assert abs(x / 100 - TRUE_POSITION[0]) < 0.3
+    assert abs(y / 100 - TRUE_POSITION[1]) < 0.3
+    assert abs(z / 100 - TRUE_POSITION[2]) < 0.3
+    assert engine.accuracy_mm() <= 100
+
+
+def test_not_converged_times_out():
+    engine = SurveyInEngine(target_mm=1, min_duration=10, max_duration=60, decorrelation=30)
+    assert run(engine, noise=1.0, seconds=61) is None
+    assert not engine.converged
+    assert engine.timed_out()
+
+
+def test_rejects_bad_samples():
+    engine = SurveyInEngine(max_pacc_mm=1000)
+    assert not engine.update(hpposecef(0, *TRUE_POSITION, p_acc=5.0))
+    assert not engine.update(hpposecef(0, *TRUE_POSITION, invalid=True))
+    assert not engine.update(b"short")
+    assert engine.rejected == 3 and engine.n == 0
@@ -0,0 +1,84 @@
+import struct
+
+from UBXConfig import (
+    MAX_KEYS_PER_FRAME,
+    ConfigKey,
+    ConfigTransaction,
+    decode_valget,
+    decode_valset,
+    decode_values,
+    get_key,
+)
+from UBXProtocol import (
+    LAYER_FLASH,
+    LAYER_RAM,
+    TRANSACTION_APPLY,
+    TRANSACTION_BEGIN,
+    TRANSACTION_CONTINUE,
+    TRANSACTION_NONE,
+    UBXStreamDecoder,
+)
+
+
+def valsets(tx):
+    decoder = UBXStreamDecoder()
+    return [decode_valset(payload) for _, _, payload in decoder.feed(b"".join(tx.frames()))]
+
+
+def test_encode_scale():
+    key = get_key("CFG-TMODE-FIXED_POS_ACC")
+    assert key.encode(12) == struct.pack("<I", 120)
+    assert key.decode(key.encode(12.3)) == 12.3
+
+
+def test_same_value_layers_share_one_frame():
+    tx = ConfigTransaction()
+    tx.set("CFG-TMODE-MODE", 2, LAYER_RAM | LAYER_FLASH)
+    tx.set("CFG-RATE-MEAS", 100, LAYER_RAM | LAYER_FLASH)
+    [(layer, transaction, items)] = valsets(tx)
+    assert layer == LAYER_RAM | LAYER_FLASH
+    assert transaction == TRANSACTION_NONE
+    assert dict(items) == {0x20030001: b"\x02", 0x30210001: struct.pack("<H", 100)}
+
+
+def test_different_values_split_by_layer():
+    tx = ConfigTransaction()
+    tx.set("CFG-RATE-MEAS", 100, LAYER_RAM)
+    tx.set("CFG-RATE-MEAS", 1000, LAYER_FLASH)
+    assert sorted((layer, dict(items)[0x30210001]) for layer, _, items in valsets(tx)) == [
+        (LAYER_RAM, struct.pack("<H", 100)),
+        (LAYER_FLASH, struct.pack("<H", 1000)),
+    ]
+
+
+def test_large_group_uses_transaction_flags():
+    tx = ConfigTransaction()
+    keys = [
+        ConfigKey(f"TEST-KEY-{i}", 0x10FE0000 + i, "L") for i in range(MAX_KEYS_PER_FRAME * 2 + 1)
+    ]
+    for key in keys:
+        tx.set(key, 1)
+    frames = valsets(tx)
+    assert [transaction for _, transaction, _ in frames] == [
+        TRANSACTION_BEGIN,
+        TRANSACTION_CONTINUE,
+        TRANSACTION_APPLY,
+    ]
+    assert sum(len(items) for _, _, items in frames) == len(keys)
+
+
+def test_changed_only_keeps_different_values():
+    tx = ConfigTransaction()
+    tx.set("CFG-TMODE-MODE", 2)
+    tx.set("CFG-RATE-MEAS", 1000)
+    current = {0x20030001: b"\x02", 0x30210001: struct.pack("<H", 100)}
+    assert [key.name for key in tx.changed(current).keys()] == ["CFG-RATE-MEAS"]
+
+
+def test_decode_valget_reply():
+    payload = bytes((0x01, 0x00, 0x00, 0x00)) + struct.pack("<IB", 0x20030001, 1)
+    payload += struct.pack("<IH", 0x30210001, 200)
+    raw = decode_valget(payload)
+    assert decode_values(raw) == {"CFG-TMODE-MODE": 1, "CFG-RATE-MEAS": 200}
+    # Thiếu byte value
+    assert decode_valget(payload[:-1]) is None
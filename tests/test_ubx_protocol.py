@@ -0,0 +1,39 @@
+from UBXProtocol import UBXStreamDecoder, build_ubx, ubx_checksum
+
+
+def test_checksum_matches_byte_loop():
+    data = bytes(range(256)) * 3
+    ck_a = ck_b = 0
+    for byte in data:
+        ck_a = (ck_a + byte) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    assert ubx_checksum(data) == (ck_a, ck_b)
+    assert ubx_checksum(data[:10]) == ubx_checksum(bytearray(data[:10]))
+
+
+def test_decoder_split_reads_and_noise():
+    first = build_ubx(0x01, 0x3B, bytes(40))
+    second = build_ubx(0x05, 0x01, b"\x06\x8a")
+    data = b"\xd3\x00\x13garbage" + first + b"\xb5" + second
+    decoder = UBXStreamDecoder()
+    messages = []
+    for i in range(0, len(data), 5):
+        messages += decoder.feed(data[i : i + 5])
+    assert messages == [(0x01, 0x3B, bytes(40)), (0x05, 0x01, b"\x06\x8a")]
+    assert decoder.stats()["buffered"] == 0
+
+
+def test_decoder_rejects_bad_checksum():
+    good = build_ubx(0x01, 0x3B, bytes(40))
+    bad = bytearray(good)
+    bad[-1] ^= 0x01
+    decoder = UBXStreamDecoder()
+    assert decoder.feed(bytes(bad) + good) == [(0x01, 0x3B, bytes(40))]
+    assert decoder.checksum_errors == 1
+
+
+def test_decoder_keeps_half_sync():
+    message = build_ubx(0x01, 0x13, bytes(28))
+    decoder = UBXStreamDecoder()
+    assert decoder.feed(b"xx" + message[:1]) == []
+    assert decoder.feed(message[1:]) == [(0x01, 0x13, bytes(28))]